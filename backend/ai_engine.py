@@ -1,110 +1,654 @@
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import MarkdownTextSplitter
 from langchain.memory import ConversationBufferMemory
+import asyncio
 import os
-from typing import List, Dict, Any
-import json
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Set, Tuple
 from anthropic import Anthropic
 import numpy as np
+from answer_cache import AnswerCache, create_answer_cache
+from answers import create_answer_clients
+from coalesce import Limiter, Overloaded, SingleFlight, ThreadLimiter, ThreadSingleFlight
+from concurrency import run_cpu
+from config import get_settings
+from database import get_read_session
+from metrics import record, stage
+from embedding_cache import EmbeddingCache, normalize_text
+from embeddings import (
+    EmbeddingError, EmbeddingProvider, backoff_delay, create_embedding_provider, is_rate_limit, retry_after
+)
+from indexing import (
+    DELETE, RESYNC, UPSERT, ArticleDelta, advance_watermark, changes_since, load_documents, record_versions
+)
+from search_index import SYNC_INTERVAL, get_article_index
+from vector_index import IndexSpec, VectorIndex, article_of, chunk_id
+
+ANSWER_SYSTEM_PROMPT = "You are a helpful assistant answering questions about VPN services. Use the provided context to answer questions accurately and concisely."
+ANSWER_ERROR_MESSAGE = "I apologize, but I encountered an error while trying to generate an answer. Please try again."
+ANSWER_OVERLOADED_MESSAGE = "We are receiving a lot of questions right now, so no answer was generated. The articles below should help."
 
 class AIEngine:
-    def __init__(self):
+    def __init__(
+        self,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        embedding_provider: Optional[EmbeddingProvider] = None,
+        answer_client=None,
+        async_answer_client=None,
+        answer_cache: Optional[AnswerCache] = None,
+    ):
         self.api_key = os.getenv("CLAUDE_API_KEY")
-        if not self.api_key:
-            raise ValueError("CLAUDE_API_KEY environment variable not set")
-        self.anthropic = Anthropic(api_key=self.api_key)
+        settings = get_settings()
+        # Answer generation goes through ANSWER_PROVIDER ("claude" needs the API key, "fake" runs offline).
+        # Request handlers generate through the async client so the event loop is never blocked.
+        if answer_client is None and async_answer_client is None:
+            answer_client, async_answer_client = create_answer_clients(settings, self.api_key)
+        self.anthropic = answer_client
+        self.async_anthropic = async_answer_client
         self.embedding_model = "claude-2"
-        self.embedding_dimension = 1536  # Claude's embedding dimension
-        self.text_splitter = MarkdownTextSplitter(chunk_size=1000, chunk_overlap=200)
-        self.vector_store = None
+        self.vector_store: Optional[VectorIndex] = None
+        # Catch-ups and commit listeners both mutate the vector store; searches never wait on this
+        self._sync_lock = threading.RLock()
+        self.last_sync = 0.0
+        if embedding_provider is None:
+            # Only the "claude" embedding provider needs the API client
+            api_client = Anthropic(api_key=self.api_key) if self.api_key else None
+            embedding_provider = create_embedding_provider(settings, api_client)
+        self.embedding_provider = embedding_provider
+        self.embedding_dimension = self.embedding_provider.dimension
+        self.embedding_batch_size = settings.EMBEDDING_BATCH_SIZE
+        self.embedding_concurrency = settings.EMBEDDING_CONCURRENCY
+        self.embedding_max_retries = settings.EMBEDDING_MAX_RETRIES
+        self.vector_spec = IndexSpec.from_settings(settings)
+        self.answer_retrieval_k = settings.ANSWER_RETRIEVAL_K
+        self.answer_context_tokens = settings.ANSWER_CONTEXT_TOKENS
+        if embedding_cache is None:
+            embedding_cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH,
+                memory_items=settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+                disk_items=settings.EMBEDDING_CACHE_MAX_ITEMS,
+            )
+        self.embedding_cache = embedding_cache
+        # Paraphrased questions over unchanged sources reuse one generated answer
+        self.answer_cache = answer_cache if answer_cache is not None else create_answer_cache(
+            settings, self.embedding_dimension
+        )
+        # Stampede protection: identical in-flight model calls are shared, and calls beyond
+        # the limiters' queues are shed with Overloaded instead of piling up (see coalesce.py)
+        self._embedding_flights = ThreadSingleFlight()
+        self._answer_calls = SingleFlight()
+        self._answer_streams: Dict[Any, asyncio.Future] = {}
+        self.query_embedding_limiter = ThreadLimiter(
+            settings.QUERY_EMBEDDING_CONCURRENCY, settings.QUERY_EMBEDDING_QUEUE, settings.MODEL_QUEUE_TIMEOUT
+        )
+        self.answer_limiter = Limiter(settings.ANSWER_CONCURRENCY, settings.ANSWER_QUEUE, settings.MODEL_QUEUE_TIMEOUT)
+        # The blocking answer methods share the same budget through their own limiter
+        self.answer_thread_limiter = ThreadLimiter(
+            settings.ANSWER_CONCURRENCY, settings.ANSWER_QUEUE, settings.MODEL_QUEUE_TIMEOUT
+        )
 
     def get_embedding(self, text: str) -> np.ndarray:
-        """Get embedding for a text using Claude API"""
-        try:
-            # Normalize text
-            text = text.replace("\n", " ").strip()
-            
-            # Get embedding from Claude
-            response = self.anthropic.messages.create(
-                model=self.embedding_model,
-                max_tokens=1000,
-                system="Generate a vector embedding for the following text. Return only the embedding as a list of 1536 numbers.",
-                messages=[{"role": "user", "content": text}]
-            )
-            
-            # Parse response and convert to numpy array
-            embedding = json.loads(response.content[0].text)
-            return np.array(embedding, dtype=np.float32)
-            
-        except Exception as e:
-            print(f"Error getting embedding: {str(e)}")
-            # Return zero vector as fallback
-            return np.zeros(self.embedding_dimension, dtype=np.float32)
+        """
+        Get the embedding for a query, from the cache when possible.
+        Concurrent misses for the same text share one model call; raises
+        Overloaded when the query embedding limiter sheds it and
+        EmbeddingError when the model fails.
+        """
+        with stage("embed"):
+            text = normalize_text(text)
+            cached = self.embedding_cache.get(text, self.embedding_provider.model_id)
+            if cached is not None:
+                return cached
+            return self._embedding_flights.do(text, self._embed_query, text)
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        with self.query_embedding_limiter.slot():
+            return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Get embeddings for many texts as one (len(texts), dimension) array"""
+        embeddings = np.zeros((len(texts), self.embedding_dimension), dtype=np.float32)
+        for positions, vectors in self.iter_embeddings(texts):
+            embeddings[positions] = vectors
+        return embeddings
+
+    def iter_embeddings(self, texts: List[str]) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """
+        Yield (positions, vectors) for ``texts`` as they become available.
+
+        Cache hits come first; misses are deduplicated, grouped into batches
+        of ``embedding_batch_size`` and sent with at most
+        ``embedding_concurrency`` requests in flight, yielding each batch as
+        soon as it completes.
+        """
+        model = self.embedding_provider.model_id
+        hit_positions, hit_vectors = [], []
+        missing: Dict[str, List[int]] = {}
+        for position, text in enumerate(texts):
+            text = normalize_text(text)
+            cached = self.embedding_cache.get(text, model)
+            if cached is not None:
+                hit_positions.append(position)
+                hit_vectors.append(cached)
+            else:
+                missing.setdefault(text, []).append(position)
+        if hit_positions:
+            yield hit_positions, np.stack(hit_vectors)
+        if not missing:
+            return
+
+        unique = list(missing)
+        batch_size = max(1, min(self.embedding_batch_size, self.embedding_provider.max_batch_size))
+        batches = [unique[start:start + batch_size] for start in range(0, len(unique), batch_size)]
+
+        def expand(batch, vectors):
+            positions, rows = [], []
+            for text, vector in zip(batch, vectors):
+                for position in missing[text]:
+                    positions.append(position)
+                    rows.append(vector)
+            return positions, np.stack(rows)
+
+        concurrency = min(self.embedding_concurrency, self.embedding_provider.max_concurrency)
+        if len(batches) == 1 or concurrency <= 1:
+            for batch in batches:
+                yield expand(batch, self._embed_batch(batch))
+            return
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            futures = {pool.submit(self._embed_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                yield expand(futures[future], future.result())
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch, retrying with backoff; raises EmbeddingError if every attempt fails"""
+        for attempt in range(self.embedding_max_retries + 1):
+            try:
+                embeddings = self.embedding_provider.embed_batch(texts)
+            except Exception as e:
+                if attempt == self.embedding_max_retries:
+                    print(f"Error getting embedding: {str(e)}")
+                    raise EmbeddingError(str(e)) from e
+                delay = backoff_delay(attempt)
+                if is_rate_limit(e):
+                    delay = max(delay, retry_after(e) or 0.0)
+                time.sleep(delay)
+                continue
+            self.embedding_cache.put_many(texts, self.embedding_provider.model_id, embeddings)
+            return embeddings
+
+    def _answer_request(self, question: str, context: str) -> Dict[str, Any]:
+        return {
+            "model": self.embedding_model,
+            "max_tokens": 1000,
+            "system": ANSWER_SYSTEM_PROMPT,
+            "messages": [
+                {"role": "user", "content": f"Context: {context}\n\nQuestion: {question}"}
+            ],
+        }
 
     def answer_question(self, question: str, context: str) -> str:
         """Generate an answer to a question given some context"""
         try:
-            response = self.anthropic.messages.create(
-                model=self.embedding_model,
-                max_tokens=1000,
-                system="You are a helpful assistant answering questions about VPN services. Use the provided context to answer questions accurately and concisely.",
-                messages=[
-                    {"role": "user", "content": f"Context: {context}\n\nQuestion: {question}"}
-                ]
-            )
+            if self.anthropic is None:
+                raise ValueError("No answer client: set CLAUDE_API_KEY or ANSWER_PROVIDER=fake")
+            with self.answer_thread_limiter.slot(), stage("answer"):
+                response = self.anthropic.messages.create(**self._answer_request(question, context))
+            return response.content[0].text
+        except Overloaded:
+            return ANSWER_OVERLOADED_MESSAGE
+        except Exception as e:
+            print(f"Error generating answer: {str(e)}")
+            return ANSWER_ERROR_MESSAGE
+
+    async def answer_question_async(self, question: str, context: str) -> str:
+        """``answer_question`` through the async client; identical calls in flight share one generation"""
+        return await self._answer_calls.do(
+            (normalize_text(question), context), lambda: self._answer_question_async(question, context)
+        )
+
+    async def _answer_question_async(self, question: str, context: str) -> str:
+        try:
+            if self.async_anthropic is None:
+                raise ValueError("No answer client: set CLAUDE_API_KEY or ANSWER_PROVIDER=fake")
+            async with self.answer_limiter.slot():
+                with stage("answer"):
+                    response = await self.async_anthropic.messages.create(
+                        **self._answer_request(question, context)
+                    )
             return response.content[0].text
+        except Overloaded:
+            return ANSWER_OVERLOADED_MESSAGE
         except Exception as e:
             print(f"Error generating answer: {str(e)}")
-            return "I apologize, but I encountered an error while trying to generate an answer. Please try again."
+            return ANSWER_ERROR_MESSAGE
 
-    def initialize_vector_store(self, documents: List[Dict[str, str]]):
-        """Initialize FAISS vector store with documents"""
-        texts = []
+    def _chunk_document(self, doc: Dict[str, Any]):
+        # Chunks are split and hashed once at write time (see preprocess.py)
+        chunks = doc.get("chunks", [])
+        ids = [chunk_id(doc["id"], chunk["position"]) for chunk in chunks]
+        metadatas = [
+            {"title": doc["title"], "id": doc["id"], "text": chunk["text"], "hash": chunk["hash"]} for chunk in chunks
+        ]
+        return chunks, ids, metadatas
+
+    def stored_embedding(self, chunk: Dict[str, Any]) -> Optional[np.ndarray]:
+        """The chunk's persisted vector, if the current model produced it"""
+        blob = chunk.get("embedding")
+        if not blob or chunk.get("embedding_model") != self.embedding_provider.model_id:
+            return None
+        if len(blob) != self.embedding_dimension * 4:
+            return None
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def iter_chunk_embeddings(self, chunks: List[Dict[str, Any]]) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """Like ``iter_embeddings`` over chunk texts, but stored vectors come first and cost nothing"""
+        stored_positions, stored_vectors, missing = [], [], []
+        for position, chunk in enumerate(chunks):
+            vector = self.stored_embedding(chunk)
+            if vector is None:
+                missing.append(position)
+            else:
+                stored_positions.append(position)
+                stored_vectors.append(vector)
+        if stored_positions:
+            yield stored_positions, np.stack(stored_vectors)
+        if missing:
+            for positions, vectors in self.iter_embeddings([chunks[position]["text"] for position in missing]):
+                yield [missing[position] for position in positions], vectors
+
+    def initialize_vector_store(self, documents: List[Dict[str, Any]]):
+        """Build a fresh vector index over the documents' chunks"""
+        chunks = []
         metadatas = []
+        ids = []
+        index = VectorIndex(self.embedding_dimension, self.vector_spec)
         
         for doc in documents:
-            chunks = self.text_splitter.split_text(doc["content"])
-            texts.extend(chunks)
-            metadatas.extend([{"title": doc["title"], "id": doc["id"]} for _ in chunks])
+            doc_chunks, chunk_ids, chunk_metadatas = self._chunk_document(doc)
+            chunks.extend(doc_chunks)
+            metadatas.extend(chunk_metadatas)
+            ids.extend(chunk_ids)
         
-        if texts:
-            # Use Claude to get embeddings for each text chunk
-            embeddings = []
-            for text in texts:
-                embedding = self.get_embedding(text)
-                embeddings.append(embedding)
-            
-            # Create FAISS index with the embeddings
-            self.vector_store = FAISS.from_embeddings(
-                text_embeddings=list(zip(texts, embeddings)),
-                embedding=None,
-                metadatas=metadatas
-            )
+        # Add each batch of embeddings to the index as soon as it arrives
+        complete = True
+        try:
+            for positions, embeddings in self.iter_chunk_embeddings(chunks):
+                index.add(
+                    [ids[position] for position in positions],
+                    embeddings,
+                    [metadatas[position] for position in positions]
+                )
+        except EmbeddingError as e:
+            print(f"Error building vector index: {str(e)}")
+            complete = False
+        
+        if complete:
+            deltas = [ArticleDelta(UPSERT, doc["id"], doc) for doc in documents]
+            index.watermark = advance_watermark(None, deltas)
+            record_versions(index.versions, deltas)
+        # Else the index serves the chunks it has and, without a watermark, the next sync rebuilds it
+        self.vector_store = index
+
+    def upsert_document(self, doc: Dict[str, Any]):
+        """
+        Re-embed a single document, replacing its previous chunks. Raises
+        EmbeddingError, leaving the previous chunks in place, if the model fails.
+        """
+        if "chunks" not in doc:
+            # Only tags or category changed; the vectors do not depend on them
+            return
+        # Chunks whose text is unchanged keep the vector they already have
+        known = self.vector_store.article_vectors(doc["id"])
+        chunks, chunk_ids, metadatas = self._chunk_document(doc)
+        embeddings = None
+        if chunks:
+            embeddings = np.zeros((len(chunks), self.embedding_dimension), dtype=np.float32)
+            missing = []
+            for position, chunk in enumerate(chunks):
+                vector = known.get(chunk["hash"])
+                if vector is None:
+                    missing.append(position)
+                else:
+                    embeddings[position] = vector
+            for positions, vectors in self.iter_chunk_embeddings([chunks[position] for position in missing]):
+                embeddings[[missing[position] for position in positions]] = vectors
+        self.delete_document(doc["id"])
+        if embeddings is not None:
+            self.vector_store.add(chunk_ids, embeddings, metadatas)
+
+    def delete_document(self, article_id: int):
+        """Remove a document's chunks from the vector store"""
+        if self.vector_store is not None:
+            self.vector_store.remove_article(article_id)
 
-    def search(self, query: str, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Search for relevant documents"""
+    def apply_article_deltas(self, deltas: List[ArticleDelta]):
+        """Listener for ``indexing.register_listener``"""
+        with self._sync_lock:
+            self._apply_article_deltas(deltas)
+
+    def _apply_article_deltas(self, deltas: List[ArticleDelta]):
+        if self.answer_cache is not None:
+            # Also reached when a sync catches up with other workers' commits
+            self.answer_cache.apply_article_deltas(deltas)
+        if self.vector_store is None:
+            # Nothing indexed yet; the first sync will see these rows
+            return
+        if any(delta.op == RESYNC for delta in deltas):
+            # Bulk statement touched an unknown set of rows; rebuild on next sync
+            self.vector_store.watermark = None
+            return
+        applied, failed = [], []
+        for delta in deltas:
+            if delta.op == UPSERT:
+                try:
+                    self.upsert_document(delta.document)
+                except EmbeddingError as e:
+                    print(f"Error embedding article {delta.article_id}: {str(e)}")
+                    failed.append(delta)
+                    continue
+            elif delta.op == DELETE:
+                self.delete_document(delta.article_id)
+            applied.append(delta)
+        self.vector_store.watermark = advance_watermark(self.vector_store.watermark, applied)
+        record_versions(self.vector_store.versions, applied)
+        if failed:
+            # Hold the watermark below the failed rows and forget their versions, so the next sync retries them
+            for delta in failed:
+                self.vector_store.versions.pop(delta.article_id, None)
+            stamps = [delta.document.get("updated_at") for delta in failed if delta.document.get("updated_at")]
+            if stamps and self.vector_store.watermark is not None:
+                self.vector_store.watermark = min(self.vector_store.watermark, min(stamps) - timedelta(microseconds=1))
+
+    def sync_vector_store(self, db):
+        """Apply article changes committed since the index's watermark"""
+        with self._sync_lock:
+            if self.vector_store is None or self.vector_store.watermark is None:
+                if self.vector_store is not None and self.answer_cache is not None:
+                    # A rebuild yields no deltas, so what changed since the last sync is unknown
+                    self.answer_cache.clear()
+                self.initialize_vector_store(load_documents(db, with_tokens=False, with_chunks=True))
+            else:
+                # Articles loaded from a snapshot have chunks but no known version yet
+                known = dict.fromkeys(self.vector_store.article_ids())
+                known.update(self.vector_store.versions)
+                deltas = changes_since(db, self.vector_store.watermark, known, with_tokens=False, with_chunks=True)
+                if deltas:
+                    self._apply_article_deltas(deltas)
+            self.last_sync = time.monotonic()
+
+    def catch_up_vector_store(self):
+        """
+        Apply writes committed by other processes (other workers, init_db.py),
+        at most every SYNC_INTERVAL seconds like the keyword index. A search
+        arriving while another thread catches up uses the index as it is.
+        """
+        if self.vector_store is None or time.monotonic() - self.last_sync <= SYNC_INTERVAL:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            with stage("vector_sync"), get_read_session() as db:
+                self.sync_vector_store(db)
+        except Exception as e:
+            print(f"Error syncing vector index: {str(e)}")
+        finally:
+            self._sync_lock.release()
+
+    def load_vector_store(self, db, directory: str):
+        """
+        Open the persisted index memory-mapped, so workers share its pages.
+        Without a usable snapshot, rebuild from the chunk vectors stored at
+        ingest, calling the model only for chunks without one, and save a
+        snapshot; either way catch up from the watermark.
+        """
+        model_id = self.embedding_provider.model_id
+        self.vector_store = VectorIndex.load(directory, model_id, self.embedding_dimension, self.vector_spec)
+        if self.vector_store is not None:
+            self.sync_vector_store(db)
+            return
+        
+        self.sync_vector_store(db)
+        self.save_vector_store(directory)
+
+    def save_vector_store(self, directory: str):
+        """Snapshot the index as it is, delta included; cheap enough for shutdown"""
+        # A partial build (the model failed) has no watermark and is not worth a snapshot
+        if self.vector_store is not None and self.vector_store.watermark is not None:
+            self.vector_store.save(directory, self.embedding_provider.model_id)
+
+    def compact_vector_store(self, directory: str) -> bool:
+        """
+        Fold the delta and tombstones into a new base and snapshot it. This
+        retrains the index and blocks searches meanwhile, so it runs in one
+        process (init_db.py), not in workers. Returns whether it compacted.
+        """
+        if self.vector_store is None or self.vector_store.watermark is None:
+            return False
+        if not self.vector_store.needs_compaction():
+            return False
+        self.vector_store.compact()
+        self.save_vector_store(directory)
+        return True
+
+    def search(self, query: str, filters: Dict[str, Any] = None, k: int = 5,
+               article_ids: Optional[Set[int]] = None,
+               query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Retrieve the chunks most similar to the query; no generation happens
+        here. ``filters`` (category / tags, as for /search) and
+        ``article_ids`` restrict the search to those articles.
+        """
+        # Before the emptiness check: a build the model failed is retried here
+        self.catch_up_vector_store()
         if not self.vector_store:
             return []
+        if filters:
+            with stage("filters"), get_read_session() as db:
+                allowed = get_article_index(db).filters.matching(filters)
+            if allowed is not None:
+                article_ids = allowed if article_ids is None else article_ids & allowed
+        if article_ids is not None and not article_ids:
+            return []
         
-        # Get query embedding using Claude
-        query_embedding = self.get_embedding(query)
-        
-        # Perform similarity search
-        docs_with_scores = self.vector_store.similarity_search_with_score_by_vector(query_embedding, k=5)
+        if query_embedding is None:
+            query_embedding = self.get_embedding(query)
+        with stage("faiss"):
+            hits = self.vector_store.search(query_embedding, k=k, article_ids=article_ids)
         
-        # Process results
-        results = []
-        for doc, score in docs_with_scores:
-            # Get AI-enhanced answer for this document
-            context = doc.page_content
-            answer = self.answer_question(query, context)
-            
-            result = {
-                "content": answer,
-                "title": doc.metadata.get("title", ""),
-                "id": doc.metadata.get("id", ""),
-                "score": float(score)
+        return [
+            {
+                "content": chunk.get("text", ""),
+                "title": chunk.get("title", ""),
+                "id": chunk.get("id", article_of(chunk_key)),
+                "score": score
             }
-            results.append(result)
-        
-        return results
+            for chunk_key, score, chunk in hits
+        ]
+
+    def build_context(self, results: List[Dict[str, Any]], token_budget: Optional[int] = None):
+        """
+        Deduplicate retrieved chunks and pack them, best first, into a single
+        context that fits ``token_budget``. Returns the context string and the
+        sources that made it in.
+        """
+        token_budget = token_budget or self.answer_context_tokens
+        seen = set()
+        parts, sources = [], []
+        used = 0
+        for result in results:
+            text = normalize_text(result["content"])
+            if not text or text in seen:
+                continue
+            seen.add(text)
+            # Roughly four characters per token
+            cost = len(text) // 4 + 1
+            if used + cost > token_budget:
+                if parts:
+                    continue
+                text = text[:token_budget * 4]
+                cost = token_budget
+            used += cost
+            parts.append(f"[{len(parts) + 1}] {result['title']}\n{text}")
+            if not any(source["id"] == result["id"] for source in sources):
+                sources.append({"id": result["id"], "title": result["title"], "score": result["score"]})
+        return "\n\n".join(parts), sources
+
+    def stream_answer(self, question: str, context: str) -> Iterator[str]:
+        """Generate one answer for the packed context, yielding text as it is produced"""
+        try:
+            if self.anthropic is None:
+                raise ValueError("No answer client: set CLAUDE_API_KEY or ANSWER_PROVIDER=fake")
+            with self.answer_thread_limiter.slot():
+                started = time.perf_counter()
+                first = None
+                stream = self.anthropic.messages.create(**self._answer_request(question, context), stream=True)
+                for event in stream:
+                    if getattr(event, "type", None) == "content_block_delta":
+                        text = getattr(event.delta, "text", None)
+                        if text:
+                            if first is None:
+                                first = time.perf_counter() - started
+                                record("answer_first_token", first)
+                            yield text
+                record("answer", time.perf_counter() - started)
+        except Overloaded:
+            yield ANSWER_OVERLOADED_MESSAGE
+        except Exception as e:
+            print(f"Error generating answer: {str(e)}")
+            yield ANSWER_ERROR_MESSAGE
+
+    async def stream_answer_async(self, question: str, context: str) -> AsyncIterator[str]:
+        """``stream_answer`` through the async client"""
+        try:
+            if self.async_anthropic is None:
+                raise ValueError("No answer client: set CLAUDE_API_KEY or ANSWER_PROVIDER=fake")
+            async with self.answer_limiter.slot():
+                started = time.perf_counter()
+                first = None
+                stream = await self.async_anthropic.messages.create(
+                    **self._answer_request(question, context), stream=True
+                )
+                async for event in stream:
+                    if getattr(event, "type", None) == "content_block_delta":
+                        text = getattr(event.delta, "text", None)
+                        if text:
+                            if first is None:
+                                first = time.perf_counter() - started
+                                record("answer_first_token", first)
+                            yield text
+                record("answer", time.perf_counter() - started)
+        except Overloaded:
+            yield ANSWER_OVERLOADED_MESSAGE
+        except Exception as e:
+            print(f"Error generating answer: {str(e)}")
+            yield ANSWER_ERROR_MESSAGE
+
+    def _prepare_answer(self, query: str, filters: Dict[str, Any] = None):
+        """
+        Retrieve and pack the context, then consult the answer cache. Returns
+        None without results, else (context, sources, cached answer or None,
+        what a fresh answer is stored under or None). Raises Overloaded if
+        the query embedding is shed, EmbeddingError if it fails.
+        """
+        if not self.vector_store:
+            return None
+        query_embedding = self.get_embedding(query)
+        results = self.search(query, filters, k=self.answer_retrieval_k, query_embedding=query_embedding)
+        if not results:
+            return None
+        context, sources = self.build_context(results)
+        if self.answer_cache is None:
+            return context, sources, None, None
+        source_ids = [source["id"] for source in sources]
+        # Captured before generating, so an edit that lands meanwhile keeps the answer out of the cache
+        versions = self.answer_cache.versions(source_ids)
+        with stage("answer_cache"):
+            cached = self.answer_cache.lookup(query_embedding, source_ids)
+        return context, sources, cached, (query_embedding, versions)
+
+    @staticmethod
+    def _generated(parts: List[str]) -> bool:
+        # Failed and shed generations end with a fixed message; never share or cache those
+        return bool(parts) and parts[-1] not in (ANSWER_ERROR_MESSAGE, ANSWER_OVERLOADED_MESSAGE)
+
+    def _store_answer(self, pending, parts: List[str]):
+        if pending is not None and self._generated(parts):
+            self.answer_cache.store(pending[0], pending[1], "".join(parts))
+
+    def _caching_stream(self, tokens: Iterator[str], pending) -> Iterator[str]:
+        parts = []
+        for text in tokens:
+            parts.append(text)
+            yield text
+        self._store_answer(pending, parts)
+
+    async def _shared_stream_async(self, question: str, context: str, pending) -> AsyncIterator[str]:
+        """
+        Stream a fresh answer, sharing it with identical requests (same
+        question and context) that arrive while it is generated. Those wait
+        and receive the whole answer at once; if the first stream fails or
+        is abandoned they generate their own.
+        """
+        key = (normalize_text(question), context)
+        loop = asyncio.get_running_loop()
+        flight = self._answer_streams.get(key)
+        if flight is not None and flight.get_loop() is loop:
+            answer = await asyncio.shield(flight)
+            if answer is not None:
+                yield answer
+                return
+        flight = loop.create_future()
+        self._answer_streams[key] = flight
+        parts = []
+        answer = None
+        tokens = self.stream_answer_async(question, context)
+        try:
+            async for text in tokens:
+                parts.append(text)
+                yield text
+            if self._generated(parts):
+                answer = "".join(parts)
+                self._store_answer(pending, parts)
+        finally:
+            # Release the answer limiter slot now, not when the abandoned generator is collected
+            await tokens.aclose()
+            if self._answer_streams.get(key) is flight:
+                del self._answer_streams[key]
+            flight.set_result(answer)
+
+    def stream_search(self, query: str, filters: Dict[str, Any] = None):
+        """
+        Retrieve, pack and answer with a single generation call. Returns the
+        sources immediately and an iterator over the answer text.
+        """
+        prepared = self._prepare_answer(query, filters)
+        if prepared is None:
+            return [], iter(())
+        context, sources, cached, pending = prepared
+        if cached is not None:
+            return sources, iter((cached,))
+        return sources, self._caching_stream(self.stream_answer(query, context), pending)
+
+    async def stream_search_async(self, query: str, filters: Dict[str, Any] = None):
+        """
+        ``stream_search`` for request handlers: retrieval runs on the bounded
+        executor and the answer streams from the async client.
+        """
+        prepared = await run_cpu(self._prepare_answer, query, filters)
+        if prepared is None:
+            return [], _empty_stream()
+        context, sources, cached, pending = prepared
+        if cached is not None:
+            return sources, _single_stream(cached)
+        return sources, self._shared_stream_async(query, context, pending)
+
+
+async def _empty_stream() -> AsyncIterator[str]:
+    return
+    yield
+
+
+async def _single_stream(text: str) -> AsyncIterator[str]:
+    yield text
@@ -0,0 +1,418 @@
+"""
+Search and feedback analytics served from rollups, not the raw event tables.
+
+``search_logs`` gains a row per search and ``feedback`` a row per rating,
+so reports over them would scan more the longer the service runs. Instead:
+
+- The search-log writer folds every batch it inserts into ``search_rollups``
+  in the same transaction: one row per hour, normalized query and category
+  filter, holding the number of searches, how many found nothing and the
+  total results returned. Reports group at most a few rows per query-hour.
+- Recording feedback also bumps that article's ``article_feedback_stats``
+  row, so an article's rating is a primary-key read.
+- Raw rows past their retention are deleted in batches along the
+  ``created_at`` indexes (``compact``); rollups and running totals stay.
+
+Upserts use INSERT ... ON CONFLICT, so rollups are supported on SQLite and
+PostgreSQL, the same backends as the rest of the service.
+"""
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, desc, func, insert, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from database import get_db_session
+from models import Article, ArticleFeedbackStats, Feedback, SearchLog, SearchRollup, utcnow
+from result_cache import normalize_query
+
+ROLLUP_KEY = ("bucket", "query", "category")
+ROLLUP_COUNTERS = ("searches", "zero_results", "results_total")
+FEEDBACK_COUNTERS = ("feedback_count", "ratings", "rating_sum", "comments")
+# Rows per DELETE, so retention never holds a long write lock
+DELETE_BATCH = 5000
+# Upper bounds for report parameters
+MAX_REPORT_ROWS = 500
+
+
+def bucket_start(moment: datetime) -> datetime:
+    """Start of the UTC hour ``moment`` falls in; naive values (read back from SQLite) are UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def since_days(days: int) -> datetime:
+    """Start of the oldest bucket in a report over the last ``days`` days"""
+    return bucket_start(utcnow() - timedelta(days=days))
+
+
+def filter_category(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The category a search was filtered to, if it was filtered to exactly one"""
+    if not filters:
+        return None
+    value = filters.get("category") or filters.get("categories")
+    if isinstance(value, (list, tuple, set)):
+        value = next(iter(value)) if len(value) == 1 else None
+    return str(value)[:100] if value else None
+
+
+def _insert(dialect: str, table):
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    raise ValueError(f"Analytics rollups are not supported on {dialect}")
+
+
+def _dialect(db) -> str:
+    return db.get_bind().dialect.name
+
+
+def search_rollup_upsert(dialect: str):
+    """Adds each parameter row's counters to its (bucket, query, category) rollup"""
+    table = SearchRollup.__table__
+    statement = _insert(dialect, table)
+    return statement.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={name: table.c[name] + statement.excluded[name] for name in ROLLUP_COUNTERS},
+    )
+
+
+def rollup_rows(logs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Search-log rows (query, results_count, category, created_at) summed per rollup key"""
+    totals: Dict[Tuple, List[int]] = {}
+    for log in logs:
+        query = normalize_query(log["query"] or "")[:255]
+        if not query:
+            continue
+        key = (bucket_start(log["created_at"]), query, log.get("category") or "")
+        counters = totals.setdefault(key, [0, 0, 0])
+        results = log["results_count"] or 0
+        counters[0] += 1
+        counters[1] += results == 0
+        counters[2] += results
+    return [dict(zip(ROLLUP_KEY + ROLLUP_COUNTERS, key + tuple(counters))) for key, counters in totals.items()]
+
+
+def apply_search_logs(db: Session, logs: List[Dict[str, Any]]):
+    """Fold logged searches into the rollups; call in the transaction that inserts them"""
+    rows = rollup_rows(logs)
+    if rows:
+        db.execute(search_rollup_upsert(_dialect(db)), rows)
+
+
+def feedback_stats_upsert(dialect: str):
+    table = ArticleFeedbackStats.__table__
+    statement = _insert(dialect, table)
+    set_ = {name: table.c[name] + statement.excluded[name] for name in FEEDBACK_COUNTERS}
+    set_["last_feedback_at"] = statement.excluded.last_feedback_at
+    return statement.on_conflict_do_update(index_elements=["article_id"], set_=set_)
+
+
+async def record_feedback(db, article_id: int, rating: Optional[int], comment: Optional[str]) -> Feedback:
+    """Store one feedback row and add it to the article's running totals, in one transaction"""
+    now = utcnow()
+    feedback = Feedback(article_id=article_id, rating=rating, comment=comment, created_at=now)
+    db.add(feedback)
+    await db.execute(feedback_stats_upsert(_dialect(db)), {
+        "article_id": article_id,
+        "feedback_count": 1,
+        "ratings": int(rating is not None),
+        "rating_sum": rating or 0,
+        "comments": int(bool(comment)),
+        "last_feedback_at": now,
+    })
+    await db.commit()
+    return feedback
+
+
+# Reports: statements over the rollups, run by the async endpoints and by sync callers alike
+
+def _query_totals(since: datetime, category: Optional[str] = None):
+    statement = (
+        select(
+            SearchRollup.query,
+            func.sum(SearchRollup.searches).label("searches"),
+            func.sum(SearchRollup.zero_results).label("zero_results"),
+            func.sum(SearchRollup.results_total).label("results_total"),
+        )
+        .where(SearchRollup.bucket >= since)
+        .group_by(SearchRollup.query)
+    )
+    if category is not None:
+        statement = statement.where(SearchRollup.category == category)
+    return statement
+
+
+def top_queries(since: datetime, limit: int, category: Optional[str] = None):
+    return _query_totals(since, category).order_by(desc("searches")).limit(limit)
+
+
+def zero_result_queries(since: datetime, limit: int, category: Optional[str] = None):
+    return (
+        _query_totals(since, category)
+        .having(func.sum(SearchRollup.zero_results) > 0)
+        .order_by(desc("zero_results"))
+        .limit(limit)
+    )
+
+
+def popular_queries(since: datetime, min_count: int, limit: int):
+    """(query, count) of searches that found something, for suggestions"""
+    found = func.sum(SearchRollup.searches) - func.sum(SearchRollup.zero_results)
+    return (
+        select(SearchRollup.query, found.label("count"))
+        .where(SearchRollup.bucket >= since)
+        .group_by(SearchRollup.query)
+        .having(found >= min_count)
+        .order_by(desc("count"))
+        .limit(limit)
+    )
+
+
+def warm_queries(since: datetime, limit: int):
+    """Most frequent (query, category) pairs that found something; what cache warming replays"""
+    searches = func.sum(SearchRollup.searches)
+    return (
+        select(SearchRollup.query, SearchRollup.category, searches.label("searches"))
+        .where(SearchRollup.bucket >= since, SearchRollup.results_total > 0)
+        .group_by(SearchRollup.query, SearchRollup.category)
+        .order_by(searches.desc())
+        .limit(limit)
+    )
+
+
+def category_totals(since: datetime):
+    return (
+        select(
+            SearchRollup.category,
+            func.sum(SearchRollup.searches).label("searches"),
+            func.sum(SearchRollup.zero_results).label("zero_results"),
+            func.sum(SearchRollup.results_total).label("results_total"),
+        )
+        .where(SearchRollup.bucket >= since)
+        .group_by(SearchRollup.category)
+        .order_by(desc("searches"))
+    )
+
+
+def search_volume(since: datetime):
+    return (
+        select(
+            SearchRollup.bucket,
+            func.sum(SearchRollup.searches).label("searches"),
+            func.sum(SearchRollup.zero_results).label("zero_results"),
+        )
+        .where(SearchRollup.bucket >= since)
+        .group_by(SearchRollup.bucket)
+        .order_by(SearchRollup.bucket)
+    )
+
+
+def article_ratings(limit: int, min_ratings: int = 1, lowest: bool = False):
+    average = ArticleFeedbackStats.rating_sum * 1.0 / ArticleFeedbackStats.ratings
+    return (
+        select(ArticleFeedbackStats, Article.title)
+        .join(Article, Article.id == ArticleFeedbackStats.article_id)
+        .where(ArticleFeedbackStats.ratings >= max(1, min_ratings))
+        .order_by(average.asc() if lowest else average.desc(), ArticleFeedbackStats.ratings.desc())
+        .limit(limit)
+    )
+
+
+def query_report(rows) -> List[Dict[str, Any]]:
+    """Rows of a query or category report with per-search ratios"""
+    report = []
+    for row in rows:
+        item = dict(row._mapping)
+        searches = item["searches"] or 0
+        item["zero_result_ratio"] = round(item["zero_results"] / searches, 4) if searches else 0.0
+        item["avg_results"] = round(item.pop("results_total") / searches, 2) if searches else 0.0
+        report.append(item)
+    return report
+
+
+def feedback_report(stats: ArticleFeedbackStats, title: Optional[str] = None) -> Dict[str, Any]:
+    report = {
+        "article_id": stats.article_id,
+        "feedback_count": stats.feedback_count,
+        "ratings": stats.ratings,
+        "average_rating": round(stats.rating_sum / stats.ratings, 2) if stats.ratings else None,
+        "comments": stats.comments,
+        "last_feedback_at": stats.last_feedback_at,
+    }
+    if title is not None:
+        report["title"] = title
+    return report
+
+
+class ReportCache:
+    """
+    Reports keyed by name and parameters, reused for ``ttl`` seconds, so a
+    dashboard polling the endpoints costs one rollup query per interval
+    """
+
+    def __init__(self, ttl: float = 60.0, max_items: int = 256):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._reports: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._reports.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key: Hashable, report: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if len(self._reports) >= self.max_items:
+                now = time.monotonic()
+                self._reports = {k: v for k, v in self._reports.items() if v[0] > now}
+                if len(self._reports) >= self.max_items:
+                    self._reports.clear()
+            self._reports[key] = (time.monotonic() + self.ttl, report)
+
+
+# Schema, retention and rebuilds
+
+def install_analytics(engine: Engine):
+    """
+    Bring tables created before the rollups up to date: the search_logs
+    category column and the created_at indexes (create_all only creates
+    indexes together with their table)
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns(SearchLog.__tablename__)}
+    with engine.begin() as conn:
+        if "category" not in columns:
+            conn.execute(text(f"ALTER TABLE {SearchLog.__tablename__} ADD COLUMN category VARCHAR(100)"))
+    for model in (SearchLog, Feedback):
+        for index in model.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _delete_batched(db: Session, model, condition) -> int:
+    deleted = 0
+    while True:
+        ids = db.scalars(select(model.id).where(condition).limit(DELETE_BATCH)).all()
+        if not ids:
+            return deleted
+        db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+
+
+def compact(db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Delete raw search logs, feedback and rollups past their retention.
+    Search logs are cut at an hour boundary, so no rollup outlives part of
+    its raw rows. Feedback totals are running sums and do not change.
+    """
+    settings = get_settings()
+    now = now or utcnow()
+    report = {}
+    for name, model, column, days in (
+        ("search_logs", SearchLog, SearchLog.created_at, settings.SEARCH_LOG_RETENTION_DAYS),
+        ("feedback", Feedback, Feedback.created_at, settings.FEEDBACK_RETENTION_DAYS),
+        ("search_rollups", SearchRollup, SearchRollup.bucket, settings.ANALYTICS_ROLLUP_RETENTION_DAYS),
+    ):
+        if days > 0:
+            report[name] = _delete_batched(db, model, column < bucket_start(now - timedelta(days=days)))
+    return report
+
+
+def rebuild_rollups(db: Session, batch_size: int = 10000) -> int:
+    """
+    Recompute the rollups of every hour that still has raw search logs, for
+    logs written before rollups existed. Run with the app stopped, or
+    batches flushed meanwhile are counted twice.
+    """
+    oldest = db.scalar(select(func.min(SearchLog.created_at)))
+    if oldest is None:
+        return 0
+    start = bucket_start(oldest)
+    db.execute(delete(SearchRollup).where(SearchRollup.bucket >= start))
+    logs = db.execute(
+        select(SearchLog.query, SearchLog.results_count, SearchLog.category, SearchLog.created_at)
+        .where(SearchLog.created_at >= start)
+        .execution_options(yield_per=batch_size)
+    )
+    rebuilt = 0
+    for partition in logs.partitions():
+        apply_search_logs(db, [dict(row._mapping) for row in partition])
+        rebuilt += len(partition)
+    db.commit()
+    return rebuilt
+
+
+def rebuild_feedback_stats(db: Session) -> int:
+    """Recompute every article's running totals from the raw feedback that is left"""
+    db.execute(delete(ArticleFeedbackStats))
+    columns = select(
+        Feedback.article_id,
+        func.count(Feedback.id),
+        func.count(Feedback.rating),
+        func.coalesce(func.sum(Feedback.rating), 0),
+        func.count(func.nullif(Feedback.comment, "")),
+        func.max(Feedback.created_at),
+    ).where(Feedback.article_id.is_not(None)).group_by(Feedback.article_id)
+    result = db.execute(insert(ArticleFeedbackStats).from_select(
+        ["article_id", *FEEDBACK_COUNTERS, "last_feedback_at"], columns
+    ))
+    db.commit()
+    return result.rowcount
+
+
+class Compactor:
+    """Runs ``compact`` every ``interval`` seconds on a background thread"""
+
+    def __init__(self, interval: float, session_factory=get_db_session):
+        self.interval = interval
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="analytics-compactor", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.session_factory() as db:
+                    compact(db)
+            except Exception as e:
+                print(f"Error compacting analytics: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain search and feedback analytics")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute rollups and feedback totals from the raw rows still stored")
+    parser.add_argument("--compact", action="store_true", help="delete raw rows past their retention now")
+    args = parser.parse_args()
+    from database import init_db
+    init_db()
+    with get_db_session() as db:
+        if args.rebuild:
+            print(f"Rolled up {rebuild_rollups(db)} search logs")
+            print(f"Rebuilt feedback totals for {rebuild_feedback_stats(db)} articles")
+        if args.compact:
+            print(f"Deleted {compact(db)}")
@@ -0,0 +1,208 @@
+"""
+Semantic cache for generated answers. Paraphrases of one question embed
+close together and retrieve the same articles, so they can share one
+generation.
+
+An entry is a question embedding, the answer, and the articles the answer
+was grounded in with each article's version at generation time. A lookup
+is served only if all of these hold:
+
+- the new question is within ``threshold`` cosine similarity of the entry;
+- retrieval for it produced exactly the same source articles;
+- none of those articles has changed since.
+
+Versions are per-article counters bumped by the indexing listener. An
+answer generated while one of its sources was being edited is stored with
+the old version, so it is never served.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from indexing import DELETE, RESYNC, UPSERT, ArticleDelta
+
+# Upper bounds of the best-similarity histogram in ``snapshot``
+SIMILARITY_BUCKETS = (0.5, 0.7, 0.8, 0.85, 0.9, 0.93, 0.95, 0.97, 0.99, 1.0)
+
+
+class AnswerCache:
+    """
+    In-process LRU of answers with a TTL, searched by exact inner product
+    over a preallocated matrix of normalized question embeddings (one row
+    per entry, so a lookup is one matrix-vector product over at most
+    ``max_items`` rows).
+    """
+
+    def __init__(self, dimension: int, threshold: float = 0.92, max_items: int = 1000, ttl: float = 3600.0):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.max_items = max_items
+        self.ttl = ttl
+        self._vectors = np.zeros((max_items, dimension), dtype=np.float32)
+        # Entry key -> row; OrderedDict order is recency, oldest first
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._free = list(range(max_items - 1, -1, -1))
+        self._by_article: Dict[int, set] = {}
+        self._versions: Dict[int, int] = {}
+        # Bumped by clear(), so it also outdates versions captured for articles never seen here
+        self._epoch = 0
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {
+            "hits": 0, "misses": 0, "source_mismatches": 0, "stores": 0,
+            "evictions": 0, "expirations": 0, "invalidations": 0,
+        }
+        self.similarities = [0] * len(SIMILARITY_BUCKETS)
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _version(self, article_id: int) -> Tuple[int, int]:
+        return self._epoch, self._versions.get(article_id, 0)
+
+    def versions(self, article_ids) -> Dict[int, Tuple[int, int]]:
+        """Current versions of ``article_ids``; capture them before generating an answer"""
+        with self._lock:
+            return {article_id: self._version(article_id) for article_id in article_ids}
+
+    def lookup(self, embedding: np.ndarray, source_ids) -> Optional[str]:
+        """
+        The cached answer for a question this similar, grounded in exactly
+        ``source_ids`` at their current versions, or None
+        """
+        query = self._normalize(embedding)
+        sources: FrozenSet[int] = frozenset(source_ids)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if not self._entries:
+                self.stats["misses"] += 1
+                return None
+            keys = list(self._entries)
+            rows = [self._entries[key]["row"] for key in keys]
+            scores = self._vectors[rows] @ query
+            order = np.argsort(-scores)
+            best = float(scores[order[0]])
+            self.similarities[min(
+                np.searchsorted(SIMILARITY_BUCKETS, best), len(SIMILARITY_BUCKETS) - 1
+            )] += 1
+            similar = False
+            for position in order:
+                if scores[position] < self.threshold:
+                    break
+                similar = True
+                entry = self._entries[keys[position]]
+                if entry["expires"] > now and entry["sources"] == sources and all(
+                    self._version(article_id) == version
+                    for article_id, version in entry["versions"].items()
+                ):
+                    self._entries.move_to_end(keys[position])
+                    self.stats["hits"] += 1
+                    return entry["answer"]
+            self.stats["source_mismatches" if similar else "misses"] += 1
+            return None
+
+    def store(self, embedding: np.ndarray, versions: Dict[int, Tuple[int, int]], answer: str):
+        """Cache ``answer``; ``versions`` is what ``versions()`` returned before it was generated"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if any(self._version(article_id) != version for article_id, version in versions.items()):
+                # A source changed while the answer was generated
+                return
+            self._expire(time.monotonic())
+            if not self._free:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            row = self._free.pop()
+            self._vectors[row] = vector
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = {
+                "row": row,
+                "sources": frozenset(versions),
+                "versions": dict(versions),
+                "answer": answer,
+                "expires": time.monotonic() + self.ttl,
+            }
+            for article_id in versions:
+                self._by_article.setdefault(article_id, set()).add(key)
+            self.stats["stores"] += 1
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        self._free.append(entry["row"])
+        for article_id in entry["sources"]:
+            keys = self._by_article.get(article_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_article[article_id]
+
+    def _expire(self, now: float):
+        # Hits reorder entries without extending their TTL, so this sweep from the old
+        # end is approximate; lookups also check each candidate's expiry
+        for key in list(self._entries):
+            if self._entries[key]["expires"] > now:
+                break
+            self._remove(key)
+            self.stats["expirations"] += 1
+
+    def invalidate_articles(self, article_ids):
+        with self._lock:
+            for article_id in article_ids:
+                self._versions[article_id] = self._versions.get(article_id, 0) + 1
+                for key in list(self._by_article.get(article_id, ())):
+                    self._remove(key)
+                    self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            for key in list(self._entries):
+                self._remove(key)
+            # Answers being generated now were grounded in what may have changed; do not store them
+            self._epoch += 1
+
+    def apply_article_deltas(self, deltas: List[ArticleDelta]):
+        """Listener for ``indexing.register_listener``"""
+        if any(delta.op == RESYNC for delta in deltas):
+            self.clear()
+            return
+        self.invalidate_articles(
+            delta.article_id for delta in deltas if delta.op in (UPSERT, DELETE) and delta.article_id is not None
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, hit ratio and the distribution of each lookup's best similarity"""
+        with self._lock:
+            stats = dict(self.stats)
+            similarities = list(self.similarities)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["source_mismatches"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["threshold"] = self.threshold
+        stats["best_similarity"] = {
+            f"le_{bound}": count for bound, count in zip(SIMILARITY_BUCKETS, similarities)
+        }
+        return stats
+
+
+def create_answer_cache(settings, dimension: int) -> Optional[AnswerCache]:
+    """The cache configured by Settings, or None when ANSWER_CACHE_ENABLED is off"""
+    if not settings.ANSWER_CACHE_ENABLED or settings.ANSWER_CACHE_MAX_ITEMS <= 0:
+        return None
+    return AnswerCache(
+        dimension,
+        threshold=settings.ANSWER_CACHE_THRESHOLD,
+        max_items=settings.ANSWER_CACHE_MAX_ITEMS,
+        ttl=settings.ANSWER_CACHE_TTL,
+    )
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from anthropic import Anthropic, AsyncAnthropic
+
+SOURCE_RE = re.compile(r"\[(\d+)\] ([^\n]*)\n([^\n]*)")
+
+
+def fake_answer(messages: List[Dict[str, Any]]) -> str:
+    """
+    Deterministic answer for a request: cites the first packed source and
+    quotes its opening line, so equal requests always get equal answers.
+    """
+    prompt = messages[-1]["content"] if messages else ""
+    match = SOURCE_RE.search(prompt)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    if match is None:
+        return f"I could not find this in the knowledge base. (answer {digest})"
+    number, title, line = match.groups()
+    return f"According to [{number}] {title}: {line[:200]} (answer {digest})"
+
+
+def _events(text: str) -> List[SimpleNamespace]:
+    """The streaming events the Messages API sends, reduced to what AIEngine reads"""
+    words = text.split(" ")
+    deltas = [
+        SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(type="text_delta", text=word + " "))
+        for word in words[:-1]
+    ] + [SimpleNamespace(type="content_block_delta", delta=SimpleNamespace(type="text_delta", text=words[-1]))]
+    return [SimpleNamespace(type="message_start")] + deltas + [SimpleNamespace(type="message_stop")]
+
+
+def _response(text: str) -> SimpleNamespace:
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], stop_reason="end_turn")
+
+
+class FakeAnswerClient:
+    """
+    Offline stand-in for ``Anthropic`` in benchmarks and tests: implements
+    ``messages.create`` with and without ``stream=True``. ``latency`` is
+    the wait before the first token, ``token_latency`` the wait between
+    streamed tokens.
+    """
+
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self.messages = self
+
+    def create(self, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        self.requests += 1
+        text = fake_answer(messages)
+        if not stream:
+            time.sleep(self.latency)
+            return _response(text)
+        return self._stream(text)
+
+    def _stream(self, text: str) -> Iterator[SimpleNamespace]:
+        time.sleep(self.latency)
+        for event in _events(text):
+            if event.type == "content_block_delta" and self.token_latency:
+                time.sleep(self.token_latency)
+            yield event
+
+
+class AsyncFakeAnswerClient(FakeAnswerClient):
+    """``FakeAnswerClient`` for the ``AsyncAnthropic`` call sites; waits without blocking the loop"""
+
+    async def create(self, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        self.requests += 1
+        text = fake_answer(messages)
+        if not stream:
+            await asyncio.sleep(self.latency)
+            return _response(text)
+        return self._stream(text)
+
+    async def _stream(self, text: str) -> AsyncIterator[SimpleNamespace]:
+        await asyncio.sleep(self.latency)
+        for event in _events(text):
+            if event.type == "content_block_delta" and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield event
+
+
+def create_answer_clients(settings, api_key: Optional[str]) -> Tuple[Any, Any]:
+    """(sync, async) clients for ``settings.ANSWER_PROVIDER``; Claude clients are None without a key"""
+    name = settings.ANSWER_PROVIDER.lower()
+    if name == "claude":
+        if not api_key:
+            return None, None
+        return Anthropic(api_key=api_key), AsyncAnthropic(api_key=api_key)
+    if name == "fake":
+        return FakeAnswerClient(), AsyncFakeAnswerClient()
+    raise ValueError(f"Unknown ANSWER_PROVIDER: {settings.ANSWER_PROVIDER}")
@@ -0,0 +1 @@
+"""Offline performance benchmarks; run from backend/ with ``python -m benchmarks.<name>``"""
@@ -0,0 +1,134 @@
+"""
+Synthetic help-center corpus in the markdown format init_db ingests
+(``# Title``, ``## Category:``, ``## Tags:``, then ``###`` sections with
+paragraphs and lists).
+
+Word frequencies follow a Zipf distribution over a domain vocabulary plus
+a long tail of invented terms, so postings lists are skewed like real
+text. Article ``n`` depends only on ``n`` and the seed, never on the
+corpus size, so a 1k corpus is a prefix of a 1M one and files can be
+written in parallel.
+
+    python -m benchmarks.corpus --articles 100000 --out /tmp/corpus --workers 8
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+DOMAIN_WORDS = (
+    "vpn connection server password account speed protocol router kill switch dns leak install "
+    "android ios windows mac linux browser extension billing refund subscription streaming "
+    "netflix torrent split tunneling wireguard openvpn ikev2 firewall wifi hotspot error timeout "
+    "app settings network location country ip address encryption privacy security login email "
+    "payment plan trial device limit update version crash slow disconnect reconnect port tcp udp "
+    "obfuscation proxy certificate authentication 2fa backup code support ticket chat logs policy "
+    "the a to and of in you your is for on with if it this can be are not that or from by"
+).split()
+RARE_TERMS = 50_000
+VOCABULARY = DOMAIN_WORDS + [f"term{number}" for number in range(RARE_TERMS)]
+# Zipf weights (s ~ 1.07, like English text), accumulated once for random.choices
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1.0 / (rank + 1) ** 1.07 for rank in range(len(VOCABULARY))))
+
+CATEGORIES = ["Getting Started", "Security", "Troubleshooting", "Billing", "Apps", "Streaming", "Privacy", "Account"]
+PLATFORMS = ["Windows", "macOS", "Linux", "Android", "iOS", "routers", "Chrome", "Firefox", "smart TVs"]
+TOPICS = ["the kill switch", "split tunneling", "DNS leak protection", "two-factor authentication",
+          "WireGuard", "OpenVPN", "automatic reconnect", "server selection", "your subscription"]
+TITLE_TEMPLATES = ["How to set up {topic} on {platform}", "Troubleshooting {topic} on {platform}",
+                   "Using {topic} with {platform}", "{topic} on {platform}: FAQ"]
+TAGS = [word for word in DOMAIN_WORDS[:80]] + [platform.lower().replace(" ", "-") for platform in PLATFORMS]
+
+
+def _rng(number: int, seed: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + number)
+
+
+def _words(rng: random.Random, count: int) -> List[str]:
+    return rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=count)
+
+
+def _sentence(rng: random.Random) -> str:
+    words = _words(rng, rng.randint(8, 20))
+    return " ".join(words).capitalize() + "."
+
+
+def article_markdown(number: int, seed: int = 0) -> str:
+    """Markdown for article ``number``; about 300-600 words"""
+    rng = _rng(number, seed)
+    title = rng.choice(TITLE_TEMPLATES).format(topic=rng.choice(TOPICS), platform=rng.choice(PLATFORMS))
+    # The number keeps titles, and so slugs, unique
+    lines = [
+        f"# {title[0].upper()}{title[1:]} #{number}",
+        "",
+        f"## Category: {rng.choice(CATEGORIES)}",
+        f"## Tags: {', '.join(rng.sample(TAGS, rng.randint(2, 4)))}",
+    ]
+    for _ in range(rng.randint(2, 5)):
+        lines += ["", f"### {' '.join(_words(rng, rng.randint(2, 5))).capitalize()}", ""]
+        for _ in range(rng.randint(1, 3)):
+            lines.append(" ".join(_sentence(rng) for _ in range(rng.randint(2, 5))))
+            lines.append("")
+        if rng.random() < 0.4:
+            lines += [f"{position}. **{' '.join(_words(rng, 3)).capitalize()}**"
+                      for position in range(1, rng.randint(3, 6))]
+    return "\n".join(lines) + "\n"
+
+
+def iter_articles(count: int, seed: int = 0, start: int = 0) -> Iterator[Tuple[str, str]]:
+    """(filename, markdown) for articles ``start`` to ``start + count``"""
+    for number in range(start, start + count):
+        yield f"article-{number:07d}.md", article_markdown(number, seed)
+
+
+def _write_range(args) -> int:
+    directory, start, count, seed = args
+    written = 0
+    for filename, markdown in iter_articles(count, seed, start):
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            written += f.write(markdown)
+    return written
+
+
+def write_corpus(directory: str, count: int, seed: int = 0, workers: int = 1) -> Dict[str, float]:
+    """Write ``count`` articles into ``directory``; returns files, bytes and seconds"""
+    os.makedirs(directory, exist_ok=True)
+    started = time.perf_counter()
+    step = max(1, min(10_000, count // max(workers * 4, 1) or 1))
+    ranges = [(directory, start, min(step, count - start), seed) for start in range(0, count, step)]
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = sum(pool.map(_write_range, ranges))
+    else:
+        written = sum(_write_range(item) for item in ranges)
+    return {"files": count, "bytes": written, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def sample_queries(count: int, seed: int = 0) -> List[str]:
+    """Search queries shaped like real traffic: short, mostly head terms, some title phrases"""
+    rng = random.Random(seed ^ 0x5EED)
+    head = [word for word in DOMAIN_WORDS if len(word) > 3]
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.3:
+            queries.append(f"{rng.choice(TOPICS)} {rng.choice(PLATFORMS)}".lower())
+        else:
+            words = rng.sample(head, rng.randint(1, 3))
+            if rng.random() < 0.2:
+                # Rarer terms exercise short postings lists
+                words.append(f"term{int(rng.paretovariate(1.0)) % RARE_TERMS}")
+            queries.append(" ".join(words))
+    return queries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--out", required=True, help="directory for the .md files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    print(json.dumps(write_corpus(args.out, args.articles, args.seed, args.workers)))
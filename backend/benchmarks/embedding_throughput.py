@@ -0,0 +1,52 @@
+"""
+Measure AIEngine.get_embeddings throughput against the fake provider.
+
+    python -m benchmarks.embedding_throughput --texts 2000 --latency 0.05
+"""
+import argparse
+import json
+import time
+
+from ai_engine import AIEngine
+from embedding_cache import EmbeddingCache
+from embeddings import FakeEmbeddingProvider
+
+
+def run(texts: int, latency: float, batch_size: int, concurrency: int, rate_limit_every: int):
+    provider = FakeEmbeddingProvider(latency=latency, rate_limit_every=rate_limit_every)
+    engine = AIEngine(embedding_cache=EmbeddingCache(), embedding_provider=provider)
+    engine.embedding_batch_size = batch_size
+    engine.embedding_concurrency = concurrency
+    corpus = [f"synthetic chunk {i} about vpn connection troubleshooting" for i in range(texts)]
+
+    started = time.perf_counter()
+    engine.get_embeddings(corpus)
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    engine.get_embeddings(corpus)
+    warm = time.perf_counter() - started
+
+    return {
+        "texts": texts,
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "provider_latency_s": latency,
+        "requests": provider.requests,
+        "cold_s": round(cold, 4),
+        "cold_texts_per_s": round(texts / cold, 1),
+        "warm_s": round(warm, 4),
+        "cache": engine.embedding_cache.snapshot(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per request")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+    for concurrency in args.concurrency:
+        print(json.dumps(run(args.texts, args.latency, args.batch_size, concurrency, args.rate_limit_every)))
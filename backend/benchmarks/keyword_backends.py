@@ -0,0 +1,109 @@
+"""
+Compare the keyword backends on synthetic corpora: the in-process BM25F
+index against the database full-text index (SQLite FTS5 here). Reports the
+Python memory the index holds after building, build time, and query
+latency.
+
+    python -m benchmarks.keyword_backends --sizes 1000 10000 50000
+
+Runs against a throwaway SQLite database in a temporary directory.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+# Configure before anything opens the database or reads Settings
+os.chdir(tempfile.mkdtemp(prefix="faqrep-keyword-backends-"))
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+
+import numpy as np
+from sqlalchemy import insert
+
+from database import engine, get_db_session
+from fulltext import FullTextIndex, install_fulltext
+from models import Article, Base
+from preprocess import preprocess_article
+from search_index import ArticleIndex, InvertedIndex
+
+WORDS = (
+    "vpn connection server password account speed protocol router kill switch dns leak install "
+    "android ios windows mac linux browser extension billing refund subscription streaming "
+    "netflix torrent split tunneling wireguard openvpn ikev2 firewall wifi hotspot error timeout"
+).split()
+
+
+def build_corpus(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS articles_fts")
+    Base.metadata.create_all(engine)
+    # Invent rarer words too, so postings lists have realistic skew
+    vocabulary = WORDS + [f"term{number}" for number in range(size // 10 + 100)]
+    rows = []
+    for number in range(size):
+        content = "<p>" + " ".join(rng.choice(vocabulary) for _ in range(300)) + "</p>"
+        prepared = preprocess_article(content)
+        rows.append({
+            "title": " ".join(rng.choice(WORDS) for _ in range(6)).capitalize(),
+            "slug": f"article-{number}",
+            "content": content,
+            "plain_text": prepared["plain_text"],
+            "tokens": prepared["tokens"],
+            "category": rng.choice(["general", "security", "setup"]),
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(Article), rows)
+    rng.shuffle(vocabulary)
+    return [" ".join(rng.sample(vocabulary[:200], rng.randint(1, 3))) for _ in range(200)]
+
+
+def measure(name: str, keywords, queries):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = ArticleIndex(keywords)
+    with get_db_session() as db:
+        index.sync(db)
+    build_seconds = time.perf_counter() - started
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.keywords.search(query, limit=50)
+        latencies.append(time.perf_counter() - started)
+    return {
+        "backend": name,
+        "index_mb": round(held / 2**20, 2),
+        "build_s": round(build_seconds, 3),
+        "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "query_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+    }
+
+
+def run(size: int):
+    queries = build_corpus(size)
+    reports = [measure("memory", InvertedIndex(), queries)]
+    started = time.perf_counter()
+    install_fulltext(engine)
+    fts_seconds = time.perf_counter() - started
+    report = measure("database", FullTextIndex(get_db_session), queries)
+    report["fts_build_s"] = round(fts_seconds, 3)
+    reports.append(report)
+    return [{"articles": size, **report} for report in reports]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        for report in run(size):
+            print(json.dumps(report))
@@ -0,0 +1,132 @@
+"""
+Count the SQL statements a search issues at growing corpus sizes, and exit
+non-zero unless the count stays constant (no per-result or per-tag queries).
+
+    python -m benchmarks.query_counts --sizes 10 100 1000
+
+Runs against a throwaway SQLite database in a temporary directory, with the
+fake embedding provider and the result cache disabled.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from typing import List
+
+# Configure before anything opens the database or reads Settings
+os.chdir(tempfile.mkdtemp(prefix="faqrep-query-counts-"))
+os.environ["EMBEDDING_PROVIDER"] = "fake"
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["SEARCH_CACHE_BACKEND"] = "none"
+
+from sqlalchemy import event
+
+from ai_engine import AIEngine
+from database import AsyncSessionLocal, async_engine, async_read_engine, engine, get_db_session, read_engine
+from indexing import load_documents
+from models import Article, Base, Tag
+from search import SearchEngine
+from search_index import reset_article_index
+from search_log import get_search_log_writer
+
+WORDS = "vpn server connect password account speed protocol router kill switch dns leak app install".split()
+QUERIES = ["vpn connect", "password reset account", "kill switch dns"]
+
+
+class QueryCounter:
+    """Records statements sent through the sync and async engines (primary and read) while active"""
+
+    # The search log writer flushes on its own schedule; its inserts are not part of a request
+    IGNORED_THREADS = {"search-log-writer"}
+
+    def __init__(self):
+        self.statements: List[str] = []
+        self._engines = list({engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine})
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread().name not in self.IGNORED_THREADS:
+            self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        for target in self._engines:
+            event.listen(target, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for target in self._engines:
+            event.remove(target, "before_cursor_execute", self._record)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+def build_corpus(size: int, seed: int = 0) -> AIEngine:
+    rng = random.Random(seed)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with get_db_session() as db:
+        tags = [Tag(name=f"tag-{number}") for number in range(20)]
+        db.add_all(tags)
+        for number in range(size):
+            body = " ".join(rng.choice(WORDS) for _ in range(120))
+            db.add(Article(
+                title=f"{rng.choice(WORDS).title()} article {number}",
+                slug=f"article-{number}",
+                content=f"<p>{body}</p>",
+                summary=body[:200],
+                category=rng.choice(["general", "security", "setup"]),
+                tags=rng.sample(tags, rng.randint(1, 3)),
+            ))
+        db.commit()
+        ai_engine = AIEngine()
+        ai_engine.initialize_vector_store(load_documents(db, with_tokens=False, with_chunks=True))
+    reset_article_index()
+    return ai_engine
+
+
+async def count_statements(ai_engine: AIEngine):
+    counts = {}
+    async with AsyncSessionLocal() as db:
+        engine_under_test = SearchEngine(db, ai_engine)
+        # Warm-up builds the keyword index; that is a one-off, not per request
+        await engine_under_test.search(QUERIES[0])
+        for name, call in [
+            ("search", lambda query: engine_under_test.search(query, page_size=10)),
+            ("search_filtered", lambda query: engine_under_test.search(query, {"tags": ["tag-1"]})),
+            ("search_articles", lambda query: engine_under_test.search_articles(query, limit=10)),
+        ]:
+            per_query = []
+            for query in QUERIES:
+                with QueryCounter() as counter:
+                    await call(query)
+                per_query.append(len(counter))
+            counts[name] = max(per_query)
+    # Pooled aiosqlite connections belong to this event loop
+    for target in {async_engine, async_read_engine}:
+        await target.dispose()
+    return counts
+
+
+def run(sizes: List[int]):
+    reports = []
+    for size in sizes:
+        ai_engine = build_corpus(size)
+        reports.append({"articles": size, "statements": asyncio.run(count_statements(ai_engine))})
+    get_search_log_writer().stop()
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+    reports = run(args.sizes)
+    for report in reports:
+        print(json.dumps(report))
+    if len({json.dumps(report["statements"], sort_keys=True) for report in reports}) != 1:
+        print("Statement count depends on corpus size", file=sys.stderr)
+        sys.exit(1)
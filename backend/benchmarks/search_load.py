@@ -0,0 +1,106 @@
+"""
+Concurrent load test for POST /search: throughput and latency percentiles
+at increasing concurrency. When the request path is non-blocking,
+throughput grows with concurrency until the executor or the database
+saturates; a blocking handler stays flat at its single-request rate.
+
+    python -m benchmarks.search_load --requests 400 --concurrency 1 4 16 64
+    python -m benchmarks.search_load --url http://localhost:8000
+
+Without ``--url`` the app runs in-process against the local database, with
+the fake embedding provider unless EMBEDDING_PROVIDER says otherwise.
+``--embedding-latency`` makes each query embedding wait like a remote call,
+and every query is unique, so the embedding cache never hides it.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import numpy as np
+
+QUERIES = [
+    "vpn connection drops",
+    "reset password",
+    "kill switch",
+    "split tunneling setup",
+    "slow speeds on wifi",
+    "install on linux",
+    "dns leak",
+    "change server location",
+]
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+async def run_level(client: httpx.AsyncClient, requests: int, concurrency: int, offset: int):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for number in counter:
+            query = f"{QUERIES[number % len(QUERIES)]} {offset + number}"
+            started = time.perf_counter()
+            response = await client.post("/search", json={"query": query})
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 1),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+async def run(url: str, requests: int, levels, embedding_latency: float):
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=60)
+        app = None
+    else:
+        os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+        os.environ.setdefault("ANALYTICS_WARM_QUERIES", "0")
+        import main
+
+        app = main.app
+        if embedding_latency:
+            main.ai_engine.embedding_provider.latency = embedding_latency
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    reports = []
+    try:
+        # Warm-up builds the keyword index and opens pooled connections
+        await run_level(client, 8, 4, offset=-1000)
+        for number, concurrency in enumerate(levels):
+            reports.append(await run_level(client, requests, concurrency, offset=number * requests))
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="", help="Base URL of a running server; in-process when empty")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--embedding-latency", type=float, default=0.02,
+                        help="Seconds each fake query embedding takes (in-process only)")
+    args = parser.parse_args()
+    for report in asyncio.run(run(args.url, args.requests, args.concurrency, args.embedding_latency)):
+        print(json.dumps(report))
@@ -0,0 +1,95 @@
+"""
+Burst behaviour of POST /search: many clients fire at once, either all with
+the same query (an outage: everyone searches "vpn not connecting") or all
+with distinct ones. Each scenario runs with coalescing and load shedding
+off, then on, and reports latency percentiles, how many responses were
+coalesced, and how many degraded to keyword-only.
+
+    python -m benchmarks.stampede --burst 500 --embedding-latency 0.05
+
+Runs in-process against the local database with the fake embedding
+provider; ``--embedding-latency`` makes each query embedding wait like a
+remote model call.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import numpy as np
+
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("ANSWER_PROVIDER", "fake")
+# Every burst must reach the search path, not the result cache
+os.environ["SEARCH_CACHE_BACKEND"] = "none"
+# Startup cache warming would run concurrently with the measured requests
+os.environ["ANALYTICS_WARM_QUERIES"] = "0"
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+async def burst(client: httpx.AsyncClient, queries):
+    latencies = []
+    metadata = []
+
+    async def one(query):
+        started = time.perf_counter()
+        response = await client.post("/search", json={"query": query})
+        latencies.append(time.perf_counter() - started)
+        metadata.append(response.json().get("metadata", {}) if response.status_code == 200 else None)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(query) for query in queries))
+    return {
+        "requests": len(queries),
+        "errors": sum(1 for item in metadata if item is None),
+        "coalesced": sum(1 for item in metadata if item and item.get("coalesced")),
+        "degraded": sum(1 for item in metadata if item and item.get("degraded")),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "max_ms": percentile_ms(latencies, 100),
+    }
+
+
+async def run(size: int, embedding_latency: float):
+    import main
+    from config import get_settings
+
+    settings = get_settings()
+    shed_depth = settings.SEARCH_SHED_QUEUE_DEPTH
+    main.ai_engine.embedding_provider.latency = embedding_latency
+    await main.app.router.startup()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=120)
+    reports = []
+    try:
+        await burst(client, ["warm up"] * 4)
+        for protected in (False, True):
+            settings.SEARCH_COALESCE = protected
+            settings.SEARCH_SHED_QUEUE_DEPTH = shed_depth if protected else 0
+            for scenario in ("identical", "distinct"):
+                # Fresh query text per run, so no run reuses another's cached embeddings
+                tag = f"{scenario} {int(protected)}"
+                if scenario == "identical":
+                    queries = [f"vpn not connecting {tag}"] * size
+                else:
+                    queries = [f"vpn not connecting {tag} {number}" for number in range(size)]
+                report = await burst(client, queries)
+                reports.append({"scenario": scenario, "protected": protected, **report})
+    finally:
+        await client.aclose()
+        await main.app.router.shutdown()
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=300, help="concurrent requests per burst")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    for report in asyncio.run(run(args.burst, args.embedding_latency)):
+        print(json.dumps(report))
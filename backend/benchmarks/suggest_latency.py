@@ -0,0 +1,84 @@
+"""
+Keystroke latency of the /suggest prefix index on a synthetic vocabulary:
+every prefix of sampled queries is looked up as if typed one character at a
+time, and single-article updates are timed the way the indexing listener
+applies them.
+
+    python -m benchmarks.suggest_latency --articles 10000 --queries 5000
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from indexing import UPSERT, ArticleDelta
+from suggest import SuggestionIndex
+
+WORDS = (
+    "vpn connection server password account speed protocol router kill switch dns leak install "
+    "android ios windows mac linux browser extension billing refund subscription streaming "
+    "netflix torrent split tunneling wireguard openvpn ikev2 firewall wifi hotspot error timeout"
+).split()
+
+
+def phrase(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 4)
+
+
+def run(articles: int, queries: int, tags: int, typed: int, seed: int = 0):
+    rng = random.Random(seed)
+    tag_names = [f"{rng.choice(WORDS)}-{number}" for number in range(tags)]
+    documents = [
+        {"id": number, "title": phrase(rng, 3, 8).capitalize(), "tags": rng.sample(tag_names, 3)}
+        for number in range(articles)
+    ]
+    query_counts = {phrase(rng, 1, 4): float(rng.paretovariate(1.2)) for _ in range(queries)}
+
+    index = SuggestionIndex()
+    started = time.perf_counter()
+    index.apply_deltas([ArticleDelta(UPSERT, doc["id"], doc) for doc in documents])
+    index.set_queries(query_counts)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    samples = rng.sample(list(query_counts), min(typed, len(query_counts)))
+    for text in samples:
+        for end in range(1, len(text) + 1):
+            started = time.perf_counter()
+            index.suggest(text[:end])
+            latencies.append(time.perf_counter() - started)
+
+    updates = []
+    for number in range(200):
+        doc = dict(rng.choice(documents), title=phrase(rng, 3, 8).capitalize())
+        started = time.perf_counter()
+        index.apply_deltas([ArticleDelta(UPSERT, doc["id"], doc)])
+        updates.append(time.perf_counter() - started)
+
+    return {
+        "articles": articles,
+        "queries": queries,
+        "phrases": len(index),
+        "build_s": round(build_seconds, 3),
+        "lookups": len(latencies),
+        "lookup_p50_ms": percentile_ms(latencies, 50),
+        "lookup_p99_ms": percentile_ms(latencies, 99),
+        "update_p50_ms": percentile_ms(updates, 50),
+        "update_p99_ms": percentile_ms(updates, 99),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--typed", type=int, default=500, help="queries typed character by character")
+    args = parser.parse_args()
+    print(json.dumps(run(args.articles, args.queries, args.tags, args.typed)))
@@ -0,0 +1,192 @@
+"""
+Reproducible end-to-end benchmark: generates a synthetic corpus, ingests
+it, and measures keyword search latency, vector search latency and /search
+throughput under concurrent clients. Everything runs offline against a
+throwaway SQLite database with the fake embedding and answer providers,
+so numbers depend on the code and the machine, not on remote services.
+
+    python -m benchmarks.suite --articles 10000 --output results.json
+    python -m benchmarks.suite --articles 10000 --compare results.json
+
+Prints one JSON document (git commit, environment, parameters, results).
+``--compare`` prints each metric as a ratio to a previous run; for
+latencies below 1.0 is faster, for throughputs above 1.0 is faster.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Configure before anything opens the database or reads Settings;
+# --output and --compare stay relative to where the suite was started
+START_DIR = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="faqrep-suite-"))
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("ANSWER_PROVIDER", "fake")
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+# Repeated queries would otherwise measure the result cache
+os.environ["SEARCH_CACHE_BACKEND"] = "none"
+# Startup cache warming would run concurrently with the measured requests
+os.environ["ANALYTICS_WARM_QUERIES"] = "0"
+
+import numpy as np
+
+from benchmarks import search_load
+from benchmarks.corpus import sample_queries, write_corpus
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def latency_report(latencies):
+    return {
+        "queries": len(latencies),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def bench_ingest(docs_dir: str, articles: int):
+    from init_db import ingest_docs
+
+    started = time.perf_counter()
+    report = ingest_docs(docs_dir, full=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "articles": report["added"],
+        "failed": report["failed"],
+        "embedded_chunks": report["embedded_chunks"],
+        "elapsed_s": round(elapsed, 3),
+        "articles_per_s": round(articles / elapsed, 1),
+        "stages": {f"{stage}_s": round(seconds, 3) for stage, seconds in report["timings"].items()},
+    }
+
+
+async def bench_keyword_search(queries):
+    from ai_engine import AIEngine
+    from database import AsyncSessionLocal
+    from search import SearchEngine, load_article_index
+
+    started = time.perf_counter()
+    load_article_index()
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    async with AsyncSessionLocal() as db:
+        engine = SearchEngine(db, AIEngine())
+        for query in queries:
+            started = time.perf_counter()
+            await engine.search_articles(query, limit=10)
+            latencies.append(time.perf_counter() - started)
+    return {"index_build_s": round(build_seconds, 3), **latency_report(latencies)}
+
+
+def bench_vector_search(queries):
+    from ai_engine import AIEngine
+    from database import get_read_session
+
+    ai_engine = AIEngine()
+    started = time.perf_counter()
+    with get_read_session() as db:
+        ai_engine.sync_vector_store(db)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        ai_engine.search(query, k=10)
+        latencies.append(time.perf_counter() - started)
+    return {"index_build_s": round(build_seconds, 3), **latency_report(latencies)}
+
+
+def run(args):
+    docs_dir = os.path.join(os.getcwd(), "docs")
+    results = {"corpus": write_corpus(docs_dir, args.articles, args.seed, args.workers)}
+    results["ingest"] = bench_ingest(docs_dir, args.articles)
+    queries = sample_queries(args.queries, args.seed)
+    results["keyword_search"] = asyncio.run(bench_keyword_search(queries))
+    results["vector_search"] = bench_vector_search(queries)
+    results["search_http"] = asyncio.run(
+        search_load.run("", args.requests, args.concurrency, args.embedding_latency)
+    )
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parameters": vars(args),
+        "results": results,
+    }
+
+
+def metrics(node, prefix=""):
+    """Flatten nested results into {"ingest.articles_per_s": value, ...}"""
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        # Load levels are identified by their concurrency
+        items = ((f"c{item.get('concurrency', number)}", item) for number, item in enumerate(node))
+    else:
+        return {prefix: node} if isinstance(node, (int, float)) and not isinstance(node, bool) else {}
+    flat = {}
+    for key, value in items:
+        flat.update(metrics(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def compare(current, baseline):
+    now, before = metrics(current["results"]), metrics(baseline["results"])
+    return {
+        name: round(value / before[name], 3)
+        for name, value in now.items()
+        if before.get(name) and name.split(".")[-1].endswith(("_ms", "_s"))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="corpus writer processes")
+    parser.add_argument("--queries", type=int, default=500, help="queries for the latency benchmarks")
+    parser.add_argument("--requests", type=int, default=200, help="/search requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--embedding-latency", type=float, default=0.0,
+                        help="Seconds each fake query embedding takes in the /search benchmark")
+    parser.add_argument("--output", help="also write the JSON document to this file")
+    parser.add_argument("--compare", help="JSON document from a previous run to compare against")
+    args = parser.parse_args()
+    output = os.path.join(START_DIR, args.output) if args.output else None
+    baseline_path = os.path.join(START_DIR, args.compare) if args.compare else None
+
+    document = run(args)
+    if output:
+        with open(output, "w") as f:
+            json.dump(document, f, indent=2)
+    json.dump(document, sys.stdout, indent=2)
+    print()
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        print(json.dumps({"baseline_commit": baseline.get("commit"), "ratios": compare(document, baseline)}, indent=2))
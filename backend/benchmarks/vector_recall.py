@@ -0,0 +1,97 @@
+"""
+Recall@k versus latency for the vector index types, measured against the
+exact flat index on synthetic clustered embeddings.
+
+    python -m benchmarks.vector_recall --vectors 100000 --dimension 384
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from vector_index import IndexSpec, build_index, normalize_rows
+
+CONFIGURATIONS = [
+    ("flat", "none", {}),
+    ("flat", "sq8", {}),
+    ("flat", "pq", {}),
+    ("ivf", "none", {"nprobe": 1}),
+    ("ivf", "none", {"nprobe": 8}),
+    ("ivf", "none", {"nprobe": 32}),
+    ("ivf", "sq8", {"nprobe": 16}),
+    ("ivf", "pq", {"nprobe": 16}),
+    ("hnsw", "none", {"ef_search": 16}),
+    ("hnsw", "none", {"ef_search": 64}),
+    ("hnsw", "none", {"ef_search": 256}),
+    ("hnsw", "sq8", {"ef_search": 64}),
+]
+
+
+def synthetic_embeddings(count: int, dimension: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors scattered around random topic centres, like chunk embeddings of related FAQs"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    assignment = rng.integers(0, clusters, count)
+    noise = rng.standard_normal((count, dimension)).astype(np.float32) * 0.6
+    return normalize_rows(centres[assignment] + noise)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def measure(index, queries: np.ndarray, k: int, truth: np.ndarray):
+    latencies = []
+    hits = 0
+    for row, query in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(ids[0].tolist()) & set(truth[row].tolist()))
+    return {
+        "recall_at_k": round(hits / (len(queries) * k), 4),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def run(count: int, dimension: int, queries: int, k: int, clusters: int):
+    vectors = synthetic_embeddings(count, dimension, clusters)
+    ids = np.arange(count, dtype=np.int64)
+    probes = synthetic_embeddings(queries, dimension, clusters, seed=1)
+
+    exact = build_index(vectors, ids, IndexSpec())
+    _, truth = exact.search(probes, k)
+
+    reports = []
+    for index_type, quantization, knobs in CONFIGURATIONS:
+        spec = IndexSpec(index_type=index_type, quantization=quantization, **knobs)
+        started = time.perf_counter()
+        index = build_index(vectors, ids, spec)
+        build_seconds = time.perf_counter() - started
+        report = {
+            "index": spec.factory_string(dimension, count),
+            **knobs,
+            "vectors": count,
+            "dimension": dimension,
+            "k": k,
+            "build_s": round(build_seconds, 3),
+            "bytes": int(faiss.serialize_index(index).size),
+        }
+        report.update(measure(index, probes, k, truth))
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=200)
+    args = parser.parse_args()
+    for report in run(args.vectors, args.dimension, args.queries, args.k, args.clusters):
+        print(json.dumps(report))
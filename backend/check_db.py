@@ -1,15 +1,22 @@
+from sqlalchemy import func
 from database import get_db_session
-from models import Article, Tag
+from models import Article, article_tag_names
 
 def check_database():
     with get_db_session() as db:
-        articles = db.query(Article).all()
+        # Only the columns printed below; content length is computed by the database
+        articles = db.query(
+            Article.id, Article.title, Article.category, func.length(Article.content).label("content_length")
+        ).all()
+        tags = {}
+        for article_id, name in db.execute(article_tag_names(article.id for article in articles)):
+            tags.setdefault(article_id, []).append(name)
         print(f"\nFound {len(articles)} articles:")
         for article in articles:
             print(f"\nTitle: {article.title}")
             print(f"Category: {article.category}")
-            print(f"Tags: {[tag.name for tag in article.tags]}")
-            print(f"Content length: {len(article.content)} chars")
+            print(f"Tags: {tags.get(article.id, [])}")
+            print(f"Content length: {article.content_length} chars")
             print("-" * 50)
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+"""
+Stampede protection for the request path.
+
+``SingleFlight`` / ``ThreadSingleFlight``: concurrent calls with the same
+key share one computation. The first caller runs it and the rest wait for
+its result, so a burst of identical searches costs one search.
+
+``Limiter`` / ``ThreadLimiter``: at most ``limit`` calls run at once and at
+most ``max_queue`` wait for a slot, none for longer than ``timeout``.
+Anything beyond that is shed with ``Overloaded`` straight away instead of
+queueing, so callers can degrade (keyword-only search, no generated
+answer) while latency stays bounded.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a limiter is saturated"""
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight coroutines on one event loop. The shared
+    computation runs as its own task, so a caller that is cancelled does not
+    cancel it for the others. Results are shared and must not be mutated.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.stats: Dict[str, int] = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is not None and flight.get_loop() is asyncio.get_running_loop():
+            self.stats["followers"] += 1
+            return await asyncio.shield(flight)
+        self.stats["leaders"] += 1
+        task = asyncio.ensure_future(func())
+        self._flights[key] = task
+
+        def landed(done):
+            if self._flights.get(key) is done:
+                del self._flights[key]
+
+        task.add_done_callback(landed)
+        return await asyncio.shield(task)
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, in_flight=len(self._flights))
+
+
+class ThreadSingleFlight:
+    """``SingleFlight`` for blocking calls made from several threads"""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"leaders": 0, "followers": 0}
+
+    def do(self, key: Hashable, func: Callable[..., T], *args, **kwargs) -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = {"done": threading.Event(), "result": None, "error": None}
+            self.stats["leaders" if leader else "followers"] += 1
+        if not leader:
+            flight["done"].wait()
+            if flight["error"] is not None:
+                raise flight["error"]
+            return flight["result"]
+        try:
+            flight["result"] = func(*args, **kwargs)
+            return flight["result"]
+        except BaseException as e:
+            flight["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight["done"].set()
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, in_flight=len(self._flights))
+
+
+class Limiter:
+    """
+    Concurrency limit with a bounded wait queue for coroutines on one
+    thread. Waiters are plain futures of the running loop, so the limiter is
+    not bound to a loop and survives several ``asyncio.run`` calls.
+    """
+
+    def __init__(self, limit: int, max_queue: int = 0, timeout: float = 5.0):
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        self.stats: Dict[str, int] = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0}
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.active >= self.limit:
+            if len(self._waiters) >= self.max_queue:
+                self.stats["shed"] += 1
+                raise Overloaded(f"{self.active} running and {len(self._waiters)} queued")
+            self.stats["queued"] += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                # Handed a slot as the timeout fired (wait_for can still time out then on 3.12+): pass it on
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise Overloaded(f"no slot within {self.timeout}s")
+            except BaseException:
+                # Cancelled after being handed a slot: pass it on
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            # The releasing caller handed its slot over; ``active`` is unchanged
+        else:
+            self.active += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Same thread as the waiter's loop; resolved before any timeout can cancel it
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, active=self.active, waiting=len(self._waiters), limit=self.limit)
+
+
+class ThreadLimiter:
+    """``Limiter`` for blocking calls made from several threads"""
+
+    def __init__(self, limit: int, max_queue: int = 0, timeout: float = 5.0):
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+        self.stats: Dict[str, int] = {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0}
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            if self.active >= self.limit:
+                if self.waiting >= self.max_queue:
+                    self.stats["shed"] += 1
+                    raise Overloaded(f"{self.active} running and {self.waiting} queued")
+                self.stats["queued"] += 1
+                self.waiting += 1
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.active >= self.limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["timed_out"] += 1
+                            raise Overloaded(f"no slot within {self.timeout}s")
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(self.stats, active=self.active, waiting=self.waiting, limit=self.limit)
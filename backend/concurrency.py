@@ -0,0 +1,139 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+from config import get_settings
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+# Calls submitted to the executor that no worker thread has picked up yet
+_queued = 0
+_queue_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Bounded pool for CPU-bound request work (BM25 scoring, query embedding,
+    vector search) so it never runs on the event loop. Unlike the default
+    executor its size is fixed by ``SEARCH_WORKER_THREADS``, so a burst of
+    requests queues here instead of starving the loop of threads.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_settings().SEARCH_WORKER_THREADS, thread_name_prefix="search"
+                )
+    return _executor
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run ``func`` on the bounded executor and await its result"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context over, as asyncio.to_thread does, so per-request state (metrics) follows
+    context = contextvars.copy_context()
+    global _queued
+    with _queue_lock:
+        _queued += 1
+    waiting = [True]
+
+    def picked_up():
+        global _queued
+        with _queue_lock:
+            if waiting[0]:
+                waiting[0] = False
+                _queued -= 1
+
+    def call():
+        picked_up()
+        return context.run(func, *args, **kwargs)
+
+    try:
+        return await loop.run_in_executor(get_executor(), call)
+    finally:
+        # Also when cancelled before a worker picked it up
+        picked_up()
+
+
+def queue_depth() -> int:
+    """Backlog of CPU-bound request work waiting for a worker thread"""
+    return _queued
+
+
+def backlogged() -> bool:
+    """Whether the backlog is past SEARCH_SHED_QUEUE_DEPTH, so requests should shed optional work"""
+    depth = get_settings().SEARCH_SHED_QUEUE_DEPTH
+    return bool(depth) and _queued > depth
+
+
+def shutdown_executor():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+class ReadWriteLock:
+    """
+    Any number of readers or one writer. Waiting writers hold back new
+    readers, so a steady stream of searches cannot starve an update. A
+    writer may re-enter and may read while writing; readers must not nest
+    or upgrade.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        if self._writer == threading.get_ident():
+            # Already exclusive
+            yield
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._condition.notify_all()
@@ -1,26 +1,167 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from contextlib import contextmanager
+import time
+from config import get_settings
+import metrics
+from models import Base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./faqrep.db"
+settings = get_settings()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+# Reads can go to a replica; on SQLite they use a separate read-only pool on the same file
+SQLALCHEMY_READ_DATABASE_URL = settings.DATABASE_READ_URL or SQLALCHEMY_DATABASE_URL
+
+def async_database_url(url: str) -> str:
+    """Same database through an asyncio driver (aiosqlite / asyncpg)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def is_memory(url: str) -> bool:
+    return is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+def engine_options(url: str, settings=settings) -> dict:
+    """Pool and driver arguments for ``url``, tuned from Settings"""
+    if is_sqlite(url):
+        if is_memory(url):
+            # One shared connection, or every session would see its own empty database
+            return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT / 1000},
+        }
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def sqlite_pragmas(settings=settings, read_only: bool = False) -> list:
+    """
+    WAL lets readers proceed while the search-log writer commits; NORMAL sync
+    is durable across application crashes in WAL mode; mmap and a larger page
+    cache keep hot pages out of read() calls.
+    """
+    pragmas = [
+        f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if settings.SQLITE_WAL:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+def _apply_pragmas(target: Engine, pragmas: list):
+    @event.listens_for(target, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+def _time_queries(target: Engine):
+    """Every statement's execution time lands in the "db_query" stage"""
+    @event.listens_for(target, "before_cursor_execute")
+    def query_started(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(target, "after_cursor_execute")
+    def query_finished(conn, cursor, statement, parameters, context, executemany):
+        metrics.record("db_query", time.perf_counter() - context._metrics_started)
+
+def build_engine(url: str, settings=settings, read_only: bool = False) -> Engine:
+    engine = create_engine(url, **engine_options(url, settings))
+    if is_sqlite(url):
+        _apply_pragmas(engine, sqlite_pragmas(settings, read_only))
+    if settings.METRICS_ENABLED:
+        _time_queries(engine)
+    return engine
+
+def build_async_engine(url: str, settings=settings, read_only: bool = False) -> AsyncEngine:
+    url = async_database_url(url)
+    options = engine_options(url, settings)
+    if is_sqlite(url):
+        # aiosqlite runs each connection on its own thread already
+        options.get("connect_args", {}).pop("check_same_thread", None)
+        if not is_memory(url):
+            # aiosqlite would otherwise open a new connection (and re-run the pragmas) per checkout
+            options["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(url, **options)
+    if is_sqlite(url):
+        _apply_pragmas(engine.sync_engine, sqlite_pragmas(settings, read_only))
+    if settings.METRICS_ENABLED:
+        _time_queries(engine.sync_engine)
+    return engine
+
+# An in-memory database exists once per engine, so it cannot be split
+SPLIT_READS = not is_memory(SQLALCHEMY_DATABASE_URL)
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+read_engine = build_engine(SQLALCHEMY_READ_DATABASE_URL, read_only=True) if SPLIT_READS else engine
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
-Base = declarative_base()
+# Request handlers use the async engines so queries never block the event loop.
+# expire_on_commit=False: attributes cannot lazy-load after an async commit.
+async_engine = build_async_engine(SQLALCHEMY_DATABASE_URL)
+async_read_engine = (
+    build_async_engine(SQLALCHEMY_READ_DATABASE_URL, read_only=True) if SPLIT_READS else async_engine
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # Columns and indexes added to tables that may predate them
+    from analytics import install_analytics
+    install_analytics(engine)
+    if settings.SEARCH_KEYWORD_BACKEND.lower() == "database":
+        from fulltext import install_fulltext
+        install_fulltext(engine)
 
 def get_db():
     db = SessionLocal()
+    started = time.perf_counter()
     try:
         yield db
     finally:
         db.close()
+        metrics.session_closed("write", started)
+
+async def get_async_db():
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            yield db
+    finally:
+        metrics.session_closed("write", started)
+
+async def get_read_db():
+    """Session for read-only request paths; never queues behind writers"""
+    started = time.perf_counter()
+    try:
+        async with AsyncReadSessionLocal() as db:
+            yield db
+    finally:
+        metrics.session_closed("read", started)
 
 @contextmanager
 def get_db_session():
@@ -29,3 +170,17 @@ def get_db_session():
         yield db
     finally:
         db.close()
+
+@contextmanager
+def get_read_session():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def dispose_engines():
+    for target in {async_engine, async_read_engine}:
+        await target.dispose()
+    for target in {engine, read_engine}:
+        target.dispose()
@@ -0,0 +1,167 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Disk hits record their last_used time in memory; pending touches are written
+# in one statement once this many pile up, this many seconds pass, or on a put
+TOUCH_BATCH = 512
+TOUCH_INTERVAL = 30.0
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different strings share an embedding"""
+    return " ".join(text.split())
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by a hash of the normalized text and model id.
+
+    The first tier is a bounded in-process LRU; the second is a SQLite file of
+    float32 blobs that survives restarts. Both tiers are capped by item count
+    and evict least recently used entries. Disk writes are batched: recency
+    updates from disk hits are deferred and flushed together, and
+    ``put_many`` stores a whole embedding batch in one transaction.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_items: int = 10_000, disk_items: int = 1_000_000):
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+        self._touched: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # A lost tail of the cache after a crash only costs re-embedding
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        key = cache_key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return vector
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= TOUCH_BATCH or time.monotonic() - self._last_flush > TOUCH_INTERVAL:
+                        self._write_touches()
+                        self._conn.commit()
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.stats["disk_hits"] += 1
+                    return vector
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, text: str, model: str, vector: np.ndarray):
+        self.put_many([text], model, [vector])
+
+    def put_many(self, texts: List[str], model: str, vectors):
+        """Store one embedding per text, committing them to disk together"""
+        entries = []
+        for text, vector in zip(texts, vectors):
+            vector = np.array(vector, dtype=np.float32)
+            # Cached arrays are shared between callers
+            vector.setflags(write=False)
+            entries.append((cache_key(text, model), vector))
+        if not entries:
+            return
+        with self._lock:
+            for key, vector in entries:
+                self._remember(key, vector)
+            if self._conn is not None:
+                now = time.time()
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [(key, model, vector.tobytes(), now) for key, vector in entries],
+                )
+                self._disk_count += self._conn.total_changes - before
+                self._write_touches()
+                self._conn.commit()
+                if self._disk_count > self.disk_items:
+                    self._evict_disk()
+
+    def _write_touches(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """Write pending recency updates"""
+        with self._lock:
+            if self._conn is not None:
+                self._write_touches()
+                self._conn.commit()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _evict_disk(self):
+        # Trim to 90% of the cap so eviction is not paid on every insert
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._disk_count - int(self.disk_items * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        self._disk_count -= excess
+        self.stats["disk_evictions"] += excess
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus current tier sizes"""
+        with self._lock:
+            return dict(self.stats, memory_items=len(self._memory), disk_items=self._disk_count)
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import random
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class EmbeddingProvider:
+    """
+    Turns batches of texts into float32 vectors.
+
+    ``embed_batch`` returns one row per input text and raises on failure;
+    retries, caching and concurrency are handled by the caller.
+    """
+
+    model_id = "unknown"
+    dimension = 0
+    max_batch_size = 16
+    # Requests worth running in parallel; local models already use every core
+    max_concurrency = 8
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class EmbeddingError(Exception):
+    """Raised when a batch could not be embedded after every retry"""
+
+
+class RateLimitError(Exception):
+    """Raised by providers when the backend asks us to slow down"""
+
+    def __init__(self, message: str = "rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the backend asked us to wait, if it said so"""
+    if getattr(error, "retry_after", None) is not None:
+        return float(error.retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ClaudeEmbeddingProvider(EmbeddingProvider):
+    """Asks a Claude model to print embeddings for a batch of texts as JSON"""
+
+    max_batch_size = 8
+
+    def __init__(self, client, model: str = "claude-2", dimension: int = 1536):
+        self.client = client
+        self.model_id = model
+        self.dimension = dimension
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        response = self.client.messages.create(
+            model=self.model_id,
+            max_tokens=1000 * len(texts),
+            system=(
+                f"Generate a vector embedding for each text in the following JSON array. "
+                f"Return only a JSON array containing one list of {self.dimension} numbers per text, in order."
+            ),
+            messages=[{"role": "user", "content": json.dumps(texts)}]
+        )
+        embeddings = np.array(json.loads(response.content[0].text), dtype=np.float32)
+        if embeddings.shape != (len(texts), self.dimension):
+            raise ValueError(f"Unexpected embedding shape {embeddings.shape}")
+        return embeddings
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """
+    CPU-only local embeddings via sentence-transformers; works offline once
+    the model is downloaded.
+
+    ``dimension`` truncates vectors to their leading components (then
+    re-normalizes), and ``quantize`` applies dynamic int8 quantization to the
+    model's linear layers for faster CPU inference.
+    """
+
+    max_batch_size = 64
+    max_concurrency = 1
+
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 dimension: int = 0, quantize: bool = False, device: str = "cpu"):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.model = self._load_model(device)
+        self._requested_dimension = dimension
+        self.dimension = dimension or self.model.get_sentence_embedding_dimension()
+        self.model_id = f"{model_name}:{self.dimension}{':int8' if quantize else ''}"
+
+    def _load_model(self, device: str):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.model_name, device=device)
+        if self.quantize:
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.max_batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32)
+        if self._requested_dimension and self._requested_dimension < embeddings.shape[1]:
+            embeddings = embeddings[:, :self._requested_dimension]
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic offline provider for tests and benchmarks.
+
+    Vectors are derived from a hash of the text, so equal texts get equal
+    vectors. ``latency`` simulates a per-request round trip and
+    ``rate_limit_every`` makes every n-th request fail with RateLimitError.
+    """
+
+    def __init__(self, dimension: int = 384, latency: float = 0.0, rate_limit_every: int = 0,
+                 max_batch_size: int = 32):
+        self.model_id = f"fake-{dimension}"
+        self.dimension = dimension
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.texts_embedded = 0
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            raise RateLimitError(retry_after=0.0)
+        self.texts_embedded += len(texts)
+        return np.stack([self._vector(text) for text in texts])
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def create_embedding_provider(settings, client=None) -> EmbeddingProvider:
+    """Build the provider named by ``settings.EMBEDDING_PROVIDER``"""
+    name = settings.EMBEDDING_PROVIDER.lower()
+    if name == "local":
+        return SentenceTransformerEmbeddingProvider(
+            settings.EMBEDDING_MODEL,
+            dimension=settings.EMBEDDING_DIMENSION,
+            quantize=settings.EMBEDDING_QUANTIZE,
+        )
+    if name == "claude":
+        if client is None:
+            raise ValueError("CLAUDE_API_KEY environment variable not set")
+        return ClaudeEmbeddingProvider(client, dimension=settings.EMBEDDING_DIMENSION or 1536)
+    if name == "fake":
+        return FakeEmbeddingProvider(dimension=settings.EMBEDDING_DIMENSION or 384)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {settings.EMBEDDING_PROVIDER}")
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,149 @@
+"""
+Keyword retrieval pushed into the database, as an alternative to the
+in-process BM25F index (SEARCH_KEYWORD_BACKEND=database).
+
+SQLite: an external-content FTS5 table over articles(title, plain_text),
+kept in sync by triggers and ranked with bm25(). PostgreSQL: a generated,
+weighted tsvector column with a GIN index, ranked with ts_rank(). Both
+index the markup-free ``plain_text`` written by preprocess.py. Either
+way the index lives with the rows, so every worker shares it and process
+memory does not grow with the corpus.
+"""
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection, Engine
+
+from database import get_read_session
+from preprocess import tokenize
+from search_index import FIELD_BOOSTS
+
+FTS_TABLE = "articles_fts"
+# Postgres text search configuration for both the column and the queries
+TEXT_SEARCH_CONFIG = "english"
+
+SQLITE_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, plain_text, content='articles', content_rowid='id', tokenize='unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, plain_text) VALUES (new.id, new.title, new.plain_text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON articles BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, plain_text) VALUES ('delete', old.id, old.title, old.plain_text);
+    END""",
+    # Only text edits touch the index; tag edits just bump updated_at
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF title, plain_text ON articles BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, plain_text) VALUES ('delete', old.id, old.title, old.plain_text);
+        INSERT INTO {FTS_TABLE}(rowid, title, plain_text) VALUES (new.id, new.title, new.plain_text);
+    END""",
+]
+
+POSTGRES_SCHEMA = [
+    # Title weighted A, body weighted B; Postgres fills it for existing rows
+    f"""ALTER TABLE articles ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(plain_text, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_articles_search_vector ON articles USING gin (search_vector)",
+]
+
+# bm25() takes one weight per FTS5 column, in column order
+SQLITE_RANK = "bm25({table}, {weights})".format(
+    table=FTS_TABLE, weights=", ".join(str(FIELD_BOOSTS[name]) for name in ("title", "content"))
+)
+# ts_rank weights are {D, C, B, A}; B:A matches the content:title boost.
+# Normalization 1 divides by 1 + log(document length), like BM25's length term.
+POSTGRES_RANK = "ts_rank('{{0.1, 0.2, {body}, 1.0}}', search_vector, q, 1)".format(
+    body=round(FIELD_BOOSTS["content"] / FIELD_BOOSTS["title"], 4)
+)
+
+
+def install_fulltext(engine: Engine):
+    """Create the full-text structures if missing, indexing existing articles"""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+            ).first()
+            for statement in SQLITE_SCHEMA:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for statement in POSTGRES_SCHEMA:
+                conn.execute(text(statement))
+        else:
+            raise ValueError(f"Database full-text search is not supported on {dialect}")
+
+
+def match_expression(terms: Set[str], dialect: str) -> str:
+    """Any-term query, like the in-memory index; tokens are [a-z0-9]+ so need no escaping"""
+    if dialect == "sqlite":
+        return " OR ".join(f'"{term}"' for term in sorted(terms))
+    return " | ".join(sorted(terms))
+
+
+def search_statement(dialect: str, filtered: bool):
+    if dialect == "sqlite":
+        # bm25() cannot share a SELECT with a window function, so rank in a subquery
+        sql = (
+            "SELECT id, score, count(*) OVER () AS matches FROM ("
+            f"SELECT rowid AS id, -{SQLITE_RANK} AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+            + (" AND rowid IN :allowed" if filtered else "")
+            + ") ORDER BY score DESC LIMIT :limit"
+        )
+    else:
+        sql = (
+            f"SELECT id, {POSTGRES_RANK} AS score, count(*) OVER () AS matches "
+            f"FROM articles, to_tsquery('{TEXT_SEARCH_CONFIG}', :match) AS q WHERE search_vector @@ q"
+            + (" AND id IN :allowed" if filtered else "")
+            + " ORDER BY score DESC LIMIT :limit"
+        )
+    statement = text(sql)
+    if filtered:
+        statement = statement.bindparams(bindparam("allowed", expanding=True))
+    return statement
+
+
+class FullTextIndex:
+    """
+    Drop-in for ``InvertedIndex`` inside ``ArticleIndex`` that queries the
+    database. Documents are maintained by the database itself, so the
+    add/remove hooks do nothing and synced documents need no tokens.
+    """
+
+    maintained_by_database = True
+
+    def __init__(self, session_factory: Callable = get_read_session):
+        self.session_factory = session_factory
+
+    def add_document(self, doc_id: int, fields):
+        pass
+
+    def remove_document(self, doc_id: int):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query: str, limit: int = 10,
+               allowed: Optional[Set[int]] = None) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        Top ``limit`` (article id, score) pairs, best first, and the number of
+        matching articles, ranked in SQL. ``allowed`` restricts the candidates.
+        """
+        terms = set(tokenize(query))
+        if not terms or (allowed is not None and not allowed):
+            return [], 0
+        with self.session_factory() as db:
+            conn: Connection = db.connection()
+            dialect = conn.dialect.name
+            parameters = {"match": match_expression(terms, dialect), "limit": limit}
+            if allowed is not None:
+                parameters["allowed"] = sorted(allowed)
+            rows = conn.execute(search_statement(dialect, allowed is not None), parameters).all()
+        if not rows:
+            return [], 0
+        return [(row.id, float(row.score)) for row in rows], rows[0].matches
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import time
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from coalesce import Overloaded
+from concurrency import run_cpu
+from embeddings import EmbeddingError
+from metrics import record
+from search_index import ArticleIndex
+
+Ranking = List[Tuple[int, float]]
+
+
+def reciprocal_rank_fusion(legs: Dict[str, Ranking], weights: Dict[str, float], k: int = 60) -> Dict[int, float]:
+    """Sum weight / (k + rank) over every leg that returned the document"""
+    fused: Dict[int, float] = {}
+    for leg, ranking in legs.items():
+        weight = weights.get(leg, 1.0)
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return fused
+
+
+def weighted_score_fusion(legs: Dict[str, Ranking], weights: Dict[str, float]) -> Dict[int, float]:
+    """Min-max normalize each leg's scores, then take the weighted sum"""
+    fused: Dict[int, float] = {}
+    for leg, ranking in legs.items():
+        if not ranking:
+            continue
+        weight = weights.get(leg, 1.0)
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        span = high - low
+        for doc_id, score in ranking:
+            normalized = (score - low) / span if span else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * normalized
+    return fused
+
+
+class HybridRetriever:
+    """
+    Runs the BM25 keyword leg and the vector leg concurrently, with category
+    and tag filters applied inside each leg, and fuses the two rankings.
+    Vector hits below ``min_similarity`` are dropped before fusion, so a
+    query with no related articles does not rank unrelated ones.
+
+    Under overload the vector leg is dropped and the search is keyword-only
+    (``metadata["degraded"]``): when the caller asks for ``keyword_only``, or
+    when the query embedding limiter sheds the call or the model fails.
+    """
+
+    def __init__(self, article_index: ArticleIndex, ai_engine=None, fusion: str = "rrf",
+                 lexical_weight: float = 1.0, vector_weight: float = 1.0, rrf_k: int = 60,
+                 candidates: int = 50, min_similarity: float = 0.0):
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion method: {fusion}")
+        self.article_index = article_index
+        self.ai_engine = ai_engine
+        self.fusion = fusion
+        self.weights = {"lexical": lexical_weight, "vector": vector_weight}
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.min_similarity = min_similarity
+
+    @classmethod
+    def from_settings(cls, article_index: ArticleIndex, ai_engine, settings) -> "HybridRetriever":
+        return cls(
+            article_index,
+            ai_engine,
+            fusion=settings.SEARCH_FUSION.lower(),
+            lexical_weight=settings.SEARCH_LEXICAL_WEIGHT,
+            vector_weight=settings.SEARCH_VECTOR_WEIGHT,
+            rrf_k=settings.SEARCH_RRF_K,
+            candidates=settings.SEARCH_CANDIDATES,
+            min_similarity=settings.SEARCH_MIN_SIMILARITY,
+        )
+
+    def _lexical(self, query: str, allowed: Optional[Set[int]], depth: int):
+        started = time.perf_counter()
+        ranking, matches = self.article_index.keywords.search(query, limit=depth, allowed=allowed)
+        seconds = time.perf_counter() - started
+        record("lexical", seconds)
+        return ranking, matches, seconds
+
+    def _vector(self, query: str, allowed: Optional[Set[int]], depth: int):
+        started = time.perf_counter()
+        if self.ai_engine is None or self.ai_engine.vector_store is None:
+            return [], time.perf_counter() - started
+        try:
+            hits = self.ai_engine.search(query, k=depth * 2, article_ids=allowed)
+        except (Overloaded, EmbeddingError):
+            return None, time.perf_counter() - started
+        # Several chunks can come from one article; keep each article's best chunk
+        best: Dict[int, float] = {}
+        for hit in hits:
+            if hit["score"] < self.min_similarity:
+                continue
+            if hit["score"] > best.get(hit["id"], float("-inf")):
+                best[hit["id"]] = hit["score"]
+        ranking = sorted(best.items(), key=itemgetter(1), reverse=True)[:depth]
+        seconds = time.perf_counter() - started
+        record("vector", seconds)
+        return ranking, seconds
+
+    async def search(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                     limit: int = 10, offset: int = 0,
+                     keyword_only: bool = False) -> Tuple[Ranking, Dict[str, Any]]:
+        """Return the fused (article id, score) page and metadata with weights and leg timings"""
+        started = time.perf_counter()
+        allowed = self.article_index.filters.matching(filters)
+        filter_seconds = time.perf_counter() - started
+        depth = max(self.candidates, offset + limit)
+
+        degraded = None
+        if allowed is not None and not allowed:
+            lexical, matches, lexical_seconds = [], 0, 0.0
+            vector, vector_seconds = [], 0.0
+        elif keyword_only:
+            # Skip the embedding and vector search, answer from the keyword index
+            lexical, matches, lexical_seconds = await run_cpu(self._lexical, query, allowed, depth)
+            vector, vector_seconds = [], 0.0
+            degraded = "keyword_only"
+        else:
+            # Both legs are CPU-bound; they run on the bounded executor, off the event loop
+            (lexical, matches, lexical_seconds), (vector, vector_seconds) = await asyncio.gather(
+                run_cpu(self._lexical, query, allowed, depth),
+                run_cpu(self._vector, query, allowed, depth),
+            )
+            if vector is None:
+                vector, degraded = [], "keyword_only"
+
+        fusion_started = time.perf_counter()
+        legs = {"lexical": lexical, "vector": vector}
+        if self.fusion == "rrf":
+            fused = reciprocal_rank_fusion(legs, self.weights, self.rrf_k)
+        else:
+            fused = weighted_score_fusion(legs, self.weights)
+        ranked = heapq.nlargest(offset + limit, fused.items(), key=itemgetter(1))[offset:]
+        fusion_seconds = time.perf_counter() - fusion_started
+        record("filters", filter_seconds)
+        record("fusion", fusion_seconds)
+
+        metadata = {
+            "fusion": self.fusion,
+            "weights": dict(self.weights),
+            "candidates": {"lexical": len(lexical), "vector": len(vector)},
+            "keyword_matches": matches,
+            "filtered_articles": None if allowed is None else len(allowed),
+            "degraded": degraded,
+            "timings_ms": {
+                "filters": round(filter_seconds * 1000, 3),
+                "lexical": round(lexical_seconds * 1000, 3),
+                "vector": round(vector_seconds * 1000, 3),
+                "fusion": round(fusion_seconds * 1000, 3),
+                "total": round((time.perf_counter() - started) * 1000, 3),
+            },
+        }
+        return ranked, metadata
@@ -0,0 +1,259 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from models import Article, ArticleChunk, article_tag_names, utcnow
+from preprocess import prepare_article, preprocess_article
+
+UPSERT = "upsert"
+DELETE = "delete"
+RESYNC = "resync"
+
+
+@dataclass
+class ArticleDelta:
+    """A single committed change to an article"""
+    op: str
+    article_id: Optional[int] = None
+    document: Dict[str, Any] = field(default_factory=dict)
+
+
+Listener = Callable[[List[ArticleDelta]], None]
+
+_listeners: List[Listener] = []
+
+
+def register_listener(listener: Listener):
+    """Call ``listener`` with the article deltas of every committed transaction"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def unregister_listener(listener: Listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def as_watermark(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize a timestamp for comparison; SQLite hands back naive UTC values"""
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def chunk_document(chunk: ArticleChunk) -> Dict[str, Any]:
+    loaded = "embedding" not in inspect(chunk).unloaded
+    return {
+        "position": chunk.position,
+        "text": chunk.text,
+        "hash": chunk.content_hash,
+        "embedding": chunk.embedding if loaded else None,
+        "embedding_model": chunk.embedding_model if loaded else None,
+    }
+
+
+def article_document(article: Article) -> Dict[str, Any]:
+    """
+    Snapshot the fields the search structures need from an article. Tokens
+    and chunks are only included when loaded, i.e. when the text changed in
+    this session; consumers keep what they have for the rest.
+    """
+    document = {
+        "id": article.id,
+        "title": article.title,
+        "category": article.category,
+        "tags": [tag.name for tag in article.tags],
+        "updated_at": as_watermark(article.updated_at),
+    }
+    unloaded = inspect(article).unloaded
+    if "tokens" not in unloaded and article.tokens is not None:
+        document["tokens"] = article.tokens.split()
+    if "chunks" not in unloaded:
+        document["chunks"] = [chunk_document(chunk) for chunk in article.chunks]
+    return document
+
+
+def _pending(session: Session) -> Dict[Any, ArticleDelta]:
+    return session.info.setdefault("article_deltas", {})
+
+
+@event.listens_for(Session, "before_flush")
+def _touch_modified_articles(session, flush_context, instances):
+    # Tag-only edits do not update the articles row, so bump the version here
+    for obj in session.dirty:
+        if isinstance(obj, Article) and session.is_modified(obj):
+            obj.updated_at = utcnow()
+
+
+@event.listens_for(Session, "before_flush")
+def _preprocess_changed_articles(session, flush_context, instances):
+    # Text edited without its preprocessed forms (anything but ingest) gets them here;
+    # title edits too, since chunk metadata carries the title
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Article):
+            attributes = inspect(obj).attrs
+            edited = attributes.content.history.has_changes() or attributes.title.history.has_changes()
+            if edited and not attributes.plain_text.history.has_changes():
+                prepare_article(obj)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_article_changes(session, flush_context):
+    pending = _pending(session)
+    for obj in session.deleted:
+        if isinstance(obj, Article):
+            pending[obj.id] = ArticleDelta(DELETE, obj.id)
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Article):
+            pending[obj.id] = ArticleDelta(UPSERT, obj.id, article_document(obj))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_change(orm_execute_state):
+    # Bulk UPDATE/DELETE statements bypass the unit of work; ask listeners to resync
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is Article:
+            _pending(orm_execute_state.session)[RESYNC] = ArticleDelta(RESYNC)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_article_changes(session):
+    pending = session.info.pop("article_deltas", None)
+    if not pending:
+        return
+    deltas = list(pending.values())
+    for listener in list(_listeners):
+        try:
+            listener(deltas)
+        except Exception as e:
+            print(f"Error applying article changes: {str(e)}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_article_changes(session):
+    session.info.pop("article_deltas", None)
+
+
+def load_documents(db: Session, article_ids: Optional[Iterable[int]] = None,
+                   since: Optional[datetime] = None, with_tokens: bool = True,
+                   with_chunks: bool = False) -> List[Dict[str, Any]]:
+    """
+    Load article snapshots, optionally only those changed after ``since``:
+    one query for the rows, one for their tags and, ``with_chunks``, one for
+    their chunks and stored embeddings. ``with_tokens`` adds the body's
+    token stream. Rows never preprocessed (bulk inserts) are preprocessed
+    from their content on the fly.
+    """
+    columns = [Article.id, Article.title, Article.category, Article.updated_at,
+               Article.tokens.is_(None).label("unprocessed")]
+    if with_tokens:
+        columns.append(Article.tokens)
+    query = db.query(*columns)
+    if article_ids is not None:
+        query = query.filter(Article.id.in_(list(article_ids)))
+    if since is not None:
+        query = query.filter(Article.updated_at > since)
+    documents = {}
+    unprocessed = []
+    for row in query:
+        documents[row.id] = {
+            "id": row.id,
+            "title": row.title,
+            "category": row.category,
+            "tags": [],
+            "updated_at": as_watermark(row.updated_at),
+        }
+        if with_tokens:
+            documents[row.id]["tokens"] = row.tokens.split() if row.tokens is not None else []
+        if with_chunks:
+            documents[row.id]["chunks"] = []
+        if row.unprocessed:
+            unprocessed.append(row.id)
+    if documents:
+        for article_id, name in db.execute(article_tag_names(documents)):
+            documents[article_id]["tags"].append(name)
+    if documents and with_chunks:
+        chunks = db.query(
+            ArticleChunk.article_id, ArticleChunk.position, ArticleChunk.text, ArticleChunk.content_hash,
+            ArticleChunk.embedding, ArticleChunk.embedding_model
+        ).filter(ArticleChunk.article_id.in_(list(documents))).order_by(ArticleChunk.article_id, ArticleChunk.position)
+        for row in chunks:
+            documents[row.article_id]["chunks"].append({
+                "position": row.position,
+                "text": row.text,
+                "hash": row.content_hash,
+                "embedding": row.embedding,
+                "embedding_model": row.embedding_model,
+            })
+    if unprocessed and (with_tokens or with_chunks):
+        for row in db.query(Article.id, Article.content).filter(Article.id.in_(unprocessed)):
+            prepared = preprocess_article(row.content)
+            if with_tokens:
+                documents[row.id]["tokens"] = prepared["tokens"].split()
+            if with_chunks:
+                documents[row.id]["chunks"] = [
+                    dict(chunk, embedding=None, embedding_model=None) for chunk in prepared["chunks"]
+                ]
+    return list(documents.values())
+
+
+def changes_since(db: Session, watermark: Optional[datetime], known: Dict[int, Optional[datetime]],
+                  with_tokens: bool = True, with_chunks: bool = False) -> List[ArticleDelta]:
+    """
+    Compute the deltas a structure holding ``known`` (article id -> the
+    ``updated_at`` it applied, None if unknown) needs to catch up from
+    ``watermark``.
+
+    ``updated_at`` is stamped before commit, so a transaction can commit
+    after another that stamped a later time; reading only past the
+    watermark would skip it for good. Rows are therefore read from
+    INDEX_SYNC_OVERLAP seconds behind the watermark, and those the
+    structure already holds at the same version are dropped before their
+    documents are loaded. Deletions and never-seen rows are detected by
+    comparing row counts and only then diffing ids, so an idle catch-up
+    costs two small queries.
+    """
+    options = {"with_tokens": with_tokens, "with_chunks": with_chunks}
+    if watermark is None:
+        documents = load_documents(db, **options)
+    else:
+        since = watermark - timedelta(seconds=get_settings().INDEX_SYNC_OVERLAP)
+        changed = [
+            article_id
+            for article_id, updated_at in db.query(Article.id, Article.updated_at).filter(Article.updated_at > since)
+            if known.get(article_id) is None or known[article_id] != as_watermark(updated_at)
+        ]
+        documents = load_documents(db, article_ids=changed, **options) if changed else []
+    deltas = [ArticleDelta(UPSERT, doc["id"], doc) for doc in documents]
+
+    expected = set(known) | {doc["id"] for doc in documents}
+    if db.query(Article.id).count() != len(expected):
+        existing = {article_id for (article_id,) in db.query(Article.id)}
+        deltas.extend(ArticleDelta(DELETE, article_id) for article_id in expected - existing)
+        # Rows older than the watermark that the structure never saw
+        missing = existing - expected
+        if missing:
+            deltas.extend(ArticleDelta(UPSERT, doc["id"], doc) for doc in load_documents(db, article_ids=missing, **options))
+    return deltas
+
+
+def record_versions(versions: Dict[int, Optional[datetime]], deltas: Iterable[ArticleDelta]):
+    """Track the ``updated_at`` each article was applied at, for ``changes_since``"""
+    for delta in deltas:
+        if delta.op == UPSERT and delta.article_id is not None:
+            versions[delta.article_id] = delta.document.get("updated_at")
+        elif delta.op == DELETE:
+            versions.pop(delta.article_id, None)
+
+
+def advance_watermark(watermark: Optional[datetime], deltas: Iterable[ArticleDelta]) -> Optional[datetime]:
+    for delta in deltas:
+        updated_at = delta.document.get("updated_at")
+        if updated_at is not None and (watermark is None or updated_at > watermark):
+            watermark = updated_at
+    return watermark
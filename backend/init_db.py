@@ -1,10 +1,21 @@
-from database import init_db, get_db_session
-from models import Article, Tag, Base
-from sqlalchemy import create_engine
+from database import SQLALCHEMY_DATABASE_URL, init_db, get_db_session, is_memory, is_sqlite
+from models import Article, ArticleChunk, ArticleFeedbackStats, Feedback, Tag, article_tags
+from sqlalchemy import create_engine, or_
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import selectinload
 import re
 import os
+import time
+import hashlib
+import argparse
 import markdown2
+from concurrent.futures import ProcessPoolExecutor
 from ai_engine import AIEngine
+from config import get_settings
+from embeddings import EmbeddingError
+from snippets import article_summary
+from preprocess import apply_preprocessed, preprocess_article, prepare_article
+from result_cache import get_result_cache
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,6 +28,9 @@ if api_key:
 else:
     print("No API key found!")
 
+# Below this many changed files the process pool costs more than it saves
+PARALLEL_PARSE_THRESHOLD = 16
+
 def slugify(title):
     # Convert to lowercase and replace spaces with hyphens
     slug = title.lower()
@@ -69,71 +83,254 @@ def parse_markdown_file(file_path):
         'category': category or 'Uncategorized',
         'tags': tags,
         'content': html_content,
-        'raw_content': '\n'.join(content_lines)  # Store raw markdown for embedding
+        # Shown in search results instead of the full body
+        'summary': article_summary(title, html_content),
+        # Plain text, index tokens and hashed chunks, computed here in the parse workers
+        **preprocess_article(html_content),
     }
 
-def create_initial_data():
-    """Create initial articles from markdown files"""
-    docs_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'docs')
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def _parse_source(item):
+    # Runs in a worker process; returns the relative path with its parsed data
+    source_path, file_path = item
+    return source_path, parse_markdown_file(file_path)
+
+def parse_markdown_files(items, workers=None):
+    """Parse (source_path, file_path) pairs, fanning out to a process pool for larger batches"""
+    if len(items) < PARALLEL_PARSE_THRESHOLD or workers == 1:
+        return [_parse_source(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(items) // ((workers or os.cpu_count() or 1) * 4))
+        return list(pool.map(_parse_source, items, chunksize=chunksize))
+
+def upsert_tags(db, names):
+    """Return a name -> Tag map, creating missing tags with a single lookup query"""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in db.query(Tag).filter(Tag.name.in_(names))}
+    missing = [Tag(name=name) for name in names - set(tags)]
+    db.add_all(missing)
+    tags.update((tag.name, tag) for tag in missing)
+    return tags
+
+def ingest_docs(docs_dir=None, full=False, embed=True, workers=None, batch_size=100):
+    """
+    Sync articles with the markdown files in ``docs_dir``.
+
+    Each file is content-hashed and only new or changed files are parsed and
+    written; articles whose file disappeared are deleted. A file renamed
+    without a title change keeps its article (and the slug it owns), so
+    renames are updates rather than a delete plus a colliding insert.
+    ``full`` wipes all articles, tags, chunks and feedback first. Returns a
+    report of files added, changed, unchanged and removed with per-stage
+    timings.
+    """
+    docs_dir = docs_dir or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'docs')
+    report = {
+        "added": 0, "changed": 0, "unchanged": 0, "removed": 0, "failed": 0, "embedded_chunks": 0, "timings": {}
+    }
+    timings = report["timings"]
     
     if not os.path.exists(docs_dir):
         print(f"Docs directory not found at {docs_dir}")
-        return
+        return report
+    
+    started = time.perf_counter()
     
     with get_db_session() as db:
-        # Create tables
-        Base.metadata.create_all(db.get_bind())
+        # Create tables (and the full-text index when that backend is selected)
+        init_db()
         
-        # Clear existing data
-        db.query(Article).delete()
-        db.query(Tag).delete()
-        db.commit()
+        if full:
+            # Clear existing data; bulk deletes skip ORM cascades, so rows pointing at
+            # articles go first rather than being left for reused article ids
+            db.execute(article_tags.delete())
+            db.query(ArticleChunk).delete()
+            db.query(ArticleFeedbackStats).delete()
+            db.query(Feedback).delete()
+            db.query(Article).delete()
+            db.query(Tag).delete()
+            db.commit()
         
-        ai_engine = AIEngine()
-        
-        # Process each markdown file
-        for filename in os.listdir(docs_dir):
+        # Hash every file and compare with what was ingested last time
+        stage = time.perf_counter()
+        hashes = {}
+        for filename in sorted(os.listdir(docs_dir)):
             if filename.endswith('.md'):
-                file_path = os.path.join(docs_dir, filename)
-                print(f"Processing {filename}...")
-                
-                try:
-                    data = parse_markdown_file(file_path)
-                    
-                    # Create article
-                    article = Article(
-                        title=data['title'],
-                        slug=slugify(data['title']),
-                        category=data['category'],
-                        content=data['content']
+                with open(os.path.join(docs_dir, filename), 'rb') as f:
+                    hashes[filename] = file_hash(f.read())
+        
+        rows = db.query(Article.id, Article.slug, Article.source_path, Article.content_hash).all()
+        existing = {row.source_path: row for row in rows if row.source_path is not None}
+        # Rows ingested before source paths were tracked are matched by slug instead
+        by_slug = {row.slug: row for row in rows if row.source_path is None}
+        pending = []
+        for source_path, digest in hashes.items():
+            row = existing.get(source_path)
+            if row is not None and row.content_hash == digest:
+                report["unchanged"] += 1
+            else:
+                pending.append((source_path, os.path.join(docs_dir, source_path)))
+        removed = {row.id: row for path, row in existing.items() if path not in hashes}
+        # A removed row holds its slug until deleted; a new file with that slug takes the row over
+        removed_by_slug = {row.slug: row for row in removed.values()}
+        timings["scan"] = time.perf_counter() - stage
+        
+        # Parse and render changed files in parallel
+        stage = time.perf_counter()
+        parsed = parse_markdown_files(pending, workers=workers)
+        timings["parse"] = time.perf_counter() - stage
+        
+        # Write in batched transactions
+        stage = time.perf_counter()
+        written = []
+        for start in range(0, len(parsed), batch_size):
+            batch = parsed[start:start + batch_size]
+            try:
+                tags = upsert_tags(db, (name for _, data in batch for name in data['tags']))
+                # Match files to articles by path, falling back to slug for rows ingested before paths
+                # were tracked and for rows whose file was renamed
+                matches = {}
+                renamed = []
+                for source_path, data in batch:
+                    slug = slugify(data['title'])
+                    row = existing.get(source_path) or by_slug.get(slug)
+                    if row is None and slug in removed_by_slug:
+                        row = removed_by_slug.pop(slug)
+                        renamed.append(row)
+                    matches[source_path] = row
+                articles = {
+                    article.id: article
+                    # Tags and chunks eagerly: both collections are replaced and read by the index snapshot
+                    for article in db.query(Article).options(
+                        selectinload(Article.tags), selectinload(Article.chunks)
+                    ).filter(
+                        Article.id.in_([row.id for row in matches.values() if row is not None])
                     )
-                    
-                    # Create tags
-                    for tag_name in data['tags']:
-                        tag = db.query(Tag).filter_by(name=tag_name).first()
-                        if not tag:
-                            tag = Tag(name=tag_name)
-                            db.add(tag)
-                        article.tags.append(tag)
-                    
-                    db.add(article)
-                    db.commit()
-                    
-                    # Generate and store embedding
-                    embedding = ai_engine.get_embedding(data['raw_content'])
-                    article.embedding = embedding.tobytes()
-                    db.commit()
-                    
-                except Exception as e:
-                    print(f"Error processing {filename}: {str(e)}")
-                    db.rollback()
+                }
+                counts = {"added": 0, "changed": 0}
+                batch_written = []
+                for source_path, data in batch:
+                    row = matches[source_path]
+                    article = articles.get(row.id) if row is not None else None
+                    if article is None:
+                        article = Article()
+                        db.add(article)
+                        counts["added"] += 1
+                    else:
+                        counts["changed"] += 1
+                    article.title = data['title']
+                    article.slug = slugify(data['title'])
+                    article.category = data['category']
+                    article.content = data['content']
+                    article.summary = data['summary']
+                    apply_preprocessed(article, data)
+                    article.source_path = source_path
+                    article.content_hash = hashes[source_path]
+                    article.tags = [tags[name] for name in dict.fromkeys(data['tags']) if name in tags]
+                    batch_written.append(article)
+                db.commit()
+                for row in renamed:
+                    removed.pop(row.id, None)
+                report["added"] += counts["added"]
+                report["changed"] += counts["changed"]
+                written.extend(batch_written)
+            except Exception as e:
+                print(f"Error writing batch starting at {batch[0][0]}: {str(e)}")
+                db.rollback()
+                # Rows this batch meant to take over are deleted as removed after all
+                removed_by_slug.update((row.slug, row) for row in renamed)
+                report["failed"] += len(batch)
+        
+        if removed:
+            for article in db.query(Article).options(selectinload(Article.tags)).filter(Article.id.in_(list(removed))):
+                db.delete(article)
+            db.commit()
+            report["removed"] = len(removed)
+        
+        # Articles ingested before summaries or preprocessing existed get them from their stored content
+        backfill = db.query(Article).options(selectinload(Article.tags), selectinload(Article.chunks)).filter(
+            or_(Article.summary.is_(None), Article.tokens.is_(None))
+        ).all()
+        for article in backfill:
+            article.summary = article_summary(article.title, article.content)
+            prepare_article(article)
+        if backfill:
+            db.commit()
+        timings["write"] = time.perf_counter() - stage
+        
+        # Embed the chunks that are new or were embedded by another model;
+        # unchanged chunks kept their rows and vectors
+        touched = written + backfill
+        ai_engine = AIEngine() if embed else None
+        if embed and touched:
+            stage = time.perf_counter()
+            model_id = ai_engine.embedding_provider.model_id
+            chunks = [chunk for article in touched for chunk in article.chunks if chunk.embedding_model != model_id]
+            embedded = 0
+            try:
+                for positions, embeddings in ai_engine.iter_embeddings([chunk.text for chunk in chunks]):
+                    for position, embedding in zip(positions, embeddings):
+                        chunks[position].embedding = embedding.tobytes()
+                        chunks[position].embedding_model = model_id
+                    embedded += len(positions)
+            except EmbeddingError as e:
+                # Keep the batches that succeeded; the rest stay unembedded and the vector index embeds them on load
+                print(f"Error embedding chunks: {str(e)}")
+            db.commit()
+            report["embedded_chunks"] = embedded
+            timings["embed"] = time.perf_counter() - stage
+        
+        # Compact the vector index snapshot the API workers map at startup; workers only ever
+        # save their delta on top of it
+        if ai_engine is not None:
+            stage = time.perf_counter()
+            ai_engine.load_vector_store(db, get_settings().VECTOR_INDEX_PATH)
+            ai_engine.compact_vector_store(get_settings().VECTOR_INDEX_PATH)
+            timings["vector_index"] = time.perf_counter() - stage
+    
+    if report["added"] or report["changed"] or report["removed"]:
+        # Workers would only move a shared (Redis) cache's version once they catch up; do it now
+        cache = get_result_cache()
+        if cache is not None:
+            cache.invalidate()
+    
+    timings["total"] = time.perf_counter() - started
+    return report
+
+def create_initial_data():
+    """Create initial articles from markdown files, replacing existing ones"""
+    return ingest_docs(full=True)
+
+def print_report(report):
+    print(
+        f"Added: {report['added']}, changed: {report['changed']}, "
+        f"unchanged: {report['unchanged']}, removed: {report['removed']}, failed: {report['failed']}, "
+        f"chunks embedded: {report['embedded_chunks']}"
+    )
+    for stage, seconds in report["timings"].items():
+        print(f"  {stage}: {seconds:.3f}s")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load docs/*.md into the knowledge base")
+    parser.add_argument("--full", action="store_true", help="delete the database and rebuild everything")
+    parser.add_argument("--no-embed", action="store_true", help="skip embedding generation")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--docs-dir", default=None, help="markdown directory (default: ../docs)")
+    args = parser.parse_args()
+    
     print("Initializing database...")
-    # Remove existing database if it exists
-    if os.path.exists("faqrep.db"):
-        os.remove("faqrep.db")
+    if args.full and is_sqlite(SQLALCHEMY_DATABASE_URL) and not is_memory(SQLALCHEMY_DATABASE_URL):
+        # Remove existing database if it exists (--full clears the tables on other backends)
+        path = make_url(SQLALCHEMY_DATABASE_URL).database
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
     
     # Initialize database
-    create_initial_data()
+    report = ingest_docs(args.docs_dir, full=args.full, embed=not args.no_embed, workers=args.workers)
+    print_report(report)
     print("Database initialization complete!")
@@ -1,16 +1,33 @@
+import asyncio
 from fastapi import FastAPI, HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
 import uvicorn
 from dotenv import load_dotenv
 import os
-from database import get_db, init_db
-from search import SearchEngine
-from ai_engine import AIEngine
-from models import Article
+import json
+from config import get_settings
+import metrics
+from profiling import start_profiler
+from database import AsyncReadSessionLocal, dispose_engines, get_async_db, get_db_session, get_read_db, init_db
+from concurrency import shutdown_executor
+from search_log import get_search_log_writer
+from result_cache import get_result_cache
+from search import RESULT_FIELDS, SearchEngine, search_flights
+from search_index import apply_article_deltas, on_corpus_change
+import suggest
+import analytics
+from indexing import register_listener
+from ai_engine import ANSWER_OVERLOADED_MESSAGE, AIEngine
+from coalesce import Overloaded
+from embeddings import EmbeddingError
+from models import Article, ArticleFeedbackStats, article_tag_names
 import markdown2
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Load environment variables from .env file
 load_dotenv()
@@ -26,12 +43,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+settings = get_settings()
+
+# Outermost, so request latency includes every other middleware
+app.add_middleware(metrics.MetricsMiddleware, timing_header=settings.METRICS_TIMING_HEADER)
+
 # Initialize AI engine
 ai_engine = AIEngine()
 
+# Deletes raw search logs and feedback past their retention; reports read the rollups
+compactor = analytics.Compactor(settings.ANALYTICS_COMPACT_INTERVAL)
+reports = analytics.ReportCache(settings.ANALYTICS_REPORT_TTL)
+# Startup tasks nothing else holds a reference to
+_background_tasks = set()
+
+# Push committed Article changes into the keyword, filter and vector indexes
+register_listener(apply_article_deltas)
+register_listener(suggest.apply_article_deltas)
+register_listener(ai_engine.apply_article_deltas)
+# Shared (Redis) result caches move their version whenever this worker sees the corpus change:
+# its own commits, and other processes' writes once the article index catches up with them
+if get_result_cache() is not None:
+    on_corpus_change(get_result_cache().invalidate)
+
+@app.on_event("startup")
+def load_vector_index():
+    # Memory-maps the saved index when there is one, so workers share its pages
+    with get_db_session() as db:
+        ai_engine.load_vector_store(db, settings.VECTOR_INDEX_PATH)
+    get_search_log_writer().start()
+    compactor.start()
+
+async def warm_popular_searches(limit: int, days: int):
+    """Replay the most frequent recent searches once, so their results and embeddings are cached"""
+    try:
+        async with AsyncReadSessionLocal() as db:
+            rows = (await db.execute(analytics.warm_queries(analytics.since_days(days), limit))).all()
+            search_engine = SearchEngine(db, ai_engine)
+            for row in rows:
+                filters = {"category": row.category} if row.category else None
+                await search_engine.search(row.query, filters, log=False)
+        print(f"Warmed the search caches with {len(rows)} popular searches")
+    except Exception as e:
+        print(f"Error warming search caches: {str(e)}")
+
+@app.on_event("startup")
+async def warm_caches():
+    # In the background: the worker serves requests while the popular searches run
+    if settings.ANALYTICS_WARM_QUERIES > 0:
+        task = asyncio.create_task(warm_popular_searches(settings.ANALYTICS_WARM_QUERIES, settings.ANALYTICS_WARM_DAYS))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("shutdown")
+async def save_vector_index():
+    for task in list(_background_tasks):
+        task.cancel()
+    ai_engine.save_vector_store(settings.VECTOR_INDEX_PATH)
+    ai_engine.embedding_cache.flush()
+    compactor.stop()
+    shutdown_executor()
+    # Blocks until every queued search log is written
+    get_search_log_writer().stop()
+    await dispose_engines()
+
+# Every leg retrieves page * page_size candidates, so deep pages are bounded too
+MAX_PAGE = 100
+MAX_PAGE_SIZE = 100
+
 class SearchQuery(BaseModel):
     query: str
     filters: Optional[Dict[str, Any]] = None
+    page: int = Field(1, ge=1, le=MAX_PAGE)
+    page_size: int = Field(10, ge=1, le=MAX_PAGE_SIZE)
+    # Subset of search.RESULT_FIELDS to return per hit; all of them when omitted
+    fields: Optional[List[str]] = None
+
+    @field_validator("fields")
+    @classmethod
+    def known_fields(cls, fields):
+        unknown = sorted(set(fields or []) - set(RESULT_FIELDS))
+        if unknown:
+            raise ValueError(
+                f"Unknown result fields: {', '.join(unknown)}. Full content is served by /articles/{{article_id}}"
+            )
+        return fields
 
 @app.get("/")
 async def root():
@@ -42,26 +138,193 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.post("/search")
-async def search_knowledge_base(query: SearchQuery, db: Session = Depends(get_db)):
+async def search_knowledge_base(query: SearchQuery, db: AsyncSession = Depends(get_read_db)):
     try:
         search_engine = SearchEngine(db, ai_engine)
-        results = await search_engine.search(query.query, query.filters)
-        return {"results": results}
+        response = await search_engine.search(query.query, query.filters, query.page, query.page_size, query.fields)
+        with metrics.stage("serialize"):
+            return JSONResponse(jsonable_encoder(response))
     except Exception as e:
         print(f"Search error: {str(e)}")  # Add logging
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search/cache")
+async def search_cache_stats():
+    """Result cache hit ratio and the latency hits saved"""
+    cache = get_result_cache()
+    return cache.snapshot() if cache is not None else {"enabled": False}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage and request histograms plus cache and search-log counters, in the Prometheus text format"""
+    body = metrics.render()
+    cache = get_result_cache()
+    if cache is not None:
+        body += metrics.render_snapshot("search_cache", cache.snapshot())
+    if ai_engine.answer_cache is not None:
+        body += metrics.render_snapshot("answer_cache", ai_engine.answer_cache.snapshot())
+    body += metrics.render_snapshot("search_log", get_search_log_writer().snapshot())
+    body += metrics.render_snapshot("search_coalescing", search_flights().snapshot())
+    body += metrics.render_snapshot("query_embedding_limiter", ai_engine.query_embedding_limiter.snapshot())
+    body += metrics.render_snapshot("answer_limiter", ai_engine.answer_limiter.snapshot())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def sample_profile(seconds: float = 10.0, interval: float = 0.01):
+    """Sample this worker's stacks for ``seconds``; collapsed stacks for flame graph tools"""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    profiler = start_profiler(max(interval, 0.001))
+    if profiler is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        await asyncio.sleep(max(0.0, min(seconds, settings.PROFILER_MAX_SECONDS)))
+    finally:
+        stacks = profiler.stop()
+    return PlainTextResponse(stacks)
+
+@app.get("/answers/cache")
+async def answer_cache_stats():
+    """Answer cache hit ratio, invalidations and how similar questions were to their nearest cached one"""
+    cache = ai_engine.answer_cache
+    return cache.snapshot() if cache is not None else {"enabled": False}
+
+@app.get("/suggest")
+async def suggest_queries(q: str = "", limit: int = 5, db: AsyncSession = Depends(get_read_db)):
+    """Completions for a partial query from titles, tags and popular searches, most frequent first"""
+    limit = max(1, min(limit, suggest.MAX_SUGGESTIONS))
+    return await SearchEngine(db, ai_engine).get_suggestions(q, limit)
+
+def report_window(days: int, limit: int):
+    days = max(1, min(days, settings.ANALYTICS_ROLLUP_RETENTION_DAYS or days))
+    return analytics.since_days(days), max(1, min(limit, analytics.MAX_REPORT_ROWS))
+
+async def cached_report(db: AsyncSession, key, statement, build):
+    report = reports.get(key)
+    if report is None:
+        report = build((await db.execute(statement)).all())
+        reports.put(key, report)
+    return report
+
+@app.get("/analytics/queries")
+async def top_searches(days: int = 7, limit: int = 20, category: Optional[str] = None,
+                       db: AsyncSession = Depends(get_read_db)):
+    """Most frequent normalized queries, with how often they found nothing"""
+    since, limit = report_window(days, limit)
+    return await cached_report(
+        db, ("queries", since, limit, category), analytics.top_queries(since, limit, category), analytics.query_report
+    )
+
+@app.get("/analytics/queries/zero-results")
+async def zero_result_searches(days: int = 7, limit: int = 20, category: Optional[str] = None,
+                               db: AsyncSession = Depends(get_read_db)):
+    """Queries that most often found nothing: the gaps in the knowledge base"""
+    since, limit = report_window(days, limit)
+    return await cached_report(
+        db, ("zero-results", since, limit, category),
+        analytics.zero_result_queries(since, limit, category), analytics.query_report,
+    )
+
+@app.get("/analytics/categories")
+async def searches_by_category(days: int = 7, db: AsyncSession = Depends(get_read_db)):
+    """Searches per category filter; "" is searches without one"""
+    since, _ = report_window(days, 1)
+    return await cached_report(db, ("categories", since), analytics.category_totals(since), analytics.query_report)
+
+@app.get("/analytics/volume")
+async def search_volume(days: int = 1, db: AsyncSession = Depends(get_read_db)):
+    """Searches and zero-result searches per hour"""
+    since, _ = report_window(days, 1)
+    return await cached_report(
+        db, ("volume", since), analytics.search_volume(since), lambda rows: [dict(row._mapping) for row in rows]
+    )
+
+@app.get("/analytics/articles/ratings")
+async def article_ratings(limit: int = 20, min_ratings: int = 1, lowest: bool = False,
+                          db: AsyncSession = Depends(get_read_db)):
+    """Articles by average rating, best first (or worst first with ``lowest``)"""
+    _, limit = report_window(1, limit)
+    return await cached_report(
+        db, ("ratings", limit, min_ratings, lowest), analytics.article_ratings(limit, min_ratings, lowest),
+        lambda rows: [analytics.feedback_report(stats, title) for stats, title in rows],
+    )
+
+class FeedbackSubmission(BaseModel):
+    rating: Optional[int] = None
+    comment: Optional[str] = None
+
+    @field_validator("rating")
+    @classmethod
+    def rating_range(cls, rating):
+        if rating is not None and not 1 <= rating <= 5:
+            raise ValueError("Rating must be between 1 and 5")
+        return rating
+
+@app.post("/articles/{article_id}/feedback")
+async def submit_feedback(article_id: int, feedback: FeedbackSubmission, db: AsyncSession = Depends(get_async_db)):
+    if feedback.rating is None and not feedback.comment:
+        raise HTTPException(status_code=422, detail="A rating or a comment is required")
+    if await db.scalar(select(Article.id).where(Article.id == article_id)) is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    await analytics.record_feedback(db, article_id, feedback.rating, feedback.comment)
+    stats = await db.get(ArticleFeedbackStats, article_id, populate_existing=True)
+    return analytics.feedback_report(stats)
+
+@app.get("/articles/{article_id}/feedback")
+async def article_feedback(article_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Running feedback totals for one article; a primary-key read, however much feedback it has"""
+    stats = await db.get(ArticleFeedbackStats, article_id)
+    if stats is None:
+        if await db.scalar(select(Article.id).where(Article.id == article_id)) is None:
+            raise HTTPException(status_code=404, detail="Article not found")
+        stats = ArticleFeedbackStats(article_id=article_id, feedback_count=0, ratings=0, rating_sum=0, comments=0)
+    return analytics.feedback_report(stats)
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/search/stream")
+async def stream_answer(query: SearchQuery, db: AsyncSession = Depends(get_read_db)):
+    """
+    Answer from the top retrieved chunks with one generation, streamed as server-sent events.
+    Under overload the sources come from the keyword index and no answer is generated.
+    """
+    try:
+        sources, tokens = await ai_engine.stream_search_async(query.query, query.filters)
+    except (Overloaded, EmbeddingError):
+        hits = await SearchEngine(db, ai_engine).search_articles(query.query, limit=settings.ANSWER_RETRIEVAL_K)
+        sources = [{"id": hit["id"], "title": hit["title"], "score": hit["relevance"]} for hit in hits]
+        tokens = None
+    
+    async def events():
+        yield sse_event("sources", sources)
+        if tokens is None:
+            yield sse_event("degraded", {"mode": "keyword_only", "message": ANSWER_OVERLOADED_MESSAGE})
+        else:
+            async for text in tokens:
+                yield sse_event("token", {"text": text})
+        yield sse_event("done", {})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/articles/{article_id}")
-async def get_article(article_id: str, db: Session = Depends(get_db)):
-    article = db.query(Article).filter(Article.id == article_id).first()
+async def get_article(article_id: int, db: AsyncSession = Depends(get_read_db)):
+    # Column projection: no embedding blob, no ORM identity-map overhead; tags in a second query
+    result = await db.execute(
+        select(Article.id, Article.title, Article.summary, Article.content, Article.category)
+        .where(Article.id == article_id)
+    )
+    article = result.first()
     if not article:
         raise HTTPException(status_code=404, detail="Article not found")
+    tags = (await db.execute(article_tag_names([article.id]))).all()
     return {
         "id": article.id,
         "title": article.title,
+        "summary": article.summary,
         "content": article.content,
         "category": article.category,
-        "tags": [tag.name for tag in article.tags]
+        "tags": [name for _, name in tags]
     }
 
 if __name__ == "__main__":
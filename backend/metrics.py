@@ -0,0 +1,282 @@
+"""
+In-process counters and latency histograms for the request path, rendered
+in the Prometheus text format at GET /metrics.
+
+Hot paths wrap their stages in ``stage("name")``. Each stage lands in the
+``faqrep_stage_seconds`` histogram and, when the request asked for it, in
+that request's timing breakdown (the ``Server-Timing`` response header).
+With METRICS_ENABLED off, ``stage`` returns a shared no-op context and no
+clock is read.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import get_settings
+
+# Seconds; covers sub-millisecond index lookups up to slow LLM answers
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; ``observe`` is a bisect and three additions under a lock"""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf), sum]
+        self._series: Dict[LabelValues, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, bucket)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {repr(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "faqrep_stage_seconds", "Time spent in each stage of the request path", ["stage"]
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "faqrep_stage_errors_total", "Stages that raised", ["stage"]
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "faqrep_request_seconds", "HTTP request latency until the response starts", ["method", "route"]
+))
+REQUESTS = REGISTRY.register(Counter(
+    "faqrep_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+))
+DB_SESSION_SECONDS = REGISTRY.register(Histogram(
+    "faqrep_db_session_seconds", "How long request handlers hold a database session", ["kind"]
+))
+
+# Per-request stage totals, set by the middleware only when a breakdown was requested.
+# The dict is shared (not copied) with executor threads through run_cpu's context copy.
+_breakdown: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_breakdown", default=None)
+
+
+def enabled() -> bool:
+    return get_settings().METRICS_ENABLED
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(seconds, self.name)
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            breakdown[self.name] = breakdown.get(self.name, 0.0) + seconds
+        if exc_type is not None:
+            STAGE_ERRORS.inc(self.name)
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    """Time the enclosed block as ``name``; a no-op when metrics are disabled"""
+    if not get_settings().METRICS_ENABLED:
+        return _NO_STAGE
+    return _Stage(name)
+
+
+def record(name: str, seconds: float):
+    """Record an already-measured stage (for work that is not one block, like a stream)"""
+    if not get_settings().METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, name)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown[name] = breakdown.get(name, 0.0) + seconds
+
+
+def session_closed(kind: str, started: float):
+    """Record how long a request held a ``kind`` ("read" or "write") session"""
+    if get_settings().METRICS_ENABLED:
+        DB_SESSION_SECONDS.observe(time.perf_counter() - started, kind)
+
+
+def start_breakdown():
+    """Collect this request's stage totals; returns the token for ``end_breakdown``"""
+    return _breakdown.set({})
+
+
+def end_breakdown(token) -> Dict[str, float]:
+    breakdown = _breakdown.get() or {}
+    _breakdown.reset(token)
+    return breakdown
+
+
+def server_timing(breakdown: Dict[str, float], total: float) -> str:
+    """``Server-Timing`` header value, in milliseconds as the spec requires"""
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in breakdown.items()]
+    parts.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency and status per route template.
+    Requests sending ``X-Timing: 1`` get a ``Server-Timing`` header with the
+    per-stage breakdown, if METRICS_TIMING_HEADER allows it.
+    """
+
+    def __init__(self, app, timing_header: bool = False):
+        self.app = app
+        self.timing_header = timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        token = None
+        if self.timing_header and (b"x-timing", b"1") in scope.get("headers", ()):
+            token = start_breakdown()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                REQUEST_SECONDS.observe(elapsed, scope["method"], _route(scope))
+                if token is not None:
+                    header = server_timing(_breakdown.get() or {}, elapsed)
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS.inc(scope["method"], _route(scope), str(status))
+            if token is not None:
+                end_breakdown(token)
+
+
+def _route(scope) -> str:
+    # The route template, not the raw path, so /articles/{article_id} is one series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def render_snapshot(prefix: str, snapshot: Dict[str, float]) -> str:
+    """A component's ``snapshot()`` counters as ``faqrep_<prefix>_<name>`` gauges"""
+    lines = []
+    for name, value in sorted(snapshot.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            metric = f"faqrep_{prefix}_{name}"
+            lines += [f"# TYPE {metric} gauge", f"{metric} {_number(value)}"]
+    return "\n".join(lines) + "\n" if lines else ""
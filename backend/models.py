@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, Boolean, LargeBinary
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, ForeignKey, Table, Boolean, LargeBinary, UniqueConstraint, select
+)
+from sqlalchemy.orm import deferred, relationship, declarative_base
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 
 Base = declarative_base()
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
 # Association table for article tags
 article_tags = Table(
     'article_tags',
@@ -18,15 +24,42 @@ class Article(Base):
     id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
-    embedding = Column(LargeBinary)  # Store embeddings as binary data
+    # Plain-text lead of the content, returned by search instead of the full HTML
+    summary = Column(Text)
+    # Written by preprocess.py whenever content changes: markup-free text (one
+    # paragraph per line) and its space-separated index tokens
+    plain_text = deferred(Column(Text))
+    tokens = deferred(Column(Text))
     slug = Column(String(255), unique=True, nullable=False)
+    # Markdown file the article was ingested from and its sha256, for incremental ingest
+    source_path = Column(String(255), unique=True)
+    content_hash = Column(String(64))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Version watermark for incremental index maintenance (see indexing.py)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, index=True)
     category = Column(String(100))
     is_published = Column(Boolean, default=True)
     
     tags = relationship('Tag', secondary=article_tags, back_populates='articles')
     feedback = relationship('Feedback', back_populates='article')
+    chunks = relationship(
+        'ArticleChunk', back_populates='article', order_by='ArticleChunk.position', cascade='all, delete-orphan'
+    )
+
+class ArticleChunk(Base):
+    """Embedding unit of an article; ``content_hash`` lets unchanged chunks keep their vector"""
+    __tablename__ = 'article_chunks'
+    
+    id = Column(Integer, primary_key=True)
+    article_id = Column(Integer, ForeignKey('articles.id'), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    # float32 vector and the model that produced it; deferred so chunk lists never pull blobs
+    embedding = deferred(Column(LargeBinary))
+    embedding_model = Column(String(255))
+    
+    article = relationship('Article', back_populates='chunks')
 
 class Tag(Base):
     __tablename__ = 'tags'
@@ -42,14 +75,54 @@ class Feedback(Base):
     article_id = Column(Integer, ForeignKey('articles.id'))
     rating = Column(Integer)  # 1-5 rating
     comment = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Indexed for retention deletes; reports read ArticleFeedbackStats instead
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     
     article = relationship('Article', back_populates='feedback')
 
+class ArticleFeedbackStats(Base):
+    """Running feedback totals per article, updated in the transaction that records the feedback"""
+    __tablename__ = 'article_feedback_stats'
+    
+    article_id = Column(Integer, ForeignKey('articles.id'), primary_key=True)
+    feedback_count = Column(Integer, nullable=False, default=0)
+    ratings = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+    last_feedback_at = Column(DateTime(timezone=True))
+
 class SearchLog(Base):
     __tablename__ = 'search_logs'
     
     id = Column(Integer, primary_key=True)
     query = Column(String(255))
     results_count = Column(Integer)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Category filter of the search, if any
+    category = Column(String(100))
+    # Indexed for retention deletes; reports read SearchRollup instead
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class SearchRollup(Base):
+    """
+    Search counts per hour, normalized query and category filter ('' for
+    none), written by the search-log writer in the same transaction as the
+    raw rows it summarizes (see analytics.py)
+    """
+    __tablename__ = 'search_rollups'
+    __table_args__ = (UniqueConstraint('bucket', 'query', 'category', name='uq_search_rollups_key'),)
+    
+    id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), nullable=False)
+    query = Column(String(255), nullable=False)
+    category = Column(String(100), nullable=False, default='')
+    searches = Column(Integer, nullable=False, default=0)
+    zero_results = Column(Integer, nullable=False, default=0)
+    results_total = Column(Integer, nullable=False, default=0)
+
+def article_tag_names(article_ids):
+    """(article_id, tag name) rows for many articles in one round trip, instead of a lazy load each"""
+    return (
+        select(article_tags.c.article_id, Tag.name)
+        .join(Tag, Tag.id == article_tags.c.tag_id)
+        .where(article_tags.c.article_id.in_(list(article_ids)))
+    )
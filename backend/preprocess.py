@@ -0,0 +1,153 @@
+"""
+Text preprocessing done once at write time instead of on every index build
+or request: article HTML becomes normalized plain text (one paragraph per
+line), the keyword token stream, and chunks for embedding with a content
+hash each.
+
+Chunks are packed from whole paragraphs and restart at every heading, so an
+edit only moves the boundaries of the section it is in; unchanged chunks
+keep their hash, and with it their stored embedding.
+"""
+import hashlib
+import html
+import re
+from typing import Any, Dict, List, Tuple
+
+from models import ArticleChunk
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+# Closing block elements and line breaks end a paragraph
+BLOCK_END_RE = re.compile(r"<br\s*/?>|</(?:p|li|h[1-6]|pre|blockquote|div|tr|table|ul|ol|dd|dt)\s*>", re.IGNORECASE)
+HEADING_RE = re.compile(r"<h[1-6][\s>]", re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+CHUNK_CHARS = 1000
+CHUNK_OVERLAP = 200
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return TOKEN_RE.findall(text.lower())
+
+
+def strip_html(html_text: str) -> str:
+    """Drop markup so tags and attributes are not indexed as words"""
+    return HTML_TAG_RE.sub(" ", html_text)
+
+
+def paragraphs(content: str) -> List[Tuple[bool, str]]:
+    """(is_heading, text) for each non-empty block of the article HTML"""
+    blocks = []
+    for block in BLOCK_END_RE.split(content or ""):
+        text = " ".join(html.unescape(strip_html(block)).split())
+        if text:
+            blocks.append((bool(HEADING_RE.search(block)), text))
+    return blocks
+
+
+def _pieces(text: str, size: int) -> List[str]:
+    """A paragraph as pieces of at most ``size`` characters, cut at sentences, then words"""
+    if len(text) <= size:
+        return [text]
+    pieces, current = [], ""
+    for sentence in SENTENCE_END_RE.split(text):
+        while len(sentence) > size:
+            cut = sentence.rfind(" ", 0, size)
+            cut = cut if cut > 0 else size
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > size:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_paragraphs(blocks: List[Tuple[bool, str]], size: int = CHUNK_CHARS,
+                     overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """
+    Pack paragraphs into chunks of about ``size`` characters (a section's
+    headings may push its first chunk over). Each chunk repeats up to
+    ``overlap`` characters of trailing pieces from the one before it,
+    within the same section.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    length = 0
+    fresh = 0  # pieces in ``current`` not already emitted in a previous chunk
+    body = False  # whether ``current`` has more than headings
+
+    def emit():
+        if fresh:
+            chunks.append("\n".join(current))
+
+    for is_heading, text in blocks:
+        # A heading opens a section; consecutive headings stay with the body that follows
+        if is_heading and body:
+            emit()
+            current, length, fresh, body = [], 0, 0, False
+        for piece in _pieces(text, size):
+            if body and length + 1 + len(piece) > size:
+                emit()
+                carried: List[str] = []
+                carried_length = 0
+                for previous in reversed(current):
+                    if carried_length + len(previous) + 1 > overlap or len(carried) + 1 == len(current):
+                        break
+                    carried.insert(0, previous)
+                    carried_length += len(previous) + 1
+                current, length, fresh = carried, max(carried_length - 1, 0), 0
+            current.append(piece)
+            length += len(piece) + (1 if length else 0)
+            fresh += 1
+            body = body or not is_heading
+    if current:
+        emit()
+    return chunks
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def preprocess_article(content: str) -> Dict[str, Any]:
+    """Plain text, token stream and hashed chunks of an article body"""
+    blocks = paragraphs(content)
+    text = "\n".join(block for _, block in blocks)
+    return {
+        "plain_text": text,
+        "tokens": " ".join(tokenize(text)),
+        "chunks": [
+            {"position": position, "text": chunk, "hash": content_hash(chunk)}
+            for position, chunk in enumerate(chunk_paragraphs(blocks))
+        ],
+    }
+
+
+def apply_preprocessed(article, prepared: Dict[str, Any]):
+    """
+    Store preprocessed text on an Article. Chunks whose hash is unchanged
+    keep their row and stored embedding; the rest are replaced.
+    """
+    article.plain_text = prepared["plain_text"]
+    article.tokens = prepared["tokens"]
+    existing = {chunk.content_hash: chunk for chunk in article.chunks}
+    chunks = []
+    for data in prepared["chunks"]:
+        chunk = existing.pop(data["hash"], None)
+        if chunk is None:
+            chunk = ArticleChunk(text=data["text"], content_hash=data["hash"])
+        chunk.position = data["position"]
+        chunks.append(chunk)
+    article.chunks = chunks
+
+
+def prepare_article(article):
+    apply_preprocessed(article, preprocess_article(article.content))
@@ -0,0 +1,69 @@
+"""
+Sampling profiler for a running worker: a background thread reads every
+thread's current stack at a fixed interval and counts identical stacks.
+Output is the collapsed-stack format flame graph tools read
+(``frame;frame;frame count`` per line).
+
+It only runs while a profile is being taken (GET /debug/profile, available when
+PROFILER_ENABLED is set), so it costs nothing otherwise. Sampling at 10 ms costs
+one stack walk per thread per tick while it runs.
+"""
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+# Only one profile at a time per process
+_lock = threading.Lock()
+
+
+def _collapsed(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names.setdefault(thread.ident, thread.name)
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[f"{names.get(ident, ident)};{_collapsed(frame)}"] += 1
+            self.samples += 1
+
+    def start(self) -> bool:
+        """Start sampling; False if another profile is already running in this process"""
+        if not _lock.acquire(blocking=False):
+            return False
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> str:
+        """Stop sampling and return the collapsed stacks, most frequent first"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            _lock.release()
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+def start_profiler(interval: float = 0.01) -> Optional[SamplingProfiler]:
+    """A running profiler, or None if another profile is already running in this process"""
+    profiler = SamplingProfiler(interval)
+    return profiler if profiler.start() else None
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import get_settings
+from embedding_cache import normalize_text
+from indexing import ArticleDelta
+from search_index import corpus_version
+
+
+def normalize_query(query: str) -> str:
+    return normalize_text(query).lower()
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Drop empty filters and sort list values so equivalent filters share a key"""
+    normalized = {}
+    for name, value in (filters or {}).items():
+        if value in (None, "", [], ()):
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(item) for item in value)
+        normalized[name] = value
+    return normalized
+
+
+def result_key(query: str, filters: Optional[Dict[str, Any]], page: int, page_size: int, version: Any,
+               fields: Optional[List[str]] = None) -> str:
+    payload = json.dumps(
+        [normalize_query(query), normalize_filters(filters), page, page_size, sorted(set(fields or ())), version],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LocalResultCacheBackend:
+    """
+    In-process LRU with a per-entry TTL. The corpus version comes from
+    ``search_index.corpus_version``, so it also moves when this worker
+    catches up with writes made by other processes.
+    """
+
+    # Lookups are memory reads; safe to run on the event loop
+    blocking = False
+
+    def __init__(self, max_items: int = 10_000, version_source: Callable[[], int] = corpus_version):
+        self.max_items = max_items
+        self.version_source = version_source
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def version(self) -> Any:
+        return self.version_source()
+
+    def bump_version(self):
+        # Entries from older versions are never looked up again; LRU ages them out
+        pass
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisResultCacheBackend:
+    """
+    Shared cache for several workers, on anything that speaks the Redis
+    protocol. The corpus version is a counter in Redis, bumped by every
+    worker that commits an Article change. Entries expire through SETEX, and
+    LRU eviction is left to the server's ``maxmemory-policy``.
+
+    ``client`` needs ``get``, ``setex`` and ``incr``, so a local stand-in
+    can be injected in place of ``redis.Redis``.
+    """
+
+    # Every call is a network round trip
+    blocking = True
+
+    def __init__(self, client, prefix: str = "faqrep:search:"):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+        self.expirations = 0
+
+    def version(self) -> Any:
+        value = self.client.get(f"{self.prefix}version")
+        return int(value) if value is not None else 0
+
+    def bump_version(self):
+        self.client.incr(f"{self.prefix}version")
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(f"{self.prefix}{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.client.setex(f"{self.prefix}{key}", max(1, int(ttl)), json.dumps(value))
+
+    def __len__(self) -> int:
+        return 0
+
+
+class ResultCache:
+    """
+    Caches /search responses keyed on the normalized query, the filters, the
+    page, the selected fields and the corpus version. Any Article change
+    moves the version, so stale pages are never served; TTL bounds staleness
+    of anything else.
+
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, backend, ttl: float = 300.0):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats: Dict[str, float] = {"hits": 0, "misses": 0, "stores": 0, "errors": 0, "saved_ms": 0.0}
+
+    @property
+    def blocking(self) -> bool:
+        return self.backend.blocking
+
+    def key(self, query: str, filters: Optional[Dict[str, Any]], page: int, page_size: int,
+            fields: Optional[List[str]] = None) -> str:
+        return result_key(query, filters, page, page_size, self.backend.version(), fields)
+
+    def lookup(self, query: str, filters: Optional[Dict[str, Any]], page: int, page_size: int,
+               fields: Optional[List[str]] = None) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (key, cached response or None); the key is None if the backend is unreachable"""
+        try:
+            key = self.key(query, filters, page, page_size, fields)
+        except Exception as e:
+            print(f"Error reading result cache: {str(e)}")
+            self.stats["errors"] += 1
+            return None, None
+        return key, self.get(key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading result cache: {str(e)}")
+            entry = None
+            self.stats["errors"] += 1
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            # What the hit saved: the time it took to compute the cached response
+            self.stats["saved_ms"] += entry["compute_ms"]
+        return entry["response"]
+
+    def put(self, key: str, response: Dict[str, Any], compute_ms: float):
+        try:
+            self.backend.set(key, {"response": response, "compute_ms": compute_ms}, self.ttl)
+        except Exception as e:
+            print(f"Error writing result cache: {str(e)}")
+            self.stats["errors"] += 1
+            return
+        with self._lock:
+            self.stats["stores"] += 1
+
+    def invalidate(self):
+        try:
+            self.backend.bump_version()
+        except Exception as e:
+            print(f"Error invalidating result cache: {str(e)}")
+            self.stats["errors"] += 1
+
+    def apply_article_deltas(self, deltas: List[ArticleDelta]):
+        """Listener for ``indexing.register_listener``"""
+        if deltas:
+            self.invalidate()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, hit ratio and the latency hits saved"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["saved_ms"] = round(stats["saved_ms"], 3)
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["entries"] = len(self.backend)
+        stats["evictions"] = self.backend.evictions
+        stats["expirations"] = self.backend.expirations
+        return stats
+
+
+def create_result_cache(settings, client=None) -> Optional[ResultCache]:
+    """Build the cache named by ``settings.SEARCH_CACHE_BACKEND``; None disables caching"""
+    name = settings.SEARCH_CACHE_BACKEND.lower()
+    if name == "none":
+        return None
+    if name == "local":
+        backend = LocalResultCacheBackend(max_items=settings.SEARCH_CACHE_MAX_ITEMS)
+    elif name == "redis":
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(settings.REDIS_URL)
+        backend = RedisResultCacheBackend(client)
+    else:
+        raise ValueError(f"Unknown SEARCH_CACHE_BACKEND: {settings.SEARCH_CACHE_BACKEND}")
+    return ResultCache(backend, ttl=settings.SEARCH_CACHE_TTL)
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+_result_cache_created = False
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Process-wide result cache, configured from Settings"""
+    global _result_cache, _result_cache_created
+    if not _result_cache_created:
+        with _result_cache_lock:
+            if not _result_cache_created:
+                _result_cache = create_result_cache(get_settings())
+                _result_cache_created = True
+    return _result_cache
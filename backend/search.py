@@ -1,111 +1,211 @@
-from models import Article, SearchLog
-from database import get_db_session
+from models import Article, article_tag_names
+from database import get_read_session
+import time
 import numpy as np
 from ai_engine import AIEngine
-from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-import re
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from search_index import ArticleIndex, get_article_index
+from hybrid import HybridRetriever
+from concurrency import backlogged, run_cpu
+from search_log import log_search
+from suggest import SuggestionIndex, get_suggestion_index, ready_suggestion_index
+from result_cache import ResultCache, get_result_cache, result_key
+from coalesce import SingleFlight
+from snippets import highlight_spans, query_terms, snippets
+from config import get_settings
+from metrics import stage
+
+# What a search hit can carry; full content is only served by /articles/{id}
+RESULT_FIELDS = ("id", "title", "title_highlights", "summary", "snippets", "category", "tags", "relevance")
+DEFAULT_RESULT_FIELDS = RESULT_FIELDS
+
+# Identical searches in flight at the same time share one computation
+_search_flights = SingleFlight()
+
+def search_flights() -> SingleFlight:
+    return _search_flights
+
+def load_article_index() -> ArticleIndex:
+    """The shared keyword index, synced through a short-lived read session"""
+    with get_read_session() as db:
+        return get_article_index(db)
+
+def load_suggestion_index() -> SuggestionIndex:
+    with get_read_session() as db:
+        return get_suggestion_index(db)
 
 class SearchEngine:
-    def __init__(self, db: Session, ai_engine: AIEngine):
+    def __init__(self, db: AsyncSession, ai_engine: AIEngine, result_cache: Optional[ResultCache] = None):
         self.db = db
         self.ai_engine = ai_engine
+        self.result_cache = result_cache if result_cache is not None else get_result_cache()
 
     async def search(
         self,
         query: str,
         filters: Optional[Dict[str, Any]] = None,
         page: int = 1,
-        page_size: int = 10
-    ) -> List[Dict[str, Any]]:
+        page_size: int = 10,
+        fields: Optional[List[str]] = None,
+        log: bool = True
+    ) -> Dict[str, Any]:
         """
-        Perform a search using keyword-based search
+        Perform a hybrid keyword + vector search with filters applied inside both legs.
+        ``fields`` selects what each hit carries (default: all of RESULT_FIELDS).
+        Concurrent identical searches (same normalized query, filters, page and
+        fields) are coalesced into one when SEARCH_COALESCE is on.
+        ``log=False`` keeps the search out of the search logs and analytics.
         """
         try:
-            # Log the search query
-            search_log = SearchLog(query=query)
-            self.db.add(search_log)
-            self.db.commit()
+            if get_settings().SEARCH_COALESCE:
+                key = result_key(query, filters, page, page_size, None, fields)
+                leader = []
+                
+                async def compute():
+                    leader.append(True)
+                    return await self._search(query, filters, page, page_size, fields)
+                
+                response = await _search_flights.do(key, compute)
+                if not leader:
+                    response = {"results": response["results"], "metadata": {**response["metadata"], "coalesced": True}}
+            else:
+                response = await self._search(query, filters, page, page_size, fields)
             
-            # Get search results
-            results = self.search_articles(query, limit=page_size)
+            # Queued for a bulk insert; no write happens on the request path
+            if log:
+                log_search(query, len(response["results"]), filters)
             
-            return results
+            return response
             
         except Exception as e:
             print(f"Search error: {str(e)}")
-            self.db.rollback()
             raise
 
-    def search_articles(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    async def _search(self, query: str, filters: Optional[Dict[str, Any]], page: int, page_size: int,
+                      fields: Optional[List[str]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # Decided on arrival: work queued ahead of this request is what it would wait behind
+        keyword_only = backlogged()
+        # Building or catching up the index is CPU and sync-DB work; keep it off the loop.
+        # Catching up first also moves the corpus version the cache is keyed on.
+        with stage("index_sync"):
+            article_index = await run_cpu(load_article_index)
+        
+        key = None
+        cache = self.result_cache
+        if cache is not None:
+            with stage("cache_lookup"):
+                if cache.blocking:
+                    key, cached = await run_cpu(cache.lookup, query, filters, page, page_size, fields)
+                else:
+                    key, cached = cache.lookup(query, filters, page, page_size, fields)
+            if cached is not None:
+                return {"results": cached["results"], "metadata": {**cached["metadata"], "cache": "hit"}}
+        
+        retriever = HybridRetriever.from_settings(article_index, self.ai_engine, get_settings())
+        with stage("retrieve"):
+            ranked, metadata = await retriever.search(
+                query, filters, limit=page_size, offset=(max(page, 1) - 1) * page_size, keyword_only=keyword_only
+            )
+        with stage("load_results"):
+            results = await self._load_results(ranked, query, fields)
+        response = {"results": results, "metadata": metadata}
+        
+        # Keyword-only results from a shed vector leg are not worth keeping past the overload
+        if key is not None and not metadata.get("degraded"):
+            compute_ms = (time.perf_counter() - started) * 1000
+            with stage("cache_store"):
+                if cache.blocking:
+                    await run_cpu(cache.put, key, response, compute_ms)
+                else:
+                    cache.put(key, response, compute_ms)
+        
+        return {"results": results, "metadata": {**metadata, "cache": "miss" if cache is not None else "off"}}
+
+    async def _load_results(self, ranked: List[Tuple[int, float]], query: str,
+                            fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch the ranked articles in one query, selecting only the columns the
+        requested ``fields`` need, and shape them for the API
+        """
+        if not ranked:
+            return []
+        fields = set(fields or DEFAULT_RESULT_FIELDS) | {"id"}
+        ids = [doc_id for doc_id, _ in ranked]
+        columns = [Article.id, Article.title, Article.summary, Article.category]
+        if "snippets" in fields:
+            # The stored plain text is read for snippet windows but never returned
+            columns.append(Article.plain_text)
+        rows = {row.id: row for row in await self.db.execute(select(*columns).where(Article.id.in_(ids)))}
+        
+        tags: Dict[int, List[str]] = {}
+        if "tags" in fields:
+            # One query for every hit's tags instead of a lazy load per result
+            for article_id, name in await self.db.execute(article_tag_names(ids)):
+                tags.setdefault(article_id, []).append(name)
+        
+        hits = [(rows[doc_id], score) for doc_id, score in ranked if doc_id in rows]
+        if "snippets" in fields:
+            # Scanning bodies for snippet windows is CPU work
+            return await run_cpu(self._shape_results, hits, tags, query, fields)
+        return self._shape_results(hits, tags, query, fields)
+    
+    @staticmethod
+    def _shape_results(hits, tags: Dict[int, List[str]], query: str, fields) -> List[Dict[str, Any]]:
+        terms = query_terms(query)
+        results = []
+        for row, score in hits:
+            result = {"id": row.id}
+            if "title" in fields:
+                result["title"] = row.title
+            if "title_highlights" in fields:
+                result["title_highlights"] = highlight_spans(row.title, terms)
+            if "summary" in fields:
+                result["summary"] = row.summary or ""
+            if "snippets" in fields:
+                result["snippets"] = snippets(" ".join((row.plain_text or "").split()), terms)
+            if "category" in fields:
+                result["category"] = row.category
+            if "tags" in fields:
+                result["tags"] = tags.get(row.id, [])
+            if "relevance" in fields:
+                result["relevance"] = float(score)
+            results.append(result)
+        return results
+
+    async def search_articles(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
-        Search for articles using keyword matching
+        Search for articles using the BM25 keyword index
         """
         try:
-            # Fallback to keyword search
-            query_terms = query.lower().split()
-            results = []
-            articles = self.db.query(Article).all()
-            
-            for article in articles:
-                # Calculate simple relevance score based on term frequency
-                content = article.content.lower()
-                title = article.title.lower()
-                
-                score = 0
-                for term in query_terms:
-                    # Title matches are weighted more heavily
-                    title_matches = title.count(term) * 3
-                    content_matches = content.count(term)
-                    score += title_matches + content_matches
-                
-                if score > 0:
-                    results.append((article, score))
-            
-            # Sort by score
-            results.sort(key=lambda x: x[1], reverse=True)
+            with stage("index_sync"):
+                index = await run_cpu(load_article_index)
+            with stage("lexical"):
+                top, _ = await run_cpu(index.keywords.search, query, limit=limit)
+            with stage("load_results"):
+                results = await self._load_results(top, query)
             
             # Log the search
-            search_log = SearchLog(
-                query=query,
-                results_count=len(results[:limit])
-            )
-            self.db.add(search_log)
-            self.db.commit()
+            log_search(query, len(results))
             
-            # Return top results
-            return [
-                {
-                    "id": article.id,
-                    "title": article.title,
-                    "content": article.content,
-                    "category": article.category,
-                    "tags": [tag.name for tag in article.tags],
-                    "relevance": float(score)
-                }
-                for article, score in results[:limit]
-            ]
+            return results
             
         except Exception as e:
-            self.db.rollback()
             print(f"Search error: {str(e)}")
             return []
 
-    async def get_suggestions(self, query: str) -> List[str]:
+    async def get_suggestions(self, query: str, limit: int = 5) -> List[str]:
         """
         Get search suggestions based on partial query
         """
         try:
-            # Get all articles
-            articles = self.db.query(Article).all()
-            
-            # Extract words from titles and content
-            words = set()
-            for article in articles:
-                title_words = article.title.lower().split()
-                words.update(word for word in title_words if word.startswith(query.lower()))
-            
-            return sorted(list(words))[:5]  # Return top 5 suggestions
+            index = ready_suggestion_index()
+            if index is None:
+                # Build or catch up through a sync session, off the event loop
+                index = await run_cpu(load_suggestion_index)
+            return index.suggest(query, limit)
             
         except Exception as e:
             print(f"Error getting suggestions: {str(e)}")
@@ -0,0 +1,357 @@
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from config import get_settings
+from indexing import DELETE, RESYNC, UPSERT, ArticleDelta, advance_watermark, changes_since, record_versions
+from preprocess import tokenize
+
+# Indexed fields and their BM25F weights; title matches count more than body matches
+FIELD_BOOSTS = {"title": 3.0, "content": 1.0}
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index scored with BM25F.
+
+    Postings map each term to the documents containing it and the term
+    frequency per field, so a query only touches the postings of its own
+    terms instead of scanning every article.
+    """
+
+    def __init__(
+        self,
+        field_boosts: Optional[Dict[str, float]] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.field_boosts = dict(field_boosts or FIELD_BOOSTS)
+        self.fields = list(self.field_boosts)
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: (tf per field)}
+        self.postings: Dict[str, Dict[int, Tuple[int, ...]]] = {}
+        # doc_id -> (length per field)
+        self.doc_lengths: Dict[int, Tuple[int, ...]] = {}
+        self.doc_terms: Dict[int, List[str]] = {}
+        self.total_lengths = [0] * len(self.fields)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add_document(self, doc_id: int, fields: Dict[str, Union[str, List[str]]]):
+        """
+        Index a document, replacing any previous version with the same id.
+        Field values are text, or token lists already split by ``tokenize``.
+        """
+        field_tokens = [
+            value if isinstance(value, list) else tokenize(value or "")
+            for value in (fields.get(name) for name in self.fields)
+        ]
+
+        frequencies: Dict[str, List[int]] = {}
+        for position, tokens in enumerate(field_tokens):
+            for token in tokens:
+                counts = frequencies.get(token)
+                if counts is None:
+                    counts = frequencies[token] = [0] * len(self.fields)
+                counts[position] += 1
+
+        lengths = tuple(len(tokens) for tokens in field_tokens)
+
+        with self._lock:
+            self._remove(doc_id)
+            for term, counts in frequencies.items():
+                self.postings.setdefault(term, {})[doc_id] = tuple(counts)
+            self.doc_lengths[doc_id] = lengths
+            self.doc_terms[doc_id] = list(frequencies)
+            for position, length in enumerate(lengths):
+                self.total_lengths[position] += length
+
+    def remove_document(self, doc_id: int):
+        """Drop a document and its postings"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int):
+        lengths = self.doc_lengths.pop(doc_id, None)
+        if lengths is None:
+            return
+        for term in self.doc_terms.pop(doc_id, []):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        for position, length in enumerate(lengths):
+            self.total_lengths[position] -= length
+
+    def clear(self):
+        with self._lock:
+            self.postings.clear()
+            self.doc_lengths.clear()
+            self.doc_terms.clear()
+            self.total_lengths = [0] * len(self.fields)
+
+    def search(self, query: str, limit: int = 10,
+               allowed: Optional[Set[int]] = None) -> Tuple[List[Tuple[int, float]], int]:
+        """
+        Score documents matching any query term with BM25F.
+
+        Returns the top ``limit`` (doc_id, score) pairs, best first, and the
+        total number of matching documents. ``allowed`` restricts scoring to
+        those document ids.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return [], 0
+
+            boosts = [self.field_boosts[name] for name in self.fields]
+            average_lengths = [max(total / doc_count, 1.0) for total in self.total_lengths]
+            k1, b = self.k1, self.b
+
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                if allowed is not None:
+                    # Walk whichever side is smaller
+                    if len(allowed) < len(postings):
+                        postings = {doc_id: postings[doc_id] for doc_id in allowed if doc_id in postings}
+                    else:
+                        postings = {doc_id: counts for doc_id, counts in postings.items() if doc_id in allowed}
+                for doc_id, counts in postings.items():
+                    lengths = self.doc_lengths[doc_id]
+                    weighted_tf = 0.0
+                    for position, tf in enumerate(counts):
+                        if tf:
+                            norm = 1 - b + b * lengths[position] / average_lengths[position]
+                            weighted_tf += boosts[position] * tf / norm
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * weighted_tf / (k1 + weighted_tf)
+
+        # Partial selection keeps this O(n log k) instead of sorting every match
+        top = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return top, len(scores)
+
+
+class FilterIndex:
+    """Category and tag memberships used to restrict results"""
+
+    def __init__(self):
+        self.categories: Dict[str, Set[int]] = {}
+        self.tags: Dict[str, Set[int]] = {}
+        self.doc_attributes: Dict[int, Tuple[Optional[str], Tuple[str, ...]]] = {}
+        self._lock = threading.RLock()
+
+    def add_document(self, doc_id: int, category: Optional[str], tags: Iterable[str]):
+        with self._lock:
+            self._remove(doc_id)
+            tags = tuple(tags)
+            self.doc_attributes[doc_id] = (category, tags)
+            if category:
+                self.categories.setdefault(category, set()).add(doc_id)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(doc_id)
+
+    def remove_document(self, doc_id: int):
+        with self._lock:
+            self._remove(doc_id)
+
+    def matching(self, filters: Optional[Dict[str, Any]]) -> Optional[Set[int]]:
+        """
+        Ids of documents passing ``filters``: any of the given categories and
+        all of the given tags. Returns None when nothing is filtered.
+        """
+        if not filters:
+            return None
+        categories = filters.get("category") or filters.get("categories")
+        tags = filters.get("tags")
+        if isinstance(categories, str):
+            categories = [categories]
+        if isinstance(tags, str):
+            tags = [tags]
+        if not categories and not tags:
+            return None
+        with self._lock:
+            allowed: Optional[Set[int]] = None
+            if categories:
+                allowed = set()
+                for category in categories:
+                    allowed |= self.categories.get(category, set())
+            for tag in sorted(tags or [], key=lambda tag: len(self.tags.get(tag, ()))):
+                members = self.tags.get(tag, set())
+                allowed = set(members) if allowed is None else allowed & members
+                if not allowed:
+                    break
+            return allowed if allowed is not None else set()
+
+    def _remove(self, doc_id: int):
+        attributes = self.doc_attributes.pop(doc_id, None)
+        if attributes is None:
+            return
+        category, tags = attributes
+        for bucket, key in [(self.categories, category)] + [(self.tags, tag) for tag in tags]:
+            members = bucket.get(key)
+            if members is not None:
+                members.discard(doc_id)
+                if not members:
+                    del bucket[key]
+
+
+def article_fields(document: Dict[str, Any]) -> Dict[str, Union[str, List[str]]]:
+    """Title text and the body's stored token stream"""
+    return {"title": document["title"], "content": document["tokens"]}
+
+
+class ArticleIndex:
+    """
+    Keyword and filter structures for the article corpus, kept current by
+    applying per-article deltas and versioned by the newest ``updated_at``
+    seen (the watermark). ``keywords`` defaults to the in-memory index; a
+    ``fulltext.FullTextIndex`` leaves keyword postings to the database.
+    """
+
+    def __init__(self, keywords=None):
+        self.keywords = keywords if keywords is not None else InvertedIndex()
+        # Without in-memory postings, synced documents only need filter attributes
+        self.keywords_in_memory = not getattr(self.keywords, "maintained_by_database", False)
+        self.filters = FilterIndex()
+        self.watermark: Optional[datetime] = None
+        # Article id -> updated_at applied, so catch-ups skip rows already seen
+        self.versions: Dict[int, Optional[datetime]] = {}
+        self.last_sync = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.filters.doc_attributes)
+
+    def add_document(self, document: Dict[str, Any]):
+        doc_id = document["id"]
+        # Documents without tokens (tag-only edits) keep their postings
+        if self.keywords_in_memory and "tokens" in document:
+            self.keywords.add_document(doc_id, article_fields(document))
+        self.filters.add_document(doc_id, document.get("category"), document.get("tags", []))
+
+    def remove_document(self, doc_id: int):
+        self.keywords.remove_document(doc_id)
+        self.filters.remove_document(doc_id)
+
+    def apply_deltas(self, deltas: List[ArticleDelta]):
+        with self._lock:
+            for delta in deltas:
+                if delta.op == UPSERT:
+                    self.add_document(delta.document)
+                elif delta.op == DELETE:
+                    self.remove_document(delta.article_id)
+            self.watermark = advance_watermark(self.watermark, deltas)
+            record_versions(self.versions, deltas)
+        if deltas:
+            _bump_corpus_version()
+
+    def sync(self, db: Session):
+        """Catch up with changes committed elsewhere, e.g. by another worker"""
+        deltas = changes_since(db, self.watermark, self.versions, with_tokens=self.keywords_in_memory)
+        if deltas:
+            self.apply_deltas(deltas)
+        self.last_sync = time.monotonic()
+
+
+# Seconds between catch-up queries for writes this process did not see
+SYNC_INTERVAL = 5.0
+
+_article_index: Optional[ArticleIndex] = None
+_build_lock = threading.Lock()
+
+# Bumped whenever this process sees Article rows change, through listeners,
+# catch-up syncs or a reset; never goes backwards, so it can key caches
+_corpus_version = 0
+_version_lock = threading.Lock()
+_version_listeners: List[Callable[[], None]] = []
+
+
+def corpus_version() -> int:
+    return _corpus_version
+
+
+def on_corpus_change(listener: Callable[[], None]):
+    """
+    Call ``listener`` after every corpus version bump, including those from
+    catching up with other processes' writes; shared caches use it to move
+    their own version.
+    """
+    if listener not in _version_listeners:
+        _version_listeners.append(listener)
+
+
+def _bump_corpus_version():
+    global _corpus_version
+    with _version_lock:
+        _corpus_version += 1
+    for listener in list(_version_listeners):
+        try:
+            listener()
+        except Exception as e:
+            print(f"Error applying corpus change: {str(e)}")
+
+
+def keyword_index(settings):
+    """Keyword structure for SEARCH_KEYWORD_BACKEND: "memory" or "database" """
+    backend = settings.SEARCH_KEYWORD_BACKEND.lower()
+    if backend == "memory":
+        return InvertedIndex()
+    if backend == "database":
+        from fulltext import FullTextIndex
+        return FullTextIndex()
+    raise ValueError(f"Unknown keyword backend: {settings.SEARCH_KEYWORD_BACKEND}")
+
+
+def get_article_index(db: Session) -> ArticleIndex:
+    """Return the process-wide article index, building it on first use"""
+    global _article_index
+    if _article_index is None:
+        with _build_lock:
+            if _article_index is None:
+                index = ArticleIndex(keyword_index(get_settings()))
+                index.sync(db)
+                _article_index = index
+    elif time.monotonic() - _article_index.last_sync > SYNC_INTERVAL:
+        _article_index.sync(db)
+    return _article_index
+
+
+def apply_article_deltas(deltas: List[ArticleDelta]):
+    """Listener for ``indexing.register_listener``"""
+    if any(delta.op == RESYNC for delta in deltas):
+        reset_article_index()
+    elif _article_index is not None:
+        _article_index.apply_deltas(deltas)
+    elif deltas:
+        # Nothing indexed yet, but caches keyed on the version must still move
+        _bump_corpus_version()
+
+
+def reset_article_index():
+    """Forget the current index so the next search rebuilds it"""
+    global _article_index
+    with _build_lock:
+        _article_index = None
+    _bump_corpus_version()
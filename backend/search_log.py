@@ -0,0 +1,150 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from analytics import apply_search_logs, filter_category
+from config import get_settings
+from database import get_db_session
+from models import SearchLog, utcnow
+
+_STOP = object()
+
+
+class SearchLogWriter:
+    """
+    Takes search logging off the request path.
+
+    ``record`` only enqueues, and it never blocks. A background thread writes
+    the queue to ``search_logs`` in bulk inserts. It flushes once
+    ``batch_size`` rows are waiting or ``flush_interval`` seconds have passed.
+    When the queue is full, new entries are dropped and counted, so a slow
+    database cannot back up into search latency. ``stop`` drains everything
+    already queued before it returns. Each batch is added to the analytics
+    rollups in the transaction that inserts it.
+    """
+
+    def __init__(self, max_queue: int = 10_000, batch_size: int = 500, flush_interval: float = 1.0,
+                 session_factory=get_db_session):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+        }
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="search-log-writer", daemon=True)
+                self._thread.start()
+
+    def record(self, query: str, results_count: int, category: Optional[str] = None):
+        """Queue one search for logging; drops it if the queue is full"""
+        if self._thread is None:
+            self.start()
+        row = {"query": query[:255], "results_count": results_count, "category": category, "created_at": utcnow()}
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return
+        self.stats["enqueued"] += 1
+
+    def _run(self):
+        while True:
+            batch: List[Dict[str, Any]] = []
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if stopping:
+                # Drain whatever was queued before the stop marker
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            for start in range(0, len(batch), self.batch_size):
+                self._write(batch[start:start + self.batch_size])
+            if stopping:
+                return
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        for attempt in range(2):
+            try:
+                with self.session_factory() as db:
+                    db.execute(insert(SearchLog), rows)
+                    apply_search_logs(db, rows)
+                    db.commit()
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == 0:
+                    # Usually a transient lock held by another writer
+                    time.sleep(0.1)
+                    continue
+                print(f"Error writing search logs: {str(e)}")
+                self.stats["failed"] += len(rows)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Flush everything queued so far and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        # Blocking put: the stop marker must get in even when the queue is full
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus the current queue depth"""
+        return dict(self.stats, queued=self._queue.qsize())
+
+
+_writer: Optional[SearchLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_search_log_writer() -> SearchLogWriter:
+    """Process-wide writer, configured from Settings"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                settings = get_settings()
+                _writer = SearchLogWriter(
+                    max_queue=settings.SEARCH_LOG_QUEUE_SIZE,
+                    batch_size=settings.SEARCH_LOG_BATCH_SIZE,
+                    flush_interval=settings.SEARCH_LOG_FLUSH_INTERVAL,
+                )
+                # Scripts never run the app's shutdown hook; flush on exit anyway
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def log_search(query: str, results_count: int, filters: Optional[Dict[str, Any]] = None):
+    get_search_log_writer().record(query, results_count, filter_category(filters))
@@ -0,0 +1,122 @@
+import html
+import re
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from preprocess import strip_html, tokenize
+
+# Same notion of a word as search_index.tokenize, with offsets into the original text
+WORD_RE = re.compile(r"[a-z0-9]+", re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r"[.!?](?=\s)")
+
+SUMMARY_CHARS = 240
+SNIPPET_CHARS = 160
+MAX_SNIPPETS = 2
+
+Span = Tuple[int, int]
+
+
+def plain_text(content: str) -> str:
+    """Article HTML as display text: markup dropped, entities decoded, whitespace collapsed"""
+    return " ".join(html.unescape(strip_html(content)).split())
+
+
+def summarize(text: str, length: int = SUMMARY_CHARS) -> str:
+    """Leading sentences of the plain text that fit ``length``, else a word-boundary cut"""
+    if len(text) <= length:
+        return text
+    head = text[:length + 1]
+    ends = [match.end() for match in SENTENCE_END_RE.finditer(head)]
+    if ends and ends[-1] >= length // 2:
+        return head[:ends[-1]]
+    cut = head.rfind(" ")
+    return head[:cut if cut > 0 else length].rstrip(" ,;:") + "…"
+
+
+def article_summary(title: str, content: str) -> str:
+    """Summary of an article body, without the heading that repeats its title"""
+    text = plain_text(content)
+    if title and text.startswith(title):
+        text = text[len(title):].lstrip()
+    return summarize(text)
+
+
+def term_spans(text: str, terms: Set[str]) -> List[Span]:
+    """(start, end) of every word in ``text`` that is one of the query terms"""
+    if not terms:
+        return []
+    return [match.span() for match in WORD_RE.finditer(text) if match.group().lower() in terms]
+
+
+def _snap(text: str, start: int, end: int) -> Span:
+    """Shrink a window so it neither starts nor ends mid-word"""
+    if start > 0 and not text[start - 1].isspace():
+        space = text.find(" ", start, end)
+        start = space + 1 if space != -1 else start
+    if end < len(text) and not text[end].isspace():
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+    return start, end
+
+
+def snippets(text: str, terms: Set[str], width: int = SNIPPET_CHARS,
+             limit: int = MAX_SNIPPETS) -> List[Dict[str, Any]]:
+    """
+    Up to ``limit`` non-overlapping windows of ``text`` that cover the most
+    distinct query terms, in document order. ``offset`` is the window's
+    position in the plain text and ``highlights`` are term spans relative to
+    the window.
+    """
+    spans = term_spans(text, terms)
+    if not spans:
+        return []
+
+    # Slide a window starting a little before each match; two pointers keep this linear
+    lead = width // 4
+    candidates = []
+    counts: Dict[str, int] = {}
+    right = 0
+    for left, (start, _) in enumerate(spans):
+        window_start = max(0, start - lead)
+        window_end = window_start + width
+        while right < len(spans) and spans[right][1] <= window_end:
+            word = text[spans[right][0]:spans[right][1]].lower()
+            counts[word] = counts.get(word, 0) + 1
+            right += 1
+        if counts:
+            candidates.append((len(counts), right - left, -window_start, window_start))
+        if right > left:
+            word = text[start:spans[left][1]].lower()
+            counts[word] -= 1
+            if not counts[word]:
+                del counts[word]
+        else:
+            right = left + 1
+
+    chosen: List[Span] = []
+    for _, _, _, window_start in sorted(candidates, reverse=True):
+        window = _snap(text, window_start, min(len(text), window_start + width))
+        if all(window[1] <= other[0] or window[0] >= other[1] for other in chosen):
+            chosen.append(window)
+            if len(chosen) == limit:
+                break
+
+    results = []
+    for window_start, window_end in sorted(chosen):
+        results.append({
+            "text": text[window_start:window_end],
+            "offset": window_start,
+            "highlights": [
+                [start - window_start, end - window_start]
+                for start, end in spans
+                if start >= window_start and end <= window_end
+            ],
+        })
+    return results
+
+
+def query_terms(query: str) -> Set[str]:
+    return set(tokenize(query))
+
+
+def highlight_spans(text: str, terms: Iterable[str]) -> List[List[int]]:
+    return [list(span) for span in term_spans(text, set(terms))]
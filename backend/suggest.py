@@ -0,0 +1,275 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+import analytics
+from config import get_settings
+from indexing import (
+    DELETE, RESYNC, UPSERT, ArticleDelta, advance_watermark, changes_since, load_documents, record_versions
+)
+
+# Phrases are indexed from each of their first few word starts, so "swi" finds "kill switch"
+MAX_WORD_STARTS = 8
+# Prefixes this short match most of the vocabulary; their answers are precomputed
+PRECOMPUTED_PREFIX_CHARS = 2
+MEMO_ITEMS = 50_000
+MAX_SUGGESTIONS = 10
+# Delta batches larger than this rebuild the sorted array instead of splicing into it
+BULK_THRESHOLD = 64
+
+
+def normalize_phrase(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class SuggestionIndex:
+    """
+    Prefix index over article titles, tags and popular past queries.
+
+    Every phrase is stored under the suffixes that start at each of its
+    words, in one sorted array of (key, phrase) pairs. A prefix lookup
+    bisects to the matching range and keeps the most frequent phrases.
+    Weights: a title counts once per article, a tag once per tagged article,
+    a query once per logged search that found results. Per-prefix answers
+    are memoized; a change only drops the memo entries for prefixes of the
+    phrases it touched.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str]] = []
+        self._weights: Dict[str, float] = {}
+        self._display: Dict[str, str] = {}
+        self._articles: Dict[int, List[str]] = {}
+        self._queries: Dict[str, float] = {}
+        self._memo: Dict[str, List[Tuple[float, str]]] = {}
+        self._lock = threading.RLock()
+        # While set, weight changes skip the sorted array, which is rebuilt in one sort afterwards
+        self._bulk = False
+        self.watermark: Optional[datetime] = None
+        self.versions: Dict[int, Optional[datetime]] = {}
+        self.last_sync = 0.0
+        self.last_query_refresh = 0.0
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    @staticmethod
+    def _keys(phrase: str) -> Iterable[str]:
+        words = phrase.split(" ")
+        for start in range(min(len(words), MAX_WORD_STARTS)):
+            yield " ".join(words[start:])
+
+    def _add_weight(self, text: str, weight: float):
+        phrase = normalize_phrase(text)
+        if not phrase:
+            return
+        current = self._weights.get(phrase, 0.0)
+        if current <= 0:
+            if not self._bulk:
+                for key in self._keys(phrase):
+                    insort(self._entries, (key, phrase))
+            self._display.setdefault(phrase, text.strip())
+        if current + weight > 0:
+            self._weights[phrase] = current + weight
+            self._invalidate(phrase)
+        else:
+            self._remove_phrase(phrase)
+
+    def _remove_phrase(self, phrase: str):
+        self._weights.pop(phrase, None)
+        self._display.pop(phrase, None)
+        if self._bulk:
+            return
+        for key in self._keys(phrase):
+            position = bisect_left(self._entries, (key, phrase))
+            if position < len(self._entries) and self._entries[position] == (key, phrase):
+                del self._entries[position]
+        self._invalidate(phrase)
+
+    def _invalidate(self, phrase: str):
+        """
+        Patch the memoized top lists this phrase appears under. A phrase that
+        gained weight can only move up, so it is merged in place; a listed
+        phrase that lost weight drops the list, to be recomputed on next use.
+        """
+        if self._bulk:
+            return
+        weight = self._weights.get(phrase, 0.0)
+        for key in self._keys(phrase):
+            for length in range(1, len(key) + 1):
+                prefix = key[:length]
+                ranked = self._memo.get(prefix)
+                if ranked is None:
+                    continue
+                listed = next((item for item in ranked if item[1] == phrase), None)
+                if listed is not None and weight < -listed[0]:
+                    del self._memo[prefix]
+                    continue
+                entry = (-weight, phrase)
+                if weight > 0 and (listed is not None or len(ranked) < MAX_SUGGESTIONS or entry < ranked[-1]):
+                    merged = [item for item in ranked if item[1] != phrase] + [entry]
+                    self._memo[prefix] = sorted(merged)[:MAX_SUGGESTIONS]
+
+    def _remove_article(self, article_id: int):
+        for text in self._articles.pop(article_id, []):
+            self._add_weight(text, -1.0)
+
+    def add_article(self, document: Dict[str, Any]):
+        """Index (or re-index) one article's title and tags"""
+        with self._lock:
+            self._remove_article(document["id"])
+            texts = [document["title"]] + [tag for tag in document.get("tags", []) if tag]
+            for text in texts:
+                self._add_weight(text, 1.0)
+            self._articles[document["id"]] = texts
+
+    def remove_article(self, article_id: int):
+        with self._lock:
+            self._remove_article(article_id)
+
+    def apply_deltas(self, deltas: List[ArticleDelta]):
+        with self._lock:
+            # Small batches are spliced into the sorted array; large ones re-sort it once
+            self._bulk = len(deltas) > BULK_THRESHOLD
+            try:
+                for delta in deltas:
+                    if delta.op == UPSERT:
+                        self.add_article(delta.document)
+                    elif delta.op == DELETE:
+                        self.remove_article(delta.article_id)
+            finally:
+                if self._bulk:
+                    self._bulk = False
+                    self._rebuild_entries()
+            self.watermark = advance_watermark(self.watermark, deltas)
+            record_versions(self.versions, deltas)
+
+    def set_queries(self, counts: Dict[str, float]):
+        """Replace the popular-query contribution with fresh counts"""
+        with self._lock:
+            self._bulk = True
+            try:
+                for phrase, count in self._queries.items():
+                    self._add_weight(phrase, -count)
+                for phrase, count in counts.items():
+                    self._add_weight(phrase, count)
+                self._queries = dict(counts)
+            finally:
+                self._bulk = False
+                self._rebuild_entries()
+
+    def _rebuild_entries(self):
+        self._entries = sorted((key, phrase) for phrase in self._weights for key in self._keys(phrase))
+        self._memo.clear()
+        self._precompute()
+
+    def _precompute(self):
+        # Warm the memo for every short prefix in the vocabulary so the first keystrokes are cheap
+        prefixes = {key[:length] for key, _ in self._entries for length in range(1, PRECOMPUTED_PREFIX_CHARS + 1)}
+        for prefix in prefixes:
+            self._ranked(prefix)
+
+    def _ranked(self, prefix: str) -> List[Tuple[float, str]]:
+        ranked = self._memo.get(prefix)
+        if ranked is not None:
+            return ranked
+        start = bisect_left(self._entries, (prefix,))
+        end = bisect_left(self._entries, (prefix + "\uffff",))
+        phrases: Set[str] = {phrase for _, phrase in self._entries[start:end]}
+        ranked = heapq.nsmallest(MAX_SUGGESTIONS, ((-self._weights[phrase], phrase) for phrase in phrases))
+        if len(self._memo) >= MEMO_ITEMS:
+            self._memo.clear()
+        self._memo[prefix] = ranked
+        return ranked
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[str]:
+        """Most frequent phrases with a word starting with ``prefix``, at most MAX_SUGGESTIONS"""
+        prefix = normalize_phrase(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            ranked = self._ranked(prefix)
+            return [self._display.get(phrase, phrase) for _, phrase in ranked[:limit]]
+
+    def sync(self, db: Session):
+        """Catch up with article changes committed elsewhere"""
+        deltas = changes_since(db, self.watermark, self.versions, with_tokens=False)
+        if deltas:
+            self.apply_deltas(deltas)
+        self.last_sync = time.monotonic()
+
+    def refresh_queries(self, db: Session):
+        self.set_queries(popular_queries(db))
+        self.last_query_refresh = time.monotonic()
+
+
+def popular_queries(db: Session) -> Dict[str, float]:
+    """Counts of recent searches that found something, read from the hourly search rollups"""
+    settings = get_settings()
+    rows = db.execute(analytics.popular_queries(
+        analytics.since_days(settings.SUGGEST_QUERY_DAYS),
+        settings.SUGGEST_MIN_QUERY_COUNT,
+        settings.SUGGEST_MAX_QUERIES,
+    ))
+    counts: Dict[str, float] = {}
+    for row in rows:
+        normalized = normalize_phrase(row.query or "")
+        if normalized:
+            counts[normalized] = counts.get(normalized, 0.0) + row.count
+    return counts
+
+
+# Seconds between catch-up queries for article writes this process did not see
+SYNC_INTERVAL = 5.0
+
+_suggestion_index: Optional[SuggestionIndex] = None
+_build_lock = threading.Lock()
+
+
+def ready_suggestion_index() -> Optional[SuggestionIndex]:
+    """The index if it can answer without touching the database, else None"""
+    index = _suggestion_index
+    if index is None:
+        return None
+    now = time.monotonic()
+    if now - index.last_sync > SYNC_INTERVAL:
+        return None
+    if now - index.last_query_refresh > get_settings().SUGGEST_REFRESH_INTERVAL:
+        return None
+    return index
+
+
+def get_suggestion_index(db: Session) -> SuggestionIndex:
+    """Return the process-wide suggestion index, building or catching it up as needed"""
+    global _suggestion_index
+    if _suggestion_index is None:
+        with _build_lock:
+            if _suggestion_index is None:
+                index = SuggestionIndex()
+                index.apply_deltas([ArticleDelta(UPSERT, doc["id"], doc) for doc in load_documents(db, with_tokens=False)])
+                index.last_sync = time.monotonic()
+                index.refresh_queries(db)
+                _suggestion_index = index
+        return _suggestion_index
+    index = _suggestion_index
+    now = time.monotonic()
+    if now - index.last_sync > SYNC_INTERVAL:
+        index.sync(db)
+    if now - index.last_query_refresh > get_settings().SUGGEST_REFRESH_INTERVAL:
+        index.refresh_queries(db)
+    return index
+
+
+def apply_article_deltas(deltas: List[ArticleDelta]):
+    """Listener for ``indexing.register_listener``"""
+    global _suggestion_index
+    if any(delta.op == RESYNC for delta in deltas):
+        with _build_lock:
+            _suggestion_index = None
+    elif _suggestion_index is not None:
+        _suggestion_index.apply_deltas(deltas)
@@ -0,0 +1,110 @@
+"""
+Test settings: a throwaway SQLite database, the fake embedding and answer
+providers and no on-disk caches. They are set before any backend module is
+imported, because Settings and the database engines are created at import.
+
+    cd backend && python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_scratch = tempfile.mkdtemp(prefix="kb-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_scratch, 'test.db')}",
+    "DATABASE_READ_URL": "",
+    "EMBEDDING_PROVIDER": "fake",
+    "ANSWER_PROVIDER": "fake",
+    "EMBEDDING_CACHE_PATH": "",
+    "EMBEDDING_MAX_RETRIES": "0",
+    "VECTOR_INDEX_PATH": os.path.join(_scratch, "vector_index"),
+    "SEARCH_CACHE_BACKEND": "local",
+    "SEARCH_KEYWORD_BACKEND": "memory",
+    "ANALYTICS_WARM_QUERIES": "0",
+})
+
+import pytest  # noqa: E402
+
+import indexing  # noqa: E402
+import result_cache  # noqa: E402
+import search_index  # noqa: E402
+from ai_engine import AIEngine  # noqa: E402
+from benchmarks.corpus import write_corpus  # noqa: E402
+from database import get_db_session  # noqa: E402
+from embedding_cache import EmbeddingCache  # noqa: E402
+from init_db import ingest_docs  # noqa: E402
+
+CORPUS_SIZE = 20
+
+
+class FakeRedis:
+    """In-memory stand-in for the ``redis.Redis`` calls the result cache makes"""
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self.values.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self.values[key]
+                return None
+            return value
+
+    def setex(self, key, seconds, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        with self._lock:
+            self.values[key] = (value, time.monotonic() + seconds)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires = self.values.get(key, (b"0", None))
+            value = int(value) + 1
+            self.values[key] = (str(value).encode("utf-8"), expires)
+            return value
+
+
+@pytest.fixture
+def docs(tmp_path):
+    """A fresh corpus, ingested from scratch without embeddings; returns its directory"""
+    directory = str(tmp_path / "docs")
+    write_corpus(directory, CORPUS_SIZE, seed=1)
+    ingest_docs(directory, full=True, embed=False, workers=1)
+    search_index.reset_article_index()
+    yield directory
+    search_index.reset_article_index()
+
+
+@pytest.fixture
+def engine(docs):
+    """An AIEngine with its vector index built over ``docs``"""
+    ai_engine = AIEngine(embedding_cache=EmbeddingCache())
+    with get_db_session() as db:
+        ai_engine.sync_vector_store(db)
+    return ai_engine
+
+
+@pytest.fixture
+def other_process(monkeypatch):
+    """Commits made while this is active reach no listener, as if another process made them"""
+    monkeypatch.setattr(indexing, "_listeners", [])
+
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    """A Redis-backed result cache on FakeRedis, installed as the process-wide cache"""
+    cache = result_cache.ResultCache(result_cache.RedisResultCacheBackend(FakeRedis()))
+    monkeypatch.setattr(result_cache, "_result_cache", cache)
+    monkeypatch.setattr(result_cache, "_result_cache_created", True)
+    monkeypatch.setattr(search_index, "_version_listeners", [cache.invalidate])
+    return cache
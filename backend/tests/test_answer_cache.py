@@ -0,0 +1,77 @@
+import numpy as np
+
+from answer_cache import AnswerCache
+from database import get_db_session
+from indexing import DELETE, RESYNC, UPSERT, ArticleDelta
+from models import Article
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_paraphrase_hits_only_with_the_same_sources():
+    cache = AnswerCache(dimension=3, threshold=0.9)
+    cache.store(unit([1, 0, 0]), cache.versions([1, 2]), "answer")
+    assert cache.lookup(unit([1, 0.1, 0]), [1, 2]) == "answer"
+    assert cache.lookup(unit([1, 0.1, 0]), [1]) is None
+    assert cache.lookup(unit([0, 1, 0]), [1, 2]) is None
+
+
+def test_changed_source_invalidates_its_answers():
+    cache = AnswerCache(dimension=3)
+    cache.store(unit([1, 0, 0]), cache.versions([1]), "about 1")
+    cache.store(unit([0, 1, 0]), cache.versions([2]), "about 2")
+    cache.apply_article_deltas([ArticleDelta(UPSERT, 1, {"id": 1}), ArticleDelta(DELETE, 5, {})])
+    assert cache.lookup(unit([1, 0, 0]), [1]) is None
+    assert cache.lookup(unit([0, 1, 0]), [2]) == "about 2"
+
+
+def test_answer_generated_across_a_change_is_not_stored():
+    cache = AnswerCache(dimension=3)
+    versions = cache.versions([1])
+    cache.apply_article_deltas([ArticleDelta(UPSERT, 1, {"id": 1})])
+    cache.store(unit([1, 0, 0]), versions, "stale")
+    assert len(cache) == 0
+
+    # A bulk change outdates even articles the cache had never seen
+    versions = cache.versions([7])
+    cache.apply_article_deltas([ArticleDelta(RESYNC, None, {})])
+    cache.store(unit([1, 0, 0]), versions, "stale")
+    assert len(cache) == 0
+
+
+def test_expired_answers_are_not_served():
+    cache = AnswerCache(dimension=3, ttl=0.0)
+    cache.store(unit([1, 0, 0]), cache.versions([1]), "answer")
+    assert cache.lookup(unit([1, 0, 0]), [1]) is None
+
+
+def cache_answer(engine, question):
+    context, sources, cached, pending = engine._prepare_answer(question)
+    assert cached is None
+    engine._store_answer(pending, ["generated answer"])
+    return [source["id"] for source in sources]
+
+
+def test_edit_by_another_process_invalidates_cached_answers(engine, other_process):
+    sources = cache_answer(engine, "how do I reset my password")
+    assert engine._prepare_answer("how do I reset my password")[2] == "generated answer"
+
+    with get_db_session() as db:
+        article = db.get(Article, sources[0])
+        article.content = article.content + "\n\nThe reset link now expires after an hour."
+        db.commit()
+    # Due for its periodic catch-up
+    engine.last_sync = 0
+
+    assert engine._prepare_answer("how do I reset my password")[2] is None
+
+
+def test_vector_index_rebuild_clears_cached_answers(engine):
+    cache_answer(engine, "how do I reset my password")
+    engine.vector_store.watermark = None
+    with get_db_session() as db:
+        engine.sync_vector_store(db)
+    assert len(engine.answer_cache) == 0
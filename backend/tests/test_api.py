@@ -0,0 +1,21 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(docs):
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("page, page_size", [(0, 10), (-1, 10), (main.MAX_PAGE + 1, 10), (1, 0), (1, main.MAX_PAGE_SIZE + 1)])
+def test_search_rejects_out_of_range_paging(client, page, page_size):
+    response = client.post("/search", json={"query": "password", "page": page, "page_size": page_size})
+    assert response.status_code == 422
+
+
+def test_search_accepts_paging_at_the_limits(client):
+    response = client.post("/search", json={"query": "password", "page": main.MAX_PAGE, "page_size": main.MAX_PAGE_SIZE})
+    assert response.status_code == 200
+    assert response.json()["results"] == []
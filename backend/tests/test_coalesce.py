@@ -0,0 +1,253 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import coalesce
+from coalesce import Limiter, Overloaded, ThreadLimiter
+from concurrency import ReadWriteLock
+
+
+def test_slot_handed_over_as_the_wait_times_out_is_passed_on(monkeypatch):
+    limiter = Limiter(1, max_queue=1, timeout=1.0)
+
+    async def late_wait_for(waiter, timeout):
+        # The holder hands its slot over, but the timeout wins the race to wake the waiter
+        while not waiter.done():
+            await asyncio.sleep(0)
+        raise asyncio.TimeoutError
+
+    async def hold(release):
+        async with limiter.slot():
+            await release.wait()
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        monkeypatch.setattr(coalesce.asyncio, "wait_for", late_wait_for)
+        waiting = asyncio.create_task(limiter.slot().__aenter__())
+        await asyncio.sleep(0)
+        release.set()
+        await holder
+        with pytest.raises(Overloaded):
+            await waiting
+
+    asyncio.run(scenario())
+    assert limiter.active == 0
+    assert limiter.stats["timed_out"] == 1
+
+
+def test_concurrent_identical_calls_share_one_computation():
+    flights = coalesce.SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"hits": 3}
+
+    async def scenario():
+        return await asyncio.gather(*(flights.do("reset password", compute) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.snapshot() == {"leaders": 1, "followers": 4, "in_flight": 0}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_computation():
+    flights = coalesce.SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def scenario():
+        leader = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_threads_share_results_and_errors():
+    flights = coalesce.ThreadSingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute(fail):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        if fail:
+            raise ValueError("embedding failed")
+        return "result"
+
+    for fail in (False, True):
+        calls.clear()
+        started.clear()
+        release.clear()
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(flights.do("key", compute, fail))
+            except ValueError as e:
+                outcomes.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=call) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        # Followers block on the leader's flight
+        while flights.stats["followers"] < 3 * (2 if fail else 1):
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert len(outcomes) == 4
+        if fail:
+            assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+        else:
+            assert outcomes == ["result"] * 4
+    assert flights.snapshot()["in_flight"] == 0
+
+
+def test_limiter_sheds_beyond_the_queue_and_times_out_waiters():
+    limiter = Limiter(1, max_queue=1, timeout=0.05)
+
+    async def hold(release):
+        async with limiter.slot():
+            await release.wait()
+
+    async def wait_for_slot():
+        async with limiter.slot():
+            pass
+
+    async def scenario():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await wait_for_slot()
+        with pytest.raises(Overloaded):
+            await queued
+        release.set()
+        await holder
+
+    asyncio.run(scenario())
+    assert limiter.snapshot() == {
+        "admitted": 1, "queued": 1, "shed": 1, "timed_out": 1, "active": 0, "waiting": 0, "limit": 1,
+    }
+
+
+def test_limiter_hands_a_released_slot_to_the_next_waiter():
+    limiter = Limiter(1, max_queue=2, timeout=1.0)
+    order = []
+
+    async def run(name):
+        async with limiter.slot():
+            order.append(name)
+            await asyncio.sleep(0.001)
+
+    async def scenario():
+        await asyncio.gather(run("a"), run("b"), run("c"))
+
+    asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+    assert limiter.active == 0
+    assert limiter.stats["queued"] == 2
+
+
+def test_thread_limiter_sheds_and_times_out():
+    limiter = ThreadLimiter(1, max_queue=1, timeout=0.05)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with limiter.slot():
+            holding.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(5)
+    errors = []
+
+    def wait_for_slot():
+        try:
+            with limiter.slot():
+                pass
+        except Overloaded as e:
+            errors.append(e)
+
+    queued = threading.Thread(target=wait_for_slot)
+    queued.start()
+    while not limiter.waiting:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded):
+        with limiter.slot():
+            pass
+    queued.join(5)
+    release.set()
+    holder.join(5)
+
+    assert len(errors) == 1
+    assert limiter.snapshot() == {
+        "admitted": 1, "queued": 1, "shed": 1, "timed_out": 1, "active": 0, "waiting": 0, "limit": 1,
+    }
+    with limiter.slot():
+        assert limiter.active == 1
+
+
+def test_read_write_lock_excludes_readers_while_writing():
+    lock = ReadWriteLock()
+    events = []
+    reading = threading.Event()
+    release = threading.Event()
+
+    def reader():
+        with lock.read():
+            events.append("read")
+            reading.set()
+            release.wait(5)
+        events.append("read done")
+
+    def writer():
+        with lock.write():
+            events.append("write")
+            # A writer may re-enter and read while it holds the lock
+            with lock.write(), lock.read():
+                pass
+
+    first = threading.Thread(target=reader)
+    first.start()
+    reading.wait(5)
+    second = threading.Thread(target=writer)
+    second.start()
+    while not lock._waiting_writers:
+        time.sleep(0.001)
+    # A waiting writer holds back new readers
+    late = threading.Thread(target=reader)
+    late.start()
+    time.sleep(0.01)
+    assert events == ["read"]
+    release.set()
+    for thread in (first, second, late):
+        thread.join(5)
+
+    assert events[:3] == ["read", "read done", "write"]
+    assert events.count("read") == 2
+    assert lock._readers == 0 and lock._writer is None
@@ -0,0 +1,83 @@
+import sqlite3
+
+import numpy as np
+
+import embedding_cache
+from embedding_cache import EmbeddingCache, cache_key
+
+MODEL = "fake-model"
+
+
+def vector(seed):
+    return np.random.default_rng(seed).random(8, dtype=np.float32)
+
+
+def test_vectors_survive_a_restart(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(path)
+    cache.put_many(["reset password", "kill switch"], MODEL, [vector(1), vector(2)])
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    assert np.array_equal(reopened.get("reset   password", MODEL), vector(1))
+    assert reopened.get("kill switch", "other-model") is None
+    assert reopened.snapshot()["disk_hits"] == 1
+    assert reopened.snapshot()["disk_items"] == 2
+    reopened.close()
+
+
+def test_cached_vectors_are_read_only():
+    cache = EmbeddingCache()
+    cache.put("reset password", MODEL, vector(1))
+    assert not cache.get("reset password", MODEL).flags.writeable
+
+
+def test_put_many_commits_once_and_ignores_known_texts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    cache.put_many(["a", "b"], MODEL, [vector(1), vector(2)])
+    cache.put_many(["b", "c"], MODEL, [vector(3), vector(4)])
+    assert cache.snapshot()["disk_items"] == 3
+    # The first vector stored for a text wins on disk
+    cache._memory.clear()
+    assert np.array_equal(cache.get("b", MODEL), vector(2))
+    cache.close()
+
+
+def test_disk_hits_touch_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "TOUCH_BATCH", 2)
+    path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(path, memory_items=1)
+    cache.put_many(["a", "b", "c"], MODEL, [vector(1), vector(2), vector(3)])
+
+    def last_used(text):
+        with sqlite3.connect(path) as conn:
+            return conn.execute("SELECT last_used FROM embeddings WHERE key = ?", (cache_key(text, MODEL),)).fetchone()[0]
+
+    stored = last_used("a")
+    cache.get("a", MODEL)
+    assert last_used("a") == stored
+    assert cache._touched
+    cache.get("b", MODEL)
+    assert not cache._touched
+    assert last_used("a") > stored
+
+    cache.get("a", MODEL)
+    cache.flush()
+    assert not cache._touched
+    cache.close()
+
+
+def test_memory_and_disk_evict_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), memory_items=2, disk_items=10)
+    cache.put_many(["a", "b"], MODEL, [vector(1), vector(2)])
+    cache.get("a", MODEL)
+    cache.put("c", MODEL, vector(3))
+    assert set(cache._memory) == {cache_key("a", MODEL), cache_key("c", MODEL)}
+    assert cache.stats["memory_evictions"] == 1
+
+    for number in range(10):
+        cache.put(f"text {number}", MODEL, vector(number))
+    snapshot = cache.snapshot()
+    assert snapshot["disk_evictions"] > 0
+    assert snapshot["disk_items"] <= 10
+    cache.close()
@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from sqlalchemy import update
+
+from database import get_db_session
+from embeddings import FakeEmbeddingProvider
+from models import Article
+from search_index import corpus_version, get_article_index
+
+
+def keyword_hits(index, query):
+    ranking, _ = index.keywords.search(query, limit=50)
+    return {article_id for article_id, _ in ranking}
+
+
+def test_sync_applies_another_process_edit_and_delete(docs, other_process):
+    with get_db_session() as db:
+        index = get_article_index(db)
+        edited, deleted = [article.id for article in db.query(Article).order_by(Article.id).limit(2)]
+    assert deleted in index.filters.doc_attributes
+
+    with get_db_session() as db:
+        db.get(Article, edited).title = "Quasar handshake troubleshooting"
+        db.delete(db.get(Article, deleted))
+        db.commit()
+    assert keyword_hits(index, "quasar") == set()
+
+    with get_db_session() as db:
+        index.sync(db)
+    assert keyword_hits(index, "quasar") == {edited}
+    assert deleted not in index.filters.doc_attributes
+    assert deleted not in index.versions
+
+
+def test_sync_reads_a_commit_stamped_before_the_watermark(docs, other_process):
+    with get_db_session() as db:
+        index = get_article_index(db)
+        article_id = db.query(Article.id).order_by(Article.id).first()[0]
+    # Stamped before the watermark but committed after the index read it, as when
+    # a slower transaction commits behind a faster one
+    stamp = index.watermark.replace(tzinfo=None) - timedelta(seconds=10)
+    with get_db_session() as db:
+        db.execute(update(Article).where(Article.id == article_id).values(title="Quasar handshake", updated_at=stamp))
+        db.commit()
+
+    with get_db_session() as db:
+        index.sync(db)
+    assert keyword_hits(index, "quasar") == {article_id}
+
+    # Rows in the overlap window the index already holds are not applied again
+    version = corpus_version()
+    with get_db_session() as db:
+        index.sync(db)
+    assert corpus_version() == version
+
+
+def chunk_texts(engine, article_id):
+    return [chunk["text"] for chunk_key, chunk in engine.vector_store.chunks.items() if chunk_key >> 16 == article_id]
+
+
+def test_search_catches_the_vector_index_up(engine, other_process):
+    with get_db_session() as db:
+        edited, deleted = [article.id for article in db.query(Article).order_by(Article.id).limit(2)]
+        db.get(Article, edited).content = "Quasar handshakes fail behind captive portals."
+        db.delete(db.get(Article, deleted))
+        db.commit()
+    assert deleted in engine.vector_store.article_ids()
+
+    engine.last_sync = 0
+    engine.search("captive portal")
+    assert deleted not in engine.vector_store.article_ids()
+    assert any("Quasar" in text for text in chunk_texts(engine, edited))
+
+
+def test_failed_embedding_keeps_the_old_vectors_until_a_retry(engine, other_process, monkeypatch):
+    with get_db_session() as db:
+        article = db.query(Article).order_by(Article.id).first()
+        article_id = article.id
+        article.content = "Quasar handshakes fail behind captive portals."
+        db.commit()
+    before = chunk_texts(engine, article_id)
+    watermark = engine.vector_store.watermark
+
+    def unavailable(self, texts):
+        raise RuntimeError("model unavailable")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(FakeEmbeddingProvider, "embed_batch", unavailable)
+        with get_db_session() as db:
+            engine.sync_vector_store(db)
+    assert chunk_texts(engine, article_id) == before
+    assert article_id not in engine.vector_store.versions
+    assert engine.vector_store.watermark <= watermark
+
+    with get_db_session() as db:
+        engine.sync_vector_store(db)
+    assert any("Quasar" in text for text in chunk_texts(engine, article_id))
+    assert article_id in engine.vector_store.versions
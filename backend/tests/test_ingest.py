@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+from sqlalchemy import func, select
+
+from database import get_db_session
+from embeddings import FakeEmbeddingProvider
+from init_db import ingest_docs
+from models import Article, ArticleChunk, Feedback, article_tags
+from conftest import CORPUS_SIZE
+
+
+def first_file(docs):
+    return sorted(name for name in os.listdir(docs) if name.endswith(".md"))[0]
+
+
+def article_for(source_path):
+    with get_db_session() as db:
+        article = db.query(Article).filter(Article.source_path == source_path).one()
+        return article.id, article.slug
+
+
+def test_rerun_without_changes_writes_nothing(docs):
+    report = ingest_docs(docs, embed=False, workers=1)
+    assert (report["added"], report["changed"], report["removed"]) == (0, 0, 0)
+    assert report["unchanged"] == CORPUS_SIZE
+
+
+def test_edited_and_deleted_files(docs):
+    names = sorted(os.listdir(docs))
+    with open(os.path.join(docs, names[0]), "a", encoding="utf-8") as f:
+        f.write("\nAnother paragraph.\n")
+    os.remove(os.path.join(docs, names[1]))
+    report = ingest_docs(docs, embed=False, workers=1)
+    assert (report["added"], report["changed"], report["removed"], report["failed"]) == (0, 1, 1, 0)
+    with get_db_session() as db:
+        assert db.query(Article).count() == CORPUS_SIZE - 1
+
+
+def test_renamed_file_keeps_its_article_and_slug(docs):
+    name = first_file(docs)
+    article_id, slug = article_for(name)
+    os.rename(os.path.join(docs, name), os.path.join(docs, "renamed-" + name))
+
+    report = ingest_docs(docs, embed=False, workers=1)
+
+    assert report["failed"] == 0
+    assert report["removed"] == 0
+    assert article_for("renamed-" + name) == (article_id, slug)
+    with get_db_session() as db:
+        assert db.query(Article).count() == CORPUS_SIZE
+
+
+def test_renamed_file_next_to_a_new_one(docs):
+    name = first_file(docs)
+    article_id, _ = article_for(name)
+    os.rename(os.path.join(docs, name), os.path.join(docs, "renamed-" + name))
+    with open(os.path.join(docs, "zz-new.md"), "w", encoding="utf-8") as f:
+        f.write("# A brand new article\n\n## Category: Billing\n\n## Tags: invoice\n\nNew body text.\n")
+
+    report = ingest_docs(docs, embed=False, workers=1)
+
+    assert (report["added"], report["changed"], report["removed"], report["failed"]) == (1, 1, 0, 0)
+    assert article_for("renamed-" + name)[0] == article_id
+
+
+def test_embedding_stores_chunk_vectors(docs):
+    report = ingest_docs(docs, full=True, workers=1)
+    with get_db_session() as db:
+        chunks = db.query(ArticleChunk).all()
+        assert report["embedded_chunks"] == len(chunks) > 0
+        assert all(chunk.embedding and np.any(np.frombuffer(chunk.embedding, dtype=np.float32)) for chunk in chunks)
+
+
+def test_failed_embedding_stores_no_vectors(docs, monkeypatch):
+    def unavailable(self, texts):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(FakeEmbeddingProvider, "embed_batch", unavailable)
+    report = ingest_docs(docs, full=True, workers=1)
+    assert report["embedded_chunks"] == 0
+    with get_db_session() as db:
+        assert db.query(ArticleChunk).filter(ArticleChunk.embedding.isnot(None)).count() == 0
+
+
+def test_full_ingest_leaves_no_rows_behind_for_reused_ids(docs):
+    with get_db_session() as db:
+        db.add(Feedback(article_id=db.query(Article.id).first()[0], rating=5))
+        db.commit()
+    ingest_docs(docs, full=True, embed=False, workers=1)
+    with get_db_session() as db:
+        article_ids = select(Article.id)
+        assert db.query(ArticleChunk).filter(ArticleChunk.article_id.not_in(article_ids)).count() == 0
+        assert db.execute(
+            select(func.count()).select_from(article_tags).where(article_tags.c.article_id.not_in(article_ids))
+        ).scalar() == 0
+        assert db.query(Feedback).count() == 0
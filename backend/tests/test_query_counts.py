@@ -0,0 +1,81 @@
+import asyncio
+
+from sqlalchemy import event
+
+import ai_engine as ai_engine_module
+import search_index
+from benchmarks.corpus import write_corpus
+from database import AsyncSessionLocal, async_engine, async_read_engine, engine, get_db_session, read_engine
+from init_db import ingest_docs
+from search import SearchEngine
+from search_index import reset_article_index
+from search_log import get_search_log_writer
+
+
+class StatementCounter:
+    """Statements sent through every engine while active"""
+
+    def __init__(self):
+        self.statements = []
+        self._engines = list({engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine})
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for target in self._engines:
+            event.listen(target, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for target in self._engines:
+            event.remove(target, "before_cursor_execute", self._record)
+
+
+async def count_statements(ai_engine):
+    counts, hits = {}, {}
+    async with AsyncSessionLocal() as db:
+        search_engine = SearchEngine(db, ai_engine)
+        # Warm-up builds the keyword index, once per process rather than per request
+        await search_engine.search("warm up", log=False)
+        for name, call in [
+            ("search", lambda query: search_engine.search(query, log=False)),
+            ("search_filtered", lambda query: search_engine.search(query, {"category": "Security"}, log=False)),
+            ("search_articles", lambda query: search_engine.search_articles(query, limit=10)),
+        ]:
+            per_query, found = [], 0
+            # Distinct queries, so the result cache never answers
+            for number, query in enumerate(["vpn connection drops", "reset password", "kill switch dns"]):
+                with StatementCounter() as counter:
+                    response = await call(f"{query} {name} {number}")
+                per_query.append(len(counter.statements))
+                found += len(response["results"] if isinstance(response, dict) else response)
+            counts[name] = max(per_query)
+            hits[name] = found
+    # Pooled aiosqlite connections belong to this event loop
+    for target in {async_engine, async_read_engine}:
+        await target.dispose()
+    return counts, hits
+
+
+def test_search_statement_count_does_not_grow_with_results(tmp_path, engine, monkeypatch):
+    # Periodic catch-up syncs and queued log writes from earlier tests are not
+    # per-request work; keep them out of the counts
+    get_search_log_writer().stop()
+    monkeypatch.setattr(search_index, "SYNC_INTERVAL", 3600.0)
+    monkeypatch.setattr(ai_engine_module, "SYNC_INTERVAL", 3600.0)
+    counts = []
+    for size in (5, 60):
+        directory = str(tmp_path / f"docs-{size}")
+        write_corpus(directory, size, seed=2)
+        ingest_docs(directory, full=True, embed=False, workers=1)
+        reset_article_index()
+        engine.vector_store.watermark = None
+        with get_db_session() as db:
+            engine.sync_vector_store(db)
+        size_counts, hits = asyncio.run(count_statements(engine))
+        assert all(hits.values()), hits
+        counts.append(size_counts)
+    assert counts[0] == counts[1]
+    # One query for the ranked rows and one for their tags
+    assert all(count <= 2 for count in counts[0].values()), counts
@@ -0,0 +1,93 @@
+import os
+
+import result_cache
+from database import get_db_session
+from indexing import UPSERT, ArticleDelta
+from init_db import ingest_docs
+from models import Article
+from result_cache import LocalResultCacheBackend, ResultCache, result_key
+from search_index import apply_article_deltas, get_article_index, reset_article_index
+
+
+def cached_page(cache):
+    key = cache.key("reset password", None, 1, 10)
+    cache.put(key, {"results": [], "metadata": {}}, 1.0)
+    return key
+
+
+def test_catch_up_with_another_process_moves_the_shared_version(docs, shared_cache, other_process):
+    with get_db_session() as db:
+        index = get_article_index(db)
+    key = cached_page(shared_cache)
+    version = shared_cache.backend.version()
+
+    with get_db_session() as db:
+        article = db.query(Article).first()
+        article.title = article.title + " (updated)"
+        db.commit()
+    with get_db_session() as db:
+        index.sync(db)
+
+    assert shared_cache.backend.version() > version
+    assert shared_cache.get(shared_cache.key("reset password", None, 1, 10)) is None
+    assert shared_cache.get(key) is not None
+
+
+def test_sync_without_changes_keeps_the_shared_version(docs, shared_cache):
+    with get_db_session() as db:
+        index = get_article_index(db)
+        version = shared_cache.backend.version()
+        index.sync(db)
+    assert shared_cache.backend.version() == version
+
+
+def test_commit_before_the_index_is_built_moves_the_shared_version(docs, shared_cache):
+    reset_article_index()
+    version = shared_cache.backend.version()
+    apply_article_deltas([ArticleDelta(UPSERT, 1, {"id": 1, "title": "x", "tags": []})])
+    assert shared_cache.backend.version() > version
+
+
+def test_ingest_moves_the_shared_version(docs, shared_cache):
+    version = shared_cache.backend.version()
+    ingest_docs(docs, embed=False, workers=1)
+    assert shared_cache.backend.version() == version
+
+    path = os.path.join(docs, sorted(os.listdir(docs))[0])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\nOne more paragraph.\n")
+    ingest_docs(docs, embed=False, workers=1)
+    assert shared_cache.backend.version() > version
+
+
+def test_equivalent_queries_and_filters_share_a_key():
+    key = result_key("Reset  Password", {"tags": ["vpn", "account"], "category": ""}, 1, 10, 3)
+    assert key == result_key("reset password", {"tags": ["account", "vpn"]}, 1, 10, 3)
+    assert key != result_key("reset password", {"tags": ["account", "vpn"]}, 2, 10, 3)
+    assert key != result_key("reset password", {"tags": ["account", "vpn"]}, 1, 10, 4)
+
+
+def test_local_entries_expire_and_evict_least_recently_used(monkeypatch):
+    backend = LocalResultCacheBackend(max_items=2)
+    now = [100.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    backend.set("a", 1, ttl=10)
+    backend.set("b", 2, ttl=10)
+    assert backend.get("a") == 1
+    backend.set("c", 3, ttl=10)
+    assert backend.get("b") is None
+    assert backend.evictions == 1
+
+    now[0] += 10
+    assert backend.get("a") is None
+    assert backend.expirations == 1
+
+
+def test_local_version_follows_the_corpus_version(docs):
+    cache = ResultCache(LocalResultCacheBackend())
+    key = cached_page(cache)
+    assert cache.get(key) is not None
+    reset_article_index()
+    assert cache.key("reset password", None, 1, 10) != key
+    assert cache.get(cache.key("reset password", None, 1, 10)) is None
+    assert cache.snapshot()["hits"] == 1
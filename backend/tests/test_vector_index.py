@@ -0,0 +1,112 @@
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import vector_index
+from database import get_db_session
+from hybrid import HybridRetriever
+from search_index import get_article_index
+from vector_index import CURRENT_FILE, INDEX_FILE, VectorIndex, chunk_id, current_snapshot
+
+DIMENSION = 8
+MODEL = "fake-model"
+
+
+def article_chunks(article_id, count=2):
+    rng = np.random.default_rng(article_id)
+    ids = [chunk_id(article_id, position) for position in range(count)]
+    metadatas = [{"id": article_id, "title": f"Article {article_id}", "text": f"chunk {position}",
+                  "hash": f"{article_id}-{position}"} for position in range(count)]
+    return ids, rng.random((count, DIMENSION), dtype=np.float32), metadatas
+
+
+def build_index():
+    """Articles 1-3 in the base; article 1 then removed and article 4 added to the delta"""
+    index = VectorIndex(DIMENSION)
+    for article_id in (1, 2, 3):
+        index.add(*article_chunks(article_id))
+    index.compact()
+    index.remove_article(1)
+    index.add(*article_chunks(4))
+    built, updated = datetime(2026, 1, 1, tzinfo=timezone.utc), datetime(2026, 1, 2, tzinfo=timezone.utc)
+    index.watermark = updated
+    index.versions = {2: built, 3: built, 4: updated}
+    return index
+
+
+def search_ids(index, vector, **kwargs):
+    return [(chunk, round(score, 5)) for chunk, score, _ in index.search(vector, k=10, **kwargs)]
+
+
+def test_removed_articles_are_skipped_and_filters_apply_inside_the_scan():
+    index = build_index()
+    _, vectors, _ = article_chunks(1)
+    assert {chunk >> 16 for chunk, _ in search_ids(index, vectors[0])} == {2, 3, 4}
+    assert {chunk >> 16 for chunk, _ in search_ids(index, vectors[0], article_ids={3, 4})} == {3, 4}
+    assert search_ids(index, vectors[0], article_ids={1}) == []
+    assert index.article_ids() == {2, 3, 4}
+    assert set(index.article_vectors(4)) == {"4-0", "4-1"}
+
+
+def test_snapshot_keeps_delta_tombstones_and_versions(tmp_path):
+    index = build_index()
+    directory = str(tmp_path / "index")
+    snapshot = index.save(directory, MODEL)
+    assert current_snapshot(directory) == snapshot
+    assert index.needs_compaction()
+
+    loaded = VectorIndex.load(directory, MODEL, DIMENSION)
+    query = article_chunks(2)[1][0]
+    assert search_ids(loaded, query) == search_ids(index, query)
+    assert loaded.tombstones == {1}
+    assert loaded.delta.ntotal == 2
+    assert loaded.versions == index.versions
+    assert loaded.watermark == index.watermark
+    assert VectorIndex.load(directory, "other-model", DIMENSION) is None
+
+
+def test_later_snapshots_link_the_base_and_move_the_pointer(tmp_path):
+    directory = str(tmp_path / "index")
+    index = build_index()
+    first = index.save(directory, MODEL)
+    index.remove_article(2)
+    second = index.save(directory, MODEL)
+
+    assert second != first
+    with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+        assert f.read() == os.path.basename(second)
+    assert os.path.samefile(os.path.join(first, INDEX_FILE), os.path.join(second, INDEX_FILE))
+    assert VectorIndex.load(directory, MODEL, DIMENSION).tombstones == {1, 2}
+
+
+def test_superseded_snapshots_are_pruned_after_the_grace_period(tmp_path, monkeypatch):
+    directory = str(tmp_path / "index")
+    index = build_index()
+    first = index.save(directory, MODEL)
+    monkeypatch.setattr(vector_index, "SNAPSHOT_GRACE_SECONDS", -1)
+    second = index.save(directory, MODEL)
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+
+
+def test_engine_search_applies_filters(engine):
+    with get_db_session() as db:
+        filters = get_article_index(db).filters
+    category = sorted(filters.categories)[0]
+    allowed = filters.categories[category]
+
+    results = engine.search("vpn connection drops", filters={"category": category}, k=20)
+    assert results
+    assert {result["id"] for result in results} <= allowed
+    assert engine.search("vpn connection drops", filters={"category": "No such category"}) == []
+
+
+def test_vector_hits_below_the_similarity_floor_are_dropped(engine):
+    with get_db_session() as db:
+        article_index = get_article_index(db)
+    ranking, _ = HybridRetriever(article_index, engine)._vector("vpn connection drops", None, 10)
+    assert ranking
+    floor = ranking[0][1] + 1e-6
+    ranking, _ = HybridRetriever(article_index, engine, min_similarity=floor)._vector("vpn connection drops", None, 10)
+    assert ranking == []
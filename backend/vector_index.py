@@ -0,0 +1,502 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+
+from concurrency import ReadWriteLock
+from indexing import as_watermark
+
+FORMAT_VERSION = 3
+# Version 2 snapshots (no delta, files directly in the index directory) still load
+READABLE_FORMATS = (2, 3)
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.npy"
+DELTA_VECTORS_FILE = "delta_vectors.npy"
+DELTA_IDS_FILE = "delta_ids.npy"
+CHUNKS_FILE = "chunks.json"
+VERSIONS_FILE = "versions.json"
+MANIFEST_FILE = "manifest.json"
+BASE_FILES = (INDEX_FILE, VECTORS_FILE, IDS_FILE)
+# Each save writes a fresh snapshot directory; this file names the current one
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_PREFIX = "snapshot-"
+# Superseded snapshots are deleted once this old, so a save about to swap the pointer keeps its files
+SNAPSHOT_GRACE_SECONDS = 300
+
+# Chunk ids pack the article id above the chunk position, so every chunk of
+# an article falls in one contiguous id range
+CHUNK_POSITION_BITS = 16
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+QUANTIZATIONS = ("none", "sq8", "pq")
+
+# Filtered searches over at most this many chunks skip the index and score exactly
+EXACT_FILTER_LIMIT = 4096
+
+
+def chunk_id(article_id: int, position: int) -> int:
+    return (article_id << CHUNK_POSITION_BITS) | position
+
+
+def article_of(chunk: int) -> int:
+    return chunk >> CHUNK_POSITION_BITS
+
+
+def article_range(article_id: int) -> Tuple[int, int]:
+    return article_id << CHUNK_POSITION_BITS, (article_id + 1) << CHUNK_POSITION_BITS
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def new_flat_index(dimension: int):
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+
+@dataclass
+class IndexSpec:
+    """
+    Shape of the snapshot index: exact ``flat``, ``ivf`` (inverted lists
+    probed ``nprobe`` at a time) or ``hnsw`` (graph searched with
+    ``ef_search``), optionally storing vectors with ``sq8`` scalar or ``pq``
+    product quantization to save memory. ``nlist`` 0 picks ~4*sqrt(n).
+    """
+    index_type: str = "flat"
+    quantization: str = "none"
+    nlist: int = 0
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_search: int = 64
+    ef_construction: int = 200
+    pq_m: int = 16
+
+    def __post_init__(self):
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type: {self.index_type}")
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown vector quantization: {self.quantization}")
+
+    @classmethod
+    def from_settings(cls, settings) -> "IndexSpec":
+        return cls(
+            index_type=settings.VECTOR_INDEX_TYPE.lower(),
+            quantization=settings.VECTOR_QUANTIZATION.lower(),
+            nlist=settings.VECTOR_IVF_NLIST,
+            nprobe=settings.VECTOR_IVF_NPROBE,
+            hnsw_m=settings.VECTOR_HNSW_M,
+            ef_search=settings.VECTOR_HNSW_EF_SEARCH,
+            ef_construction=settings.VECTOR_HNSW_EF_CONSTRUCTION,
+            pq_m=settings.VECTOR_PQ_M,
+        )
+
+    def structure(self) -> Dict[str, Any]:
+        """Fields that change what gets built, as opposed to search-time knobs"""
+        fields = asdict(self)
+        for knob in ("nprobe", "ef_search"):
+            fields.pop(knob)
+        return fields
+
+    def factory_string(self, dimension: int, count: int) -> str:
+        """faiss.index_factory description, degrading to what ``count`` vectors can train"""
+        quantization = self.quantization
+        pq_m = self.pq_m
+        if quantization == "pq":
+            # PQ needs the sub-quantizer count to divide the dimension and 256 training points per codebook
+            while pq_m > 1 and dimension % pq_m:
+                pq_m -= 1
+            if count < 256:
+                quantization = "sq8"
+        codes = {"none": "Flat", "sq8": "SQ8", "pq": f"PQ{pq_m}"}[quantization]
+
+        if self.index_type == "ivf":
+            nlist = self.nlist or int(4 * np.sqrt(count))
+            # Below ~39 points per list k-means training is unreliable
+            nlist = min(nlist, count // 39)
+            if nlist >= 2:
+                return f"IDMap2,IVF{nlist},{codes}"
+        elif self.index_type == "hnsw":
+            return f"IDMap2,HNSW{self.hnsw_m}" + ("" if codes == "Flat" else f"_{codes}")
+        return f"IDMap2,{codes}"
+
+    def apply_search_parameters(self, index):
+        parameters = faiss.ParameterSpace()
+        for name, value in (("nprobe", self.nprobe), ("efSearch", self.ef_search)):
+            try:
+                parameters.set_index_parameter(index, name, value)
+            except RuntimeError:
+                # Not an IVF / HNSW index
+                pass
+
+
+def search_parameters(index, spec: IndexSpec, selector=None):
+    """Search parameters of the type the wrapped index expects, restricted to ``selector``"""
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=spec.nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=spec.ef_search)
+    return faiss.SearchParameters(sel=selector)
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, spec: IndexSpec, train_size: int = 100_000):
+    """Train (on a sample of at most ``train_size`` vectors) and fill an index per ``spec``"""
+    dimension = vectors.shape[1]
+    index = faiss.index_factory(dimension, spec.factory_string(dimension, len(vectors)), faiss.METRIC_INNER_PRODUCT)
+    if spec.index_type == "hnsw":
+        faiss.ParameterSpace().set_index_parameter(index, "efConstruction", spec.ef_construction)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_size:
+            rows = np.random.default_rng(0).choice(len(vectors), train_size, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    if len(vectors):
+        index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), ids)
+    spec.apply_search_parameters(index)
+    return index
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over chunk embeddings.
+
+    A read-only base snapshot, typically memory-mapped from disk so every
+    worker shares the same pages and built per ``spec`` (exact or
+    approximate), is overlaid with a small exact in-memory delta index for
+    chunks written since the snapshot and a set of tombstoned articles whose
+    base chunks must be skipped. ``compact`` folds both into a new base;
+    the raw vectors are kept alongside so that never needs the model or a
+    lossy reconstruction.
+
+    Snapshots are directories of their own under the index directory, with
+    the delta and tombstones saved as they are; a ``CURRENT`` file, replaced
+    atomically, names the one to load, so processes saving at the same time
+    never mix their files.
+    """
+
+    def __init__(self, dimension: int, spec: Optional[IndexSpec] = None, base=None,
+                 base_vectors: Optional[np.ndarray] = None, base_ids: Optional[np.ndarray] = None,
+                 chunks: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.dimension = dimension
+        self.spec = spec or IndexSpec()
+        self.base = base
+        self.base_vectors = base_vectors if base_vectors is not None else np.zeros((0, dimension), dtype=np.float32)
+        self.base_ids = base_ids if base_ids is not None else np.zeros(0, dtype=np.int64)
+        self.delta = new_flat_index(dimension)
+        self.chunks: Dict[int, Dict[str, Any]] = chunks or {}
+        self.base_articles: Set[int] = {article_of(int(chunk)) for chunk in self.base_ids}
+        self.tombstones: Set[int] = set()
+        self.watermark: Optional[datetime] = None
+        # Article id -> updated_at applied, so a sync after loading skips rows the snapshot already has
+        self.versions: Dict[int, Optional[datetime]] = {}
+        # Snapshot directory holding files for the current base, which saves link instead of rewriting
+        self.base_directory: Optional[str] = None
+        # Searches share the lock; only mutations take it exclusively
+        self._lock = ReadWriteLock()
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def article_ids(self) -> Set[int]:
+        with self._lock.read():
+            return {article_of(chunk) for chunk in self.chunks}
+
+    def add(self, ids: List[int], vectors: np.ndarray, chunks: List[Dict[str, Any]]):
+        """Add chunks; callers remove an article's old chunks first"""
+        if not ids:
+            return
+        with self._lock.write():
+            self.delta.add_with_ids(normalize_rows(vectors), np.asarray(ids, dtype=np.int64))
+            for chunk, metadata in zip(ids, chunks):
+                self.chunks[chunk] = metadata
+
+    def article_vectors(self, article_id: int) -> Dict[str, np.ndarray]:
+        """An article's current chunk vectors keyed by chunk hash, so re-indexing reuses unchanged ones"""
+        low, high = article_range(article_id)
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock.read():
+            if article_id in self.base_articles:
+                base_ids = np.asarray(self.base_ids)
+                for row in np.flatnonzero((base_ids >= low) & (base_ids < high)):
+                    chunk_hash = self.chunks.get(int(base_ids[row]), {}).get("hash")
+                    if chunk_hash:
+                        vectors[chunk_hash] = np.array(self.base_vectors[row])
+            if self.delta.ntotal:
+                for chunk in faiss.vector_to_array(self.delta.id_map):
+                    chunk_hash = self.chunks.get(int(chunk), {}).get("hash") if low <= chunk < high else None
+                    if chunk_hash:
+                        vectors[chunk_hash] = self.delta.reconstruct(int(chunk))
+        return vectors
+
+    def remove_article(self, article_id: int):
+        low, high = article_range(article_id)
+        with self._lock.write():
+            if article_id in self.base_articles:
+                self.tombstones.add(article_id)
+                self.base_articles.discard(article_id)
+            self.delta.remove_ids(faiss.IDSelectorRange(low, high))
+            for chunk in [chunk for chunk in self.chunks if low <= chunk < high]:
+                del self.chunks[chunk]
+
+    def search(self, vector: np.ndarray, k: int = 5,
+               article_ids: Optional[Set[int]] = None) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """
+        Return up to ``k`` (chunk id, cosine similarity, chunk metadata), best
+        first. ``article_ids`` restricts the search to those articles' chunks
+        inside the index scan rather than by filtering its output; selective
+        filters are answered exactly from the raw vectors.
+        """
+        query = normalize_rows(vector)
+        with self._lock.read():
+            candidates: Dict[int, float] = {}
+            if self.base is not None and self.base.ntotal:
+                if article_ids is None:
+                    # Over-fetch so tombstoned chunks do not starve the result
+                    fetch = min(self.base.ntotal, k + 8 * len(self.tombstones) + k)
+                    scores, ids = self.base.search(query, fetch)
+                else:
+                    allowed = np.fromiter(article_ids - self.tombstones, dtype=np.int64)
+                    mask = np.isin(np.asarray(self.base_ids) >> CHUNK_POSITION_BITS, allowed)
+                    scores, ids = self._filtered_base_search(query, k, mask)
+                for chunk, score in zip(ids[0], scores[0]):
+                    if chunk >= 0 and article_of(int(chunk)) not in self.tombstones:
+                        candidates[int(chunk)] = float(score)
+            if self.delta.ntotal:
+                params = None
+                if article_ids is not None:
+                    delta_ids = faiss.vector_to_array(self.delta.id_map).astype(np.int64)
+                    allowed = np.fromiter(article_ids, dtype=np.int64)
+                    selected = delta_ids[np.isin(delta_ids >> CHUNK_POSITION_BITS, allowed)]
+                    params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(selected))
+                scores, ids = self.delta.search(query, min(k, self.delta.ntotal), params=params)
+                for chunk, score in zip(ids[0], scores[0]):
+                    if chunk >= 0:
+                        candidates[int(chunk)] = float(score)
+            ranked = sorted(candidates.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(chunk, score, self.chunks.get(chunk, {})) for chunk, score in ranked]
+
+    def _filtered_base_search(self, query: np.ndarray, k: int, mask: np.ndarray):
+        count = int(mask.sum())
+        if count == 0:
+            return np.zeros((1, 0), dtype=np.float32), np.zeros((1, 0), dtype=np.int64)
+        if count <= EXACT_FILTER_LIMIT:
+            # Approximate indexes lose recall on tiny subsets; scoring them directly is cheap and exact
+            vectors = np.asarray(self.base_vectors)[mask]
+            ids = np.asarray(self.base_ids)[mask]
+            scores = vectors @ query[0]
+            top = np.argsort(-scores)[:k]
+            return scores[top][None, :], ids[top][None, :]
+        selector = faiss.IDSelectorBatch(np.asarray(self.base_ids)[mask])
+        return self.base.search(query, min(k, count), params=search_parameters(self.base, self.spec, selector))
+
+    def compact(self, spec: Optional[IndexSpec] = None):
+        """Rebuild the base from live base vectors plus the delta, training per ``spec``"""
+        with self._lock.write():
+            spec = spec or self.spec
+            keep = np.array([article_of(int(chunk)) not in self.tombstones for chunk in self.base_ids], dtype=bool)
+            vectors = [np.asarray(self.base_vectors, dtype=np.float32)[keep]]
+            ids = [np.asarray(self.base_ids, dtype=np.int64)[keep]]
+            if self.delta.ntotal:
+                vectors.append(self.delta.index.reconstruct_n(0, self.delta.ntotal))
+                ids.append(faiss.vector_to_array(self.delta.id_map).astype(np.int64))
+            self.base_vectors = np.concatenate(vectors)
+            self.base_ids = np.concatenate(ids)
+            self.base = build_index(self.base_vectors, self.base_ids, spec)
+            self.spec = spec
+            self.delta = new_flat_index(self.dimension)
+            self.tombstones = set()
+            self.base_articles = {article_of(int(chunk)) for chunk in self.base_ids}
+            self.base_directory = None
+
+    def needs_compaction(self) -> bool:
+        with self._lock.read():
+            return self.base is None or bool(self.delta.ntotal) or bool(self.tombstones)
+
+    def save(self, directory: str, model_id: str) -> str:
+        """
+        Write a snapshot directory and point ``CURRENT`` at it; returns its
+        path. The delta and tombstones are saved as they are, so this never
+        compacts unless there is no base yet, and base files the current
+        snapshot already has are hard-linked rather than rewritten.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # Exclusive only because it may have to build the first base; copying the references is quick
+        with self._lock.write():
+            if self.base is None:
+                self.compact()
+            base = self.base
+            vectors, ids = self.base_vectors, self.base_ids
+            base_directory = self.base_directory
+            delta_ids = faiss.vector_to_array(self.delta.id_map).astype(np.int64)
+            delta_vectors = self.delta.index.reconstruct_n(0, self.delta.ntotal) if self.delta.ntotal \
+                else np.zeros((0, self.dimension), dtype=np.float32)
+            tombstones = sorted(self.tombstones)
+            chunks = {str(chunk): metadata for chunk, metadata in self.chunks.items()}
+            versions = {str(article): stamp.isoformat() if stamp else None for article, stamp in self.versions.items()}
+            watermark = self.watermark
+            spec = self.spec
+        snapshot = tempfile.mkdtemp(prefix=SNAPSHOT_PREFIX, dir=directory)
+        if not (base_directory and _link_files(base_directory, snapshot, BASE_FILES)):
+            faiss.write_index(base, os.path.join(snapshot, INDEX_FILE))
+            for name, array in ((VECTORS_FILE, vectors), (IDS_FILE, ids)):
+                _save_array(os.path.join(snapshot, name), array)
+        _save_array(os.path.join(snapshot, DELTA_VECTORS_FILE), delta_vectors)
+        _save_array(os.path.join(snapshot, DELTA_IDS_FILE), delta_ids)
+        with open(os.path.join(snapshot, CHUNKS_FILE), "w", encoding="utf-8") as f:
+            json.dump(chunks, f)
+        with open(os.path.join(snapshot, VERSIONS_FILE), "w", encoding="utf-8") as f:
+            json.dump(versions, f)
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "model_id": model_id,
+            "dimension": self.dimension,
+            "spec": spec.structure(),
+            "factory": spec.factory_string(self.dimension, len(ids)),
+            "chunks": int(base.ntotal),
+            "delta_chunks": int(len(delta_ids)),
+            "tombstones": tombstones,
+            "watermark": watermark.isoformat() if watermark else None,
+            "created_at": time.time(),
+        }
+        # The manifest goes last: a snapshot directory without one is incomplete
+        with open(os.path.join(snapshot, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        pointer = os.path.join(directory, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(snapshot))
+        os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+        with self._lock.write():
+            if self.base is base:
+                self.base_directory = snapshot
+        _prune_snapshots(directory, os.path.basename(snapshot))
+        return snapshot
+
+    @classmethod
+    def load(cls, directory: str, model_id: str, dimension: int, spec: Optional[IndexSpec] = None,
+             mmap: bool = True) -> Optional["VectorIndex"]:
+        """
+        Open a saved snapshot, or return None if it is missing or was built
+        for another model. A snapshot built with a different ``spec`` is
+        rebuilt from its stored vectors.
+        """
+        spec = spec or IndexSpec()
+        snapshot = current_snapshot(directory)
+        if snapshot is None:
+            return None
+        try:
+            with open(os.path.join(snapshot, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if (
+                manifest.get("format_version") not in READABLE_FORMATS
+                or manifest.get("model_id") != model_id
+                or manifest.get("dimension") != dimension
+            ):
+                print(f"Ignoring vector index at {directory}: built for a different model or format")
+                return None
+            mmap_mode = "r" if mmap else None
+            base_vectors = np.load(os.path.join(snapshot, VECTORS_FILE), mmap_mode=mmap_mode)
+            base_ids = np.load(os.path.join(snapshot, IDS_FILE), mmap_mode=mmap_mode)
+            delta_vectors = delta_ids = None
+            if manifest.get("delta_chunks"):
+                delta_vectors = np.load(os.path.join(snapshot, DELTA_VECTORS_FILE))
+                delta_ids = np.load(os.path.join(snapshot, DELTA_IDS_FILE))
+            with open(os.path.join(snapshot, CHUNKS_FILE), encoding="utf-8") as f:
+                chunks = {int(chunk): metadata for chunk, metadata in json.load(f).items()}
+            versions = {}
+            if os.path.exists(os.path.join(snapshot, VERSIONS_FILE)):
+                with open(os.path.join(snapshot, VERSIONS_FILE), encoding="utf-8") as f:
+                    versions = {
+                        int(article): as_watermark(datetime.fromisoformat(stamp)) if stamp else None
+                        for article, stamp in json.load(f).items()
+                    }
+            base = None
+            if manifest.get("spec") == spec.structure():
+                flags = 0
+                if mmap:
+                    # Map the stored inverted lists / flat codes instead of copying them into each
+                    # worker; faiss rejects both flags at once for IVF indexes
+                    if "IVF" in manifest.get("factory", ""):
+                        flags = faiss.IO_FLAG_MMAP
+                    else:
+                        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+                    flags |= faiss.IO_FLAG_READ_ONLY
+                base = faiss.read_index(os.path.join(snapshot, INDEX_FILE), flags)
+                spec.apply_search_parameters(base)
+        except Exception as e:
+            print(f"Error loading vector index: {str(e)}")
+            return None
+        index = cls(dimension, spec, base=base, base_vectors=base_vectors, base_ids=base_ids, chunks=chunks)
+        index.base_directory = snapshot
+        index.versions = versions
+        tombstones = set(manifest.get("tombstones", []))
+        index.tombstones = tombstones
+        index.base_articles -= tombstones
+        if delta_ids is not None and len(delta_ids):
+            index.delta.add_with_ids(np.ascontiguousarray(delta_vectors, dtype=np.float32), delta_ids)
+        if base is None:
+            print(f"Rebuilding vector index at {directory} as {spec.index_type}/{spec.quantization}")
+            index.compact()
+        if manifest.get("watermark"):
+            index.watermark = as_watermark(datetime.fromisoformat(manifest["watermark"]))
+        return index
+
+
+def current_snapshot(directory: str) -> Optional[str]:
+    """Directory of the snapshot ``CURRENT`` points at (or a version 2 snapshot saved in place), if complete"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), encoding="utf-8") as f:
+            snapshot = os.path.join(directory, f.read().strip())
+    except FileNotFoundError:
+        snapshot = directory
+    if not os.path.exists(os.path.join(snapshot, MANIFEST_FILE)):
+        return None
+    return snapshot
+
+
+def _save_array(path: str, array: np.ndarray):
+    # np.save appends .npy unless the name already ends with it, so pass a file object
+    with open(path, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+
+
+def _link_files(source: str, target: str, names: Tuple[str, ...]) -> bool:
+    """Hard-link ``names`` from ``source`` into ``target``; False if any is missing or links are unsupported"""
+    try:
+        for name in names:
+            os.link(os.path.join(source, name), os.path.join(target, name))
+        return True
+    except OSError:
+        for name in names:
+            try:
+                os.remove(os.path.join(target, name))
+            except FileNotFoundError:
+                pass
+        return False
+
+
+def _prune_snapshots(directory: str, keep: str):
+    """Delete superseded snapshot directories (and abandoned partial ones) past the grace period"""
+    cutoff = time.time() - SNAPSHOT_GRACE_SECONDS
+    # Another process may have swapped the pointer since
+    current = current_snapshot(directory)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name == keep or path == current or not name.startswith(SNAPSHOT_PREFIX) or not os.path.isdir(path):
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                # Processes that mapped these files keep their pages until they unmap them
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
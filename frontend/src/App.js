@@ -1,6 +1,19 @@
 import React, { useState } from 'react';
 import './App.css';
 
+// Wrap the [start, end] highlight spans of a snippet in <mark>
+function renderHighlighted(text, highlights) {
+  const parts = [];
+  let cursor = 0;
+  (highlights || []).forEach(([start, end], index) => {
+    parts.push(text.slice(cursor, start));
+    parts.push(<mark key={index}>{text.slice(start, end)}</mark>);
+    cursor = end;
+  });
+  parts.push(text.slice(cursor));
+  return parts;
+}
+
 function App() {
   const [query, setQuery] = useState('');
   const [results, setResults] = useState(null);
@@ -76,11 +89,20 @@ function App() {
           <div className="results-container">
             {results.map((result, index) => (
               <div key={index} className="result-card">
-                <h2>{result.title}</h2>
+                <h2>{renderHighlighted(result.title, result.title_highlights)}</h2>
                 <p className="metadata">
                   Category: {result.category} | Tags: {result.tags ? result.tags.join(', ') : 'None'}
                 </p>
-                <div className="content" dangerouslySetInnerHTML={{ __html: result.content }} />
+                <div className="content">
+                  {result.snippets && result.snippets.length > 0
+                    ? result.snippets.map((snippet, snippetIndex) => (
+                        <p key={snippetIndex} className="snippet">
+                          {snippet.offset > 0 && '… '}
+                          {renderHighlighted(snippet.text, snippet.highlights)} …
+                        </p>
+                      ))
+                    : <p className="summary">{result.summary}</p>}
+                </div>
                 <div className="relevance">Relevance Score: {Math.round(result.relevance * 100)}%</div>
               </div>
             ))}
@@ -14,10 +14,17 @@ import {
 import { debounce } from 'lodash';
 import axios from 'axios';
 
+interface Snippet {
+  text: string;
+  offset: number;
+  highlights: [number, number][];
+}
+
 interface SearchResult {
   id: number;
   title: string;
-  content: string;
+  summary: string;
+  snippets: Snippet[];
   category: string;
   tags: string[];
   relevance_score: number;
@@ -61,7 +68,7 @@ export const Search: React.FC<SearchProps> = ({ onResultSelect }) => {
 
   const fetchSuggestions = async (input: string) => {
     try {
-      const response = await axios.get(`/api/suggestions?query=${input}`);
+      const response = await axios.get(`/api/suggest`, { params: { q: input } });
       setSuggestions(response.data);
     } catch (error) {
       console.error('Error fetching suggestions:', error);
@@ -169,7 +176,7 @@ export const Search: React.FC<SearchProps> = ({ onResultSelect }) => {
                     WebkitBoxOrient: 'vertical',
                   }}
                 >
-                  {result.content}
+                  {result.snippets.length > 0 ? result.snippets[0].text : result.summary}
                 </Typography>
                 <Box sx={{ mt: 1 }}>
                   {result.tags.map((tag) => (